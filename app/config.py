@@ -5,7 +5,7 @@ import logging
 import pathlib
 from functools import lru_cache
 from logging.handlers import TimedRotatingFileHandler
-from typing import Dict, List, Optional
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field, HttpUrl
 
@@ -14,7 +14,14 @@ class WordPressConfig(BaseModel):
     base_url: HttpUrl
     transactions_endpoint: str = "/users/transactions"
     since_param: str = "since"
+    # Query parameter that filters by comma-separated product ids. When set, scripts
+    # with different watermarks are fetched separately, each from its own watermark.
+    product_param: Optional[str] = None
     transactions_limit: Optional[int] = Field(default=None, ge=1)
+    # Streaming mode parses the body incrementally and pages via page_param + limit.
+    stream: bool = False
+    page_param: Optional[str] = None
+    stream_batch_size: int = Field(default=200, ge=1)
     status_filter: List[str] = Field(default_factory=lambda: ["complete", "confirmed"])
     timeout_seconds: int = Field(default=30, ge=1)
     api_key: Optional[str] = None
@@ -24,10 +31,34 @@ class WordPressConfig(BaseModel):
     api_token: Optional[str] = None
 
 
+class ValidationCacheConfig(BaseModel):
+    enabled: bool = True
+    positive_ttl_seconds: int = Field(default=86400, ge=0)
+    negative_ttl_seconds: int = Field(default=3600, ge=0)
+    max_entries: int = Field(default=10000, ge=1)
+    # Optional JSON file so a restarted scheduler starts with a warm cache.
+    persist_path: Optional[str] = None
+
+
+class RateLimitConfig(BaseModel):
+    enabled: bool = True
+    # Token bucket shared by every TradingView call (grant, update, revoke, validate, list).
+    requests_per_second: float = Field(default=10.0, gt=0)
+    burst: int = Field(default=10, ge=1)
+    min_requests_per_second: float = Field(default=0.2, gt=0)
+    # AIMD tuning: add this much rate per success, multiply by the factor on a 429.
+    increase_per_success: float = Field(default=0.1, ge=0)
+    decrease_factor: float = Field(default=0.5, gt=0, lt=1)
+    # Pause used when a 429 carries no usable Retry-After header, and the longest honoured.
+    default_retry_after_seconds: float = Field(default=5.0, ge=0)
+    max_retry_after_seconds: float = Field(default=300.0, ge=0)
+
+
 class TradingViewConfig(BaseModel):
     base_url: HttpUrl
     grant_endpoint: str = "/tradingview/access/grant"
     update_endpoint: str = "/tradingview/access/update"
+    revoke_endpoint: str = "/tradingview/access/revoke"
     list_users_endpoint: str = "/tradingview/access/scriptUsers/{scriptId}"
     validate_endpoint: str = "/tradingview/validate/{username}"
     api_key_header: str = "x-api-key"
@@ -37,6 +68,24 @@ class TradingViewConfig(BaseModel):
     retry_backoff_seconds: List[int] = Field(
         default_factory=lambda: [5, 15, 60]
     )
+    validation_cache: ValidationCacheConfig = ValidationCacheConfig()
+    rate_limit: RateLimitConfig = RateLimitConfig()
+
+
+class HttpConfig(BaseModel):
+    max_connections: int = Field(default=20, ge=1)
+    max_keepalive_connections: int = Field(default=10, ge=0)
+    keepalive_expiry_seconds: float = Field(default=30.0, gt=0)
+    http2: bool = False
+
+
+class CircuitBreakerConfig(BaseModel):
+    enabled: bool = True
+    # Consecutive failures (transport errors or 5xx) that open an endpoint's circuit.
+    failure_threshold: int = Field(default=5, ge=1)
+    # How long an open circuit fails fast before letting a trial call through.
+    recovery_seconds: float = Field(default=60.0, gt=0)
+    half_open_max_calls: int = Field(default=1, ge=1)
 
 
 class ProductConfig(BaseModel):
@@ -53,11 +102,70 @@ class EmailConfig(BaseModel):
     smtp_password: str
     from_email: str
     bcc: Optional[List[str]] = None
+    # Queue mail on disk and send it from a background worker over one SMTP session.
+    outbox_enabled: bool = True
+    # Defaults to <masterdata_dir>/outbox when unset.
+    outbox_dir: Optional[str] = None
+    max_per_minute: int = Field(default=30, ge=1)
+    max_attempts: int = Field(default=5, ge=1)
+    # Transient failures wait retry_delay_seconds * 2**(attempts - 1) before the next try.
+    retry_delay_seconds: int = Field(default=60, ge=1)
+    # Close the SMTP connection after this long without sending; reopen on demand.
+    idle_timeout_seconds: float = Field(default=60.0, gt=0)
+    timeout_seconds: float = Field(default=30.0, gt=0)
+    # A message claimed this long ago by a worker that never finished it is queued again.
+    inflight_timeout_seconds: float = Field(default=600.0, gt=0)
 
 
 class SchedulerConfig(BaseModel):
     interval_minutes: int = Field(default=15, ge=1)
     dry_run: bool = False
+    # The scheduler process serves its own GET /metrics here (scheduled syncs, retry
+    # drains and expiry sweeps never reach the API's registry); null disables it.
+    # The listener has no authentication, so it stays on loopback unless widened here.
+    metrics_port: Optional[int] = Field(default=9101, ge=1, le=65535)
+    metrics_host: str = "127.0.0.1"
+
+
+class SyncConfig(BaseModel):
+    # 1 keeps the original one-transaction-at-a-time behaviour.
+    concurrency: int = Field(default=1, ge=1)
+    # Fold several transactions for the same user into one TradingView grant per run.
+    coalesce_grants: bool = True
+    # Finished background sync jobs kept for GET /sync/{id}.
+    job_history: int = Field(default=50, ge=1)
+    # Put close matches among known usernames (masterData plus paths.tv_users_csv)
+    # ahead of TradingView's own suggestions in the invalid-username email.
+    local_suggestions: bool = True
+    suggestion_limit: int = Field(default=5, ge=1)
+    suggestion_max_distance: int = Field(default=2, ge=1)
+
+
+class RetryConfig(BaseModel):
+    enabled: bool = True
+    # How often the scheduler drains due entries from each master's retry_queue.
+    interval_minutes: int = Field(default=5, ge=1)
+    max_attempts: int = Field(default=5, ge=1)
+    # Delay before attempt n is base_delay_seconds * 2**n, capped at max_delay_seconds.
+    base_delay_seconds: int = Field(default=60, ge=1)
+    max_delay_seconds: int = Field(default=6 * 3600, ge=1)
+    concurrency: int = Field(default=4, ge=1)
+    # Send each sync grant once and queue failures here instead of sleeping through
+    # tradingview.retry_backoff_seconds in the middle of the run.
+    defer_in_sync: bool = False
+
+
+class ExpiryConfig(BaseModel):
+    # Off by default: the sweep revokes real TradingView access, so operators opt in.
+    # Run it once with scheduler.dry_run to see what it would revoke.
+    enabled: bool = False
+    # Daily run time (UTC); the algorithm doc schedules the expiry handler at 00:00.
+    run_hour: int = Field(default=0, ge=0, le=23)
+    run_minute: int = Field(default=0, ge=0, le=59)
+    concurrency: int = Field(default=4, ge=1)
+    # Revoke only once access has been expired for this long.
+    grace_hours: int = Field(default=0, ge=0)
+
 
 class LoggingConfig(BaseModel):
     level: str = Field(default="INFO")
@@ -66,12 +174,56 @@ class LoggingConfig(BaseModel):
 class PathConfig(BaseModel):
     masterdata_dir: str = "masterData"
     logs_dir: str = "logs"
+    # TradingView user export (e.g. tv_users_full.csv) used for username suggestions.
+    tv_users_csv: Optional[str] = None
+
+
+class DedupeConfig(BaseModel):
+    # Processed-transaction IDs kept for exact dedupe, bounded by count and/or age.
+    max_entries: Optional[int] = Field(default=20000, ge=1)
+    retention_days: Optional[int] = Field(default=None, ge=1)
+    # Remember evicted IDs in a bloom filter for very long horizons. A hit is only
+    # trusted when a user, retry or manual-review entry still names the ID.
+    bloom_filter: bool = False
+    bloom_capacity: int = Field(default=200000, ge=1)
+    bloom_error_rate: float = Field(default=1e-5, gt=0, lt=1)
+
+
+class StorageConfig(BaseModel):
+    backend: Literal["json", "sqlite"] = "json"
+    # Defaults to <masterdata_dir>/masterdata.sqlite3 when unset.
+    sqlite_path: Optional[str] = None
+    # JSON backend: fold <script_id>.journal.jsonl into the snapshot after this many deltas.
+    journal_compact_entries: int = Field(default=50, ge=1)
+    # Write-ahead intent/done log for TradingView grants, replayed at the start of a sync.
+    grant_log: bool = True
+    # fsync each intent before its grant is sent (concurrent intents share one fsync).
+    grant_log_fsync: bool = True
 
 
 class DiscordConfig(BaseModel):
     webhook_url: Optional[str] = None
     author: str = "Access Sync Bot"
     enabled: bool = True
+    # Alerts are queued to one background sender; when full, new alerts are dropped.
+    queue_size: int = Field(default=100, ge=1)
+    # Identical alerts inside this window are sent once, then summarised as "N occurrences".
+    dedupe_window_seconds: float = Field(default=300.0, ge=0)
+    timeout_seconds: float = Field(default=10.0, gt=0)
+
+
+class WebhookConfig(BaseModel):
+    # Off by default: pushed transactions trigger real TradingView grants.
+    enabled: bool = False
+    # Shared secret for HMAC-SHA256 over the raw body. Required: while it is unset the
+    # endpoint answers 503 and nothing is queued.
+    secret: Optional[str] = None
+    signature_header: str = "X-Webhook-Signature"
+    # Pushed transactions waiting to be granted; POSTs get 503 when the queue is full.
+    queue_size: int = Field(default=1000, ge=1)
+    # Wait this long after the first queued transaction to pick up others in one batch.
+    batch_window_seconds: float = Field(default=0.5, ge=0)
+    max_batch: int = Field(default=100, ge=1)
 
 
 class Settings(BaseModel):
@@ -79,8 +231,16 @@ class Settings(BaseModel):
     tradingview: TradingViewConfig
     products: Dict[str, ProductConfig]
     scheduler: SchedulerConfig = SchedulerConfig()
+    sync: SyncConfig = SyncConfig()
+    retry: RetryConfig = RetryConfig()
+    expiry: ExpiryConfig = ExpiryConfig()
     logging: LoggingConfig = LoggingConfig()
     paths: PathConfig = PathConfig()
+    http: HttpConfig = HttpConfig()
+    circuit_breaker: CircuitBreakerConfig = CircuitBreakerConfig()
+    storage: StorageConfig = StorageConfig()
+    dedupe: DedupeConfig = DedupeConfig()
+    webhook: WebhookConfig = WebhookConfig()
     email: Optional[EmailConfig] = None
     discord: Optional[DiscordConfig] = None
 
@@ -91,6 +251,12 @@ class Settings(BaseModel):
     def masterdata_path(self) -> pathlib.Path:
         return pathlib.Path(self.paths.masterdata_dir)
 
+    @property
+    def sqlite_path(self) -> pathlib.Path:
+        if self.storage.sqlite_path:
+            return pathlib.Path(self.storage.sqlite_path)
+        return self.masterdata_path / "masterdata.sqlite3"
+
     @property
     def logs_path(self) -> pathlib.Path:
         return pathlib.Path(self.paths.logs_dir)
@@ -8,25 +8,298 @@ Features:
 - Send text alerts
 - Send embed alerts
 - Send files
+
+Alerts are queued to a single background dispatcher that reuses one HTTP session,
+honours Discord's rate-limit headers and folds repeats of the same alert into one
+"N occurrences" embed.
 """
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
 import logging
-import threading
-from typing import Any, Dict, List, Optional, Union
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple, Union
 from pathlib import Path
 
-try:
-    from dhooks import Webhook, Embed, File
-except ImportError:
-    raise ImportError(
-        "dhooks library is required. Install it with: pip install dhooks"
-    )
+import httpx
 
 logger = logging.getLogger(__name__)
 
 
+def _mask_webhook(webhook_url: str) -> str:
+    return webhook_url[:50] + "..." if len(webhook_url) > 50 else webhook_url
+
+
+@dataclass
+class _Delivery:
+    webhook_url: str
+    payload: Dict[str, Any]
+    file: Optional[Tuple[str, bytes]] = None
+
+
+@dataclass
+class _DedupeWindow:
+    delivery: _Delivery
+    opened_at: float
+    repeats: int = 0
+
+
+class DiscordDispatcher:
+    """Single-worker queue that delivers webhook messages in order.
+
+    The worker owns one ``httpx.AsyncClient`` and waits out Discord rate limits
+    (``X-RateLimit-Remaining``/``X-RateLimit-Reset-After`` and 429 ``retry_after``).
+    The first alert with a given content is sent straight away; identical alerts
+    within ``dedupe_window_seconds`` are only counted and reported as one
+    "N occurrences" embed when the window closes or the dispatcher is flushed.
+    """
+
+    _MAX_RATE_LIMIT_RETRIES = 3
+
+    def __init__(
+        self,
+        queue_size: int = 100,
+        dedupe_window_seconds: float = 300.0,
+        timeout_seconds: float = 10.0,
+    ):
+        self._queue_size = queue_size
+        self._dedupe_window = dedupe_window_seconds
+        self._timeout = timeout_seconds
+        self._windows: Dict[str, _DedupeWindow] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._blocked_until = 0.0
+        self.dropped = 0
+
+    def configure(self, queue_size: int, dedupe_window_seconds: float, timeout_seconds: float) -> None:
+        self._queue_size = queue_size
+        self._dedupe_window = dedupe_window_seconds
+        self._timeout = timeout_seconds
+
+    def submit(self, delivery: _Delivery, dedupe_key: Optional[str] = None) -> None:
+        """Queue ``delivery`` without blocking; repeats inside the window are only counted."""
+        now = time.monotonic()
+        if dedupe_key is not None and self._dedupe_window > 0:
+            window = self._windows.get(dedupe_key)
+            if window is not None and now - window.opened_at < self._dedupe_window:
+                window.repeats += 1
+                return
+            if window is not None and window.repeats:
+                self._enqueue(_folded(window))
+            self._windows[dedupe_key] = _DedupeWindow(delivery=delivery, opened_at=now)
+        self._enqueue(delivery)
+
+    def _enqueue(self, delivery: _Delivery) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from synchronous code (CLI tools): deliver inline.
+            self._deliver_blocking(delivery)
+            return
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._start(loop)
+        try:
+            self._queue.put_nowait(delivery)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(
+                "discord.queue_full",
+                extra={"extra_data": {"dropped": self.dropped, "queue_size": self._queue_size}},
+            )
+
+    def _start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._client = None
+        self._worker = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        try:
+            while True:
+                try:
+                    delivery = await asyncio.wait_for(
+                        self._queue.get(), timeout=self._next_window_close()
+                    )
+                except asyncio.TimeoutError:
+                    delivery = None
+                if delivery is not None:
+                    try:
+                        await self._deliver(delivery)
+                    except Exception as exc:  # keep the worker alive for later alerts
+                        _log_delivery_failure(delivery, str(exc))
+                    finally:
+                        self._queue.task_done()
+                self._close_windows(time.monotonic())
+        finally:
+            if self._client is not None:
+                await self._client.aclose()
+                self._client = None
+
+    def _next_window_close(self) -> Optional[float]:
+        pending = [
+            window.opened_at + self._dedupe_window
+            for window in self._windows.values()
+            if window.repeats
+        ]
+        if not pending:
+            return None
+        return max(0.0, min(pending) - time.monotonic())
+
+    def _close_windows(self, now: float, force: bool = False) -> None:
+        for key, window in list(self._windows.items()):
+            if force or now - window.opened_at >= self._dedupe_window:
+                del self._windows[key]
+                if window.repeats:
+                    self._enqueue(_folded(window))
+
+    async def _deliver(self, delivery: _Delivery) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self._timeout)
+        for _ in range(self._MAX_RATE_LIMIT_RETRIES + 1):
+            wait = self._blocked_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                if delivery.file is not None:
+                    file_name, content = delivery.file
+                    response = await self._client.post(
+                        delivery.webhook_url,
+                        data={"payload_json": json.dumps(delivery.payload)},
+                        files={"file": (file_name, content)},
+                    )
+                else:
+                    response = await self._client.post(delivery.webhook_url, json=delivery.payload)
+            except httpx.HTTPError as exc:
+                _log_delivery_failure(delivery, str(exc))
+                return
+            if self._note_rate_limit(response):
+                continue
+            if response.is_error:
+                _log_delivery_failure(delivery, f"HTTP {response.status_code}")
+            return
+        _log_delivery_failure(delivery, "rate limited")
+
+    def _deliver_blocking(self, delivery: _Delivery) -> None:
+        try:
+            with httpx.Client(timeout=self._timeout) as client:
+                if delivery.file is not None:
+                    file_name, content = delivery.file
+                    response = client.post(
+                        delivery.webhook_url,
+                        data={"payload_json": json.dumps(delivery.payload)},
+                        files={"file": (file_name, content)},
+                    )
+                else:
+                    response = client.post(delivery.webhook_url, json=delivery.payload)
+        except httpx.HTTPError as exc:
+            _log_delivery_failure(delivery, str(exc))
+            return
+        if response.is_error:
+            _log_delivery_failure(delivery, f"HTTP {response.status_code}")
+
+    def _note_rate_limit(self, response: httpx.Response) -> bool:
+        """Record Discord's rate-limit state; True when the request must be resent."""
+        now = time.monotonic()
+        headers = response.headers
+        if headers.get("X-RateLimit-Remaining") == "0":
+            try:
+                reset_after = float(headers.get("X-RateLimit-Reset-After", "0"))
+            except ValueError:
+                reset_after = 0.0
+            self._blocked_until = max(self._blocked_until, now + reset_after)
+        if response.status_code != 429:
+            return False
+        retry_after: Optional[float] = None
+        try:
+            retry_after = float(response.json().get("retry_after"))
+        except (ValueError, TypeError, AttributeError):
+            try:
+                retry_after = float(headers.get("Retry-After", ""))
+            except ValueError:
+                retry_after = 1.0
+        self._blocked_until = max(self._blocked_until, now + retry_after)
+        logger.warning(
+            "discord.rate_limited",
+            extra={"extra_data": {"retry_after": retry_after}},
+        )
+        return True
+
+    async def flush(self, timeout: Optional[float] = None) -> None:
+        """Send folded repeats and everything queued, then stop the worker."""
+        self._close_windows(time.monotonic(), force=True)
+        if self._worker is None or self._worker.done() or self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "discord.flush_timeout",
+                extra={"extra_data": {"pending": self._queue.qsize()}},
+            )
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+
+
+def _folded(window: _DedupeWindow) -> _Delivery:
+    """Copy of the window's alert marked with how many times it fired."""
+    payload = json.loads(json.dumps(window.delivery.payload))
+    occurrences = window.repeats + 1
+    embeds = payload.get("embeds")
+    if embeds:
+        embed = embeds[0]
+        embed["title"] = f"{embed.get('title') or 'Alert'} ({occurrences} occurrences)"
+        embed.setdefault("fields", []).insert(
+            0, {"name": "OCCURRENCES", "value": str(occurrences), "inline": False}
+        )
+        embed["timestamp"] = datetime.now(tz=timezone.utc).isoformat()
+    else:
+        payload["content"] = f"{payload.get('content', '')} ({occurrences} occurrences)"
+    return _Delivery(webhook_url=window.delivery.webhook_url, payload=payload)
+
+
+def _log_delivery_failure(delivery: _Delivery, error: str) -> None:
+    logger.error(
+        "discord.send_failed",
+        extra={
+            "extra_data": {
+                "error": error,
+                "webhook_url": _mask_webhook(delivery.webhook_url),
+            }
+        },
+    )
+
+
+def _dedupe_key(delivery: _Delivery) -> str:
+    content = dict(delivery.payload)
+    content["embeds"] = [
+        {key: value for key, value in embed.items() if key != "timestamp"}
+        for embed in content.get("embeds", [])
+    ]
+    raw = json.dumps([delivery.webhook_url, content], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+_DISPATCHER = DiscordDispatcher()
+
+
+def get_dispatcher() -> DiscordDispatcher:
+    return _DISPATCHER
+
+
+async def flush_discord_alerts(timeout: Optional[float] = 10.0) -> None:
+    """Deliver queued and folded alerts before the process exits."""
+    await _DISPATCHER.flush(timeout)
+
+
 class DiscordAlert:
     """Discord webhook alert system for sending notifications."""
 
@@ -84,26 +357,19 @@ class DiscordAlert:
             author: Optional author/username override
         """
         try:
-            hook = Webhook(webhook_url)
-            kwargs: Dict[str, Any] = {}
-            if author:
-                kwargs["username"] = author
-            elif self._default_author:
-                kwargs["username"] = self._default_author
-
-            threading.Thread(
-                target=hook.send,
-                args=(str(message),),
-                kwargs=kwargs,
-                daemon=True,
-            ).start()
+            payload: Dict[str, Any] = {"content": str(message)}
+            author_name = author or self._default_author
+            if author_name:
+                payload["username"] = author_name
+            delivery = _Delivery(webhook_url=webhook_url, payload=payload)
+            _DISPATCHER.submit(delivery, dedupe_key=_dedupe_key(delivery))
         except Exception as e:
             logger.error(
                 "discord.text_alert_failed",
                 extra={
                     "extra_data": {
                         "error": str(e),
-                        "webhook_url": webhook_url[:50] + "..." if len(webhook_url) > 50 else webhook_url,
+                        "webhook_url": _mask_webhook(webhook_url),
                     }
                 },
             )
@@ -131,18 +397,16 @@ class DiscordAlert:
             color_name = message.get("color", self._default_color)
             color = self._colors.get(color_name, self._colors[self._default_color])
 
-            # Build embed options
-            embed_options: Dict[str, Any] = {
+            embed: Dict[str, Any] = {
                 "color": color,
-                "timestamp": "now",
+                "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+                "fields": [],
             }
 
             if title:
-                embed_options["title"] = title
+                embed["title"] = title
             if description:
-                embed_options["description"] = description
-
-            embed = Embed(**embed_options)
+                embed["description"] = description
 
             # Add fields based on whitelist
             for key, value in message.items():
@@ -152,34 +416,31 @@ class DiscordAlert:
 
                 # Check if field should be included
                 if "all" in self._whitelist or key in self._whitelist:
-                    embed.add_field(
-                        name=str(key).upper().replace("_", " "),
-                        value=str(value),
-                        inline=False,
+                    embed["fields"].append(
+                        {
+                            "name": str(key).upper().replace("_", " "),
+                            "value": str(value),
+                            "inline": False,
+                        }
                     )
 
-            # Set up webhook
-            hook = Webhook(webhook_url)
-            kwargs: Dict[str, Any] = {"embed": embed}
+            payload: Dict[str, Any] = {"embeds": [embed]}
 
             # Set author if provided
             author_name = author or self._default_author
             if author_name:
-                embed.set_author(name=author_name)
-                kwargs["username"] = author_name
-
-            threading.Thread(
-                target=hook.send,
-                kwargs=kwargs,
-                daemon=True,
-            ).start()
+                embed["author"] = {"name": author_name}
+                payload["username"] = author_name
+
+            delivery = _Delivery(webhook_url=webhook_url, payload=payload)
+            _DISPATCHER.submit(delivery, dedupe_key=_dedupe_key(delivery))
         except Exception as e:
             logger.error(
                 "discord.embed_alert_failed",
                 extra={
                     "extra_data": {
                         "error": str(e),
-                        "webhook_url": webhook_url[:50] + "..." if len(webhook_url) > 50 else webhook_url,
+                        "webhook_url": _mask_webhook(webhook_url),
                     }
                 },
             )
@@ -273,8 +534,6 @@ class DiscordAlert:
             )
 
         try:
-            hook = Webhook(webhook)
-
             # Handle different file input types
             if isinstance(file_to_send, (str, Path)):
                 file_path = Path(file_to_send)
@@ -282,28 +541,29 @@ class DiscordAlert:
                     raise FileNotFoundError(f"File not found: {file_path}")
                 if not file_name:
                     file_name = file_path.name
-                _file = File(str(file_path), name=file_name)
+                content = file_path.read_bytes()
             elif isinstance(file_to_send, bytes):
                 if not file_name:
                     raise ValueError("file_name is required when file_to_send is bytes")
-                _file = File(file_to_send, name=file_name)
+                content = file_to_send
             else:
                 # Assume it's a file-like object
                 if not file_name:
                     raise ValueError("file_name is required when file_to_send is a file-like object")
-                _file = File(file_to_send, name=file_name)
+                content = file_to_send.read()
+                if isinstance(content, str):
+                    content = content.encode("utf-8")
 
-            kwargs: Dict[str, Any] = {"file": _file}
+            payload: Dict[str, Any] = {}
 
             author_name = author or self._default_author
             if author_name:
-                kwargs["username"] = author_name
+                payload["username"] = author_name
 
-            threading.Thread(
-                target=hook.send,
-                kwargs=kwargs,
-                daemon=True,
-            ).start()
+            # Files are never deduplicated.
+            _DISPATCHER.submit(
+                _Delivery(webhook_url=webhook, payload=payload, file=(file_name, content))
+            )
         except Exception as e:
             logger.error(
                 "discord.file_send_failed",
@@ -311,7 +571,7 @@ class DiscordAlert:
                     "extra_data": {
                         "error": str(e),
                         "file_name": file_name,
-                        "webhook_url": webhook[:50] + "..." if len(webhook) > 50 else webhook,
+                        "webhook_url": _mask_webhook(webhook),
                     }
                 },
             )
@@ -338,6 +598,11 @@ def get_discord_alert(settings: Any) -> Optional[DiscordAlert]:
     if not settings.discord.webhook_url:
         return None
 
+    _DISPATCHER.configure(
+        queue_size=settings.discord.queue_size,
+        dedupe_window_seconds=settings.discord.dedupe_window_seconds,
+        timeout_seconds=settings.discord.timeout_seconds,
+    )
     return DiscordAlert(
         default_webhook_url=settings.discord.webhook_url,
         default_author=settings.discord.author,
@@ -1,27 +1,31 @@
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
+import os
+import pathlib
 import smtplib
 import ssl
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from typing import Iterable, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import EmailConfig, Settings
 
 logger = logging.getLogger(__name__)
 
 
-def _send_email_sync(
+def _build_message(
     to_email: str,
     subject: str,
     html_body: str,
     from_email: str,
-    smtp_server: str,
-    smtp_port: int,
-    smtp_user: str,
-    smtp_password: str,
     bcc: Optional[Iterable[str]] = None,
-) -> None:
+) -> Tuple[MIMEMultipart, List[str]]:
     message = MIMEMultipart("alternative")
     message["Subject"] = subject
     message["From"] = from_email
@@ -33,6 +37,21 @@ def _send_email_sync(
     recipients: List[str] = [to_email]
     if bcc:
         recipients.extend([addr for addr in bcc if addr])
+    return message, recipients
+
+
+def _send_email_sync(
+    to_email: str,
+    subject: str,
+    html_body: str,
+    from_email: str,
+    smtp_server: str,
+    smtp_port: int,
+    smtp_user: str,
+    smtp_password: str,
+    bcc: Optional[Iterable[str]] = None,
+) -> None:
+    message, recipients = _build_message(to_email, subject, html_body, from_email, bcc)
 
     context = ssl.create_default_context()
     with smtplib.SMTP_SSL(smtp_server, smtp_port, context=context) as server:
@@ -85,3 +104,360 @@ async def send_email(
             },
         )
         raise
+
+
+def _utcnow() -> datetime:
+    return datetime.now(tz=timezone.utc)
+
+
+class SmtpSession:
+    """One authenticated ``SMTP_SSL`` connection reused across messages.
+
+    The connection is opened on first use and re-opened after it has been idle for
+    ``idle_timeout_seconds`` or the server dropped it. Not thread-safe: the outbox
+    worker is its only user.
+    """
+
+    def __init__(self, config: EmailConfig):
+        self._config = config
+        self._server: Optional[smtplib.SMTP_SSL] = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP_SSL:
+        context = ssl.create_default_context()
+        server = smtplib.SMTP_SSL(
+            self._config.smtp_server,
+            self._config.smtp_port,
+            context=context,
+            timeout=self._config.timeout_seconds,
+        )
+        server.login(self._config.smtp_user, self._config.smtp_password)
+        logger.debug("email.smtp_connected", extra={"extra_data": {"server": self._config.smtp_server}})
+        return server
+
+    def send(self, message: MIMEMultipart, recipients: List[str]) -> None:
+        if self._server is not None and self.idle_for() >= self._config.idle_timeout_seconds:
+            self.close()
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.sendmail(self._config.from_email, recipients, message.as_string())
+        except smtplib.SMTPServerDisconnected:
+            # The server timed the session out between messages; retry once on a fresh one.
+            self._server = self._connect()
+            self._server.sendmail(self._config.from_email, recipients, message.as_string())
+        self._last_used = time.monotonic()
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self._last_used
+
+    @property
+    def connected(self) -> bool:
+        return self._server is not None
+
+    def close(self) -> None:
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._server = None
+
+
+def _is_transient(exc: Exception) -> bool:
+    """4xx replies, dropped connections and network errors are worth retrying.
+
+    Every :class:`smtplib.SMTPException` is also an :class:`OSError`, so SMTP errors
+    are classified first: by reply code when there is one, and otherwise as
+    permanent (missing AUTH or STARTTLS support, for example) unless the server
+    simply hung up. Only then is a plain ``OSError`` treated as a network failure.
+    """
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(exc, smtplib.SMTPException):
+        return False
+    return isinstance(exc, OSError)
+
+
+class EmailOutbox:
+    """Durable outbound mail queue: one JSON file per message under ``pending/``.
+
+    :meth:`enqueue` only writes a file, so callers never wait on SMTP. A worker
+    (:meth:`start`, or a one-off :meth:`send_due`) sends due messages in creation
+    order over a shared :class:`SmtpSession`, at most ``max_per_minute`` per
+    minute. Transient failures back off exponentially; messages that fail
+    permanently or run out of attempts are moved to ``failed/``.
+
+    Several processes may drain the same directory (the API and the scheduler), so
+    each message is claimed by renaming it into ``inflight/`` before it is sent; a
+    process that loses the rename skips the message. Claims older than
+    ``inflight_timeout_seconds`` (a worker died mid-send) are returned to ``pending/``.
+    """
+
+    def __init__(self, config: EmailConfig, directory: pathlib.Path):
+        self._config = config
+        self._pending = directory / "pending"
+        self._failed = directory / "failed"
+        self._inflight = directory / "inflight"
+        self._pending.mkdir(parents=True, exist_ok=True)
+        self._failed.mkdir(parents=True, exist_ok=True)
+        self._inflight.mkdir(parents=True, exist_ok=True)
+        self._session = SmtpSession(config)
+        self._interval = 60.0 / config.max_per_minute
+        self._last_sent = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._send_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+
+    @property
+    def worker_running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def enqueue(
+        self,
+        to_email: str,
+        subject: str,
+        html_body: str,
+        bcc: Optional[Iterable[str]] = None,
+    ) -> str:
+        message_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        now = _utcnow().isoformat()
+        self._write(
+            self._pending / f"{message_id}.json",
+            {
+                "id": message_id,
+                "to": to_email,
+                "subject": subject,
+                "html": html_body,
+                "bcc": [addr for addr in (bcc or []) if addr],
+                "attempts": 0,
+                "created_at": now,
+                "next_attempt_at": now,
+                "last_error": None,
+            },
+        )
+        logger.info("email.queued", extra={"extra_data": {"to": to_email, "id": message_id}})
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return message_id
+
+    def pending_count(self) -> int:
+        return sum(1 for _ in self._pending.glob("*.json"))
+
+    def _write(self, path: pathlib.Path, data: Dict[str, Any]) -> None:
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as handle:
+            json.dump(data, handle)
+        os.replace(tmp_path, path)
+
+    def _due(self, now: datetime) -> List[Tuple[pathlib.Path, Dict[str, Any]]]:
+        self._recover_stale_claims()
+        due = []
+        # File names start with a nanosecond timestamp, so sorting keeps creation order.
+        for path in sorted(self._pending.glob("*.json")):
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                # Claimed or finished by another process since the glob.
+                continue
+            except (OSError, ValueError) as exc:
+                logger.error(
+                    "email.outbox_corrupt",
+                    extra={"extra_data": {"path": str(path), "error": str(exc)}},
+                )
+                try:
+                    os.replace(path, self._failed / path.name)
+                except FileNotFoundError:
+                    pass
+                continue
+            if datetime.fromisoformat(data["next_attempt_at"]) <= now:
+                due.append((path, data))
+        return due
+
+    def _claim(self, path: pathlib.Path) -> Optional[pathlib.Path]:
+        """Move ``path`` into ``inflight/``; ``None`` if another process got it first."""
+        claimed = self._inflight / path.name
+        try:
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            return None
+        # The rename keeps the queued file's mtime; restamp it so stale-claim recovery
+        # measures from the claim, not from when the message was queued.
+        os.utime(claimed)
+        return claimed
+
+    def _recover_stale_claims(self) -> None:
+        cutoff = time.time() - self._config.inflight_timeout_seconds
+        for path in self._inflight.glob("*.json"):
+            try:
+                if path.stat().st_mtime > cutoff:
+                    continue
+                os.replace(path, self._pending / path.name)
+            except FileNotFoundError:
+                continue
+            logger.warning("email.claim_recovered", extra={"extra_data": {"path": str(path)}})
+
+    async def send_due(self) -> Dict[str, int]:
+        """Send every due message once; returns sent/retrying/failed counts."""
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+        counts = {"sent": 0, "retrying": 0, "failed": 0}
+        async with self._send_lock:
+            for path, data in self._due(_utcnow()):
+                wait = self._last_sent + self._interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                # Checked between messages only: a send that has started always
+                # finishes and is recorded, or the claim would be sent again later.
+                if self._stopping:
+                    break
+                claimed = self._claim(path)
+                if claimed is None:
+                    continue
+                counts[await self._send_one(claimed, data)] += 1
+        return counts
+
+    async def _send_one(self, path: pathlib.Path, data: Dict[str, Any]) -> str:
+        message, recipients = _build_message(
+            data["to"], data["subject"], data["html"], self._config.from_email, data["bcc"]
+        )
+        self._last_sent = time.monotonic()
+        try:
+            await asyncio.to_thread(self._session.send, message, recipients)
+        except Exception as exc:
+            self._session.close()
+            data["attempts"] += 1
+            data["last_error"] = str(exc)
+            if _is_transient(exc) and data["attempts"] < self._config.max_attempts:
+                delay = self._config.retry_delay_seconds * 2 ** (data["attempts"] - 1)
+                data["next_attempt_at"] = (_utcnow() + timedelta(seconds=delay)).isoformat()
+                self._write(self._pending / path.name, data)
+                path.unlink(missing_ok=True)
+                logger.warning(
+                    "email.retry_scheduled",
+                    extra={
+                        "extra_data": {
+                            "to": data["to"],
+                            "attempts": data["attempts"],
+                            "next_attempt_at": data["next_attempt_at"],
+                            "error": str(exc),
+                        }
+                    },
+                )
+                return "retrying"
+            self._write(self._failed / path.name, data)
+            path.unlink(missing_ok=True)
+            logger.error(
+                "email.failed",
+                extra={
+                    "extra_data": {
+                        "to": data["to"],
+                        "attempts": data["attempts"],
+                        "error": str(exc),
+                    }
+                },
+            )
+            return "failed"
+        path.unlink(missing_ok=True)
+        logger.info(
+            "email.sent",
+            extra={
+                "extra_data": {
+                    "to": data["to"],
+                    "bcc": recipients[1:],
+                    "attempts": data["attempts"] + 1,
+                }
+            },
+        )
+        return "sent"
+
+    def start(self) -> None:
+        """Run :meth:`send_due` in a background task until :meth:`stop`."""
+        if self.worker_running:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                await self.send_due()
+            except Exception as exc:  # keep the worker alive
+                logger.error("email.outbox_worker_error", extra={"extra_data": {"error": str(exc)}})
+            timeout = self._next_wakeup()
+            if self._stopping:
+                break
+            if self._session.connected:
+                idle_left = self._config.idle_timeout_seconds - self._session.idle_for()
+                if idle_left <= 0:
+                    await asyncio.to_thread(self._session.close)
+                else:
+                    timeout = idle_left if timeout is None else min(timeout, idle_left)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _next_wakeup(self) -> Optional[float]:
+        """Seconds until the earliest scheduled retry, if any."""
+        earliest: Optional[datetime] = None
+        for path in self._pending.glob("*.json"):
+            try:
+                next_at = datetime.fromisoformat(
+                    json.loads(path.read_text(encoding="utf-8"))["next_attempt_at"]
+                )
+            except (OSError, ValueError, KeyError):
+                continue
+            if earliest is None or next_at < earliest:
+                earliest = next_at
+        if earliest is None:
+            return None
+        return max(0.0, (earliest - _utcnow()).total_seconds())
+
+    async def stop(self) -> None:
+        """Stop the worker and close the SMTP session; queued mail stays on disk.
+
+        A message already being sent is allowed to finish, so it is never left claimed
+        in ``inflight/`` to be sent a second time after recovery.
+        """
+        self._stopping = True
+        if self._worker is not None:
+            assert self._wakeup is not None
+            self._wakeup.set()
+            # Shielded so that cancelling stop() does not cancel a send mid-flight.
+            await asyncio.gather(asyncio.shield(self._worker), return_exceptions=True)
+            self._worker = None
+            self._wakeup = None
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+        # A one-off send_due() may still hold the session.
+        async with self._send_lock:
+            await asyncio.to_thread(self._session.close)
+        self._stopping = False
+
+
+_OUTBOXES: Dict[pathlib.Path, EmailOutbox] = {}
+
+
+def get_outbox(settings: Settings) -> Optional[EmailOutbox]:
+    """Shared outbox for ``settings``, or ``None`` when email or the outbox is disabled."""
+    config = settings.email
+    if config is None or not config.outbox_enabled:
+        return None
+    directory = (
+        pathlib.Path(config.outbox_dir) if config.outbox_dir else settings.masterdata_path / "outbox"
+    ).resolve()
+    outbox = _OUTBOXES.get(directory)
+    if outbox is None:
+        outbox = EmailOutbox(config, directory)
+        _OUTBOXES[directory] = outbox
+    return outbox
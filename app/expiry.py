@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from .config import Settings, get_settings
+from .io import ApiError, TradingViewClient
+from .locks import masterdata_lock
+from .storage import AccessRecord, GrantHistoryEntry, MasterData, load_master, save_masters
+
+logger = logging.getLogger(__name__)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(tz=timezone.utc)
+
+
+async def revoke_expired_access(
+    settings: Optional[Settings] = None,
+    tv_client: Optional[TradingViewClient] = None,
+    now: Optional[datetime] = None,
+) -> Dict:
+    """Revoke TradingView access for every active user whose expiry has passed.
+
+    Due users come off each master's expiry index, so a run touches only the k
+    expired records (O(k log n)) rather than scanning every user.
+    """
+    settings = settings or get_settings()
+    owned_client = tv_client is None
+    if tv_client is None:
+        tv_client = TradingViewClient(settings)
+    try:
+        async with masterdata_lock(settings):
+            return await _revoke_expired_access(settings, tv_client, now or _utcnow())
+    finally:
+        if owned_client:
+            await tv_client.aclose()
+
+
+async def _revoke_expired_access(
+    settings: Settings, tv_client: TradingViewClient, now: datetime
+) -> Dict:
+    config = settings.expiry
+    dry_run = settings.scheduler.dry_run
+    cutoff = now - timedelta(hours=config.grace_hours)
+    script_ids = sorted({product.script_id for product in settings.products.values()})
+    masters = {script_id: load_master(settings, script_id) for script_id in script_ids}
+
+    due: List[Tuple[MasterData, str, AccessRecord]] = []
+    for master in masters.values():
+        due.extend((master, username, record) for username, record in master.pop_expired(cutoff))
+
+    summary = {
+        "due": len(due),
+        "revoked": 0,
+        "failed": 0,
+        "deferred_pending_retry": 0,
+        "dry_run_skipped": 0,
+        "cutoff": cutoff.isoformat(),
+    }
+
+    async def revoke(master: MasterData, username: str, record: AccessRecord) -> None:
+        # Safety check: a queued grant for this user may still extend their access.
+        if any(
+            str(entry.payload.get("username") or "").lower() == username.lower()
+            for entry in master.retry_queue
+        ):
+            summary["deferred_pending_retry"] += 1
+            logger.info(
+                "expiry.deferred_pending_retry",
+                extra={"extra_data": {"scriptId": master.script_id, "username": username}},
+            )
+            return
+
+        if dry_run:
+            summary["dry_run_skipped"] += 1
+            logger.info(
+                "dry_run.revoke",
+                extra={
+                    "extra_data": {
+                        "scriptId": master.script_id,
+                        "username": username,
+                        "expiry": record.expiry.isoformat(),
+                    }
+                },
+            )
+            return
+
+        try:
+            await tv_client.revoke_access(master.script_id, username)
+        except ApiError as exc:
+            summary["failed"] += 1
+            logger.error(
+                "expiry.revoke_failed",
+                extra={
+                    "extra_data": {
+                        "scriptId": master.script_id,
+                        "username": username,
+                        "error": str(exc),
+                    }
+                },
+            )
+            return
+
+        record.status = "revoked"
+        record.history.append(
+            GrantHistoryEntry(
+                transaction_id=record.last_transaction_id,
+                action="revoke",
+                expires_at=record.expiry,
+                processed_at=_utcnow(),
+                note="expired",
+            )
+        )
+        master.mark_user_dirty(username)
+        summary["revoked"] += 1
+        logger.info(
+            "expiry.revoked",
+            extra={
+                "extra_data": {
+                    "scriptId": master.script_id,
+                    "username": username,
+                    "expiry": record.expiry.isoformat(),
+                }
+            },
+        )
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in due:
+        queue.put_nowait(item)
+
+    async def worker() -> None:
+        while True:
+            try:
+                master, username, record = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await revoke(master, username, record)
+
+    await asyncio.gather(*(worker() for _ in range(min(config.concurrency, len(due)))))
+
+    save_masters(settings, masters.values())
+    logger.info("expiry.completed", extra={"extra_data": summary})
+    return summary
@@ -0,0 +1,163 @@
+"""Nearest-username lookups for TradingView renames and typos.
+
+:class:`UsernameIndex` keeps a trigram inverted index over known usernames. A query
+counts shared trigrams against the posting lists; one edit can destroy at most three
+of the query's trigrams, so a candidate within ``max_distance`` (k) edits shares at
+least one of any 3k + 1 of them. Candidates come from the 3k + 1 rarest posting
+lists only and are then scored with a banded Levenshtein distance. Queries too short
+for the filter to prune anything scan the names of nearby length instead.
+"""
+
+from __future__ import annotations
+
+import pathlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .tv_users import iter_tv_users
+
+_PAD = "\x00\x00"
+
+
+class FuzzyMatch(NamedTuple):
+    username: str
+    distance: int
+
+
+def _trigrams(name: str) -> Set[str]:
+    padded = f"{_PAD}{name}{_PAD}"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def levenshtein(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """Edit distance between ``a`` and ``b``.
+
+    With ``max_distance`` only a diagonal band is computed and any distance beyond
+    the bound is reported as ``max_distance + 1``.
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    bound = max_distance if max_distance is not None else len(a)
+    if len(a) - len(b) > bound:
+        return bound + 1
+    if not b:
+        return len(a)
+
+    over = bound + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        low = max(1, i - bound)
+        high = min(len(b), i + bound)
+        current = [over] * (len(b) + 1)
+        current[0] = i if i <= bound else over
+        row_min = current[0]
+        for j in range(low, high + 1):
+            cost = 0 if char_a == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            current[j] = value if value <= bound else over
+            if value < row_min:
+                row_min = value
+        if row_min > bound:
+            return over
+        previous = current
+    return min(previous[len(b)], over)
+
+
+class UsernameIndex:
+    """Case-insensitive top-k nearest usernames by edit distance."""
+
+    def __init__(self, usernames: Iterable[str] = ()) -> None:
+        self._names: List[str] = []  # lowercase, position is the posting id
+        self._display: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._by_length: Dict[int, List[int]] = defaultdict(list)
+        self.add_all(usernames)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, username: str) -> bool:
+        return username.strip().lower() in self._positions
+
+    def add(self, username: str) -> None:
+        display = username.strip()
+        key = display.lower()
+        if not key or key in self._positions:
+            return
+        position = len(self._names)
+        self._positions[key] = position
+        self._names.append(key)
+        self._display.append(display)
+        for gram in _trigrams(key):
+            self._postings[gram].append(position)
+        self._by_length[len(key)].append(position)
+
+    def add_all(self, usernames: Iterable[str]) -> None:
+        for username in usernames:
+            self.add(username)
+
+    def _candidates(self, key: str, max_distance: int) -> Iterable[int]:
+        grams = _trigrams(key)
+        if len(grams) <= 3 * max_distance:
+            return (
+                position
+                for length in range(len(key) - max_distance, len(key) + max_distance + 1)
+                for position in self._by_length.get(length, ())
+            )
+        # Of any 3k + 1 query trigrams a match keeps at least one, so the rarest
+        # 3k + 1 posting lists are enough to find every candidate.
+        postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        candidates: Set[int] = set()
+        for posting in postings[: 3 * max_distance + 1]:
+            candidates.update(posting)
+        return candidates
+
+    def nearest(
+        self,
+        username: str,
+        limit: int = 5,
+        max_distance: int = 2,
+        include_exact: bool = False,
+    ) -> List[FuzzyMatch]:
+        """Up to ``limit`` known usernames within ``max_distance`` edits, closest first.
+
+        The distance is capped at a quarter of the query's length (at least 1): two
+        edits away from a five-letter name is a different name, not a typo.
+        """
+        key = username.strip().lower()
+        if not key or limit <= 0:
+            return []
+        max_distance = min(max_distance, max(1, len(key) // 4))
+        scored: List[Tuple[int, str, int]] = []
+        for position in self._candidates(key, max_distance):
+            name = self._names[position]
+            if name == key and not include_exact:
+                continue
+            if abs(len(name) - len(key)) > max_distance:
+                continue
+            distance = levenshtein(key, name, max_distance)
+            if distance <= max_distance:
+                scored.append((distance, name, position))
+        scored.sort()
+        return [FuzzyMatch(self._display[position], distance) for distance, _, position in scored[:limit]]
+
+
+_CSV_USERNAMES: Dict[str, Tuple[Tuple[int, int], List[str]]] = {}
+
+
+def tv_export_usernames(path: pathlib.Path) -> List[str]:
+    """Usernames from a TradingView export CSV, re-read only when the file changes."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return []
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    cached = _CSV_USERNAMES.get(str(path))
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    usernames = [user.username for user in iter_tv_users(path)]
+    _CSV_USERNAMES[str(path)] = (stamp, usernames)
+    return usernames
@@ -1,13 +1,22 @@
 from __future__ import annotations
 
 import asyncio
+import codecs
+import json
 import logging
+import os
+import pathlib
+import re
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, List, NoReturn, Optional, Sequence, Tuple
 
 import httpx
 
-from .config import Settings
+from . import metrics
+from .config import CircuitBreakerConfig, RateLimitConfig, Settings, ValidationCacheConfig
 
 logger = logging.getLogger(__name__)
 
@@ -19,20 +28,409 @@ class ApiError(RuntimeError):
         self.payload = payload or {}
 
 
+class CircuitOpenError(ApiError):
+    """Raised without touching the network while an endpoint's circuit is open."""
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker for one remote endpoint.
+
+    ``failure_threshold`` consecutive failures open the circuit; calls then fail
+    fast with :class:`CircuitOpenError` until ``recovery_seconds`` have passed, when
+    up to ``half_open_max_calls`` concurrent trial calls decide whether it closes or
+    reopens. Each state change is logged and sent to Discord once.
+
+    Callers pass the token from :meth:`before_call` to :meth:`release` in a
+    ``finally`` block, so a trial that is cancelled or fails without a recorded
+    outcome gives its slot back instead of holding the circuit half-open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, config: CircuitBreakerConfig, settings: Settings):
+        self.name = name
+        self._config = config
+        self._settings = settings
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        # Bumped on every move to half-open, so late releases from an earlier
+        # trial window cannot free a slot in the current one.
+        self._trial_window = 0
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are rejected outright (open and not yet due for a trial)."""
+        return (
+            self.state == self.OPEN
+            and time.monotonic() - self._opened_at < self._config.recovery_seconds
+        )
+
+    def before_call(self) -> Optional[int]:
+        """Admit a call or raise :class:`CircuitOpenError`; returns a trial token or None."""
+        if self.state == self.OPEN:
+            if self.is_open:
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            self._trial_calls = 0
+            self._trial_window += 1
+            self._transition(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._trial_calls >= self._config.half_open_max_calls:
+                raise CircuitOpenError(f"{self.name} circuit is half-open")
+            self._trial_calls += 1
+            return self._trial_window
+        return None
+
+    def release(self, token: Optional[int]) -> None:
+        """Give back the trial slot taken by :meth:`before_call`, if any."""
+        if (
+            token is not None
+            and token == self._trial_window
+            and self.state == self.HALF_OPEN
+            and self._trial_calls > 0
+        ):
+            self._trial_calls -= 1
+
+    def record_success(self) -> None:
+        self._failures = 0
+        if self.state != self.CLOSED:
+            self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self._config.failure_threshold:
+            self._opened_at = time.monotonic()
+            if self.state != self.OPEN:
+                self._transition(self.OPEN)
+
+    def _transition(self, state: str) -> None:
+        previous, self.state = self.state, state
+        details = {
+            "circuit": self.name,
+            "from": previous,
+            "to": state,
+            "consecutive_failures": self._failures,
+        }
+        log = logger.info if state == self.CLOSED else logger.warning
+        log("circuit.state_changed", extra={"extra_data": details})
+        try:
+            from .discord_alert import send_discord_alert_if_enabled
+            send_discord_alert_if_enabled(
+                self._settings,
+                message={
+                    "title": f"Circuit {state.replace('_', '-')}: {self.name}",
+                    "description": (
+                        f"{self.name} is failing; calls are short-circuited for "
+                        f"{self._config.recovery_seconds:g}s at a time"
+                        if state == self.OPEN
+                        else f"{self.name} circuit moved from {previous} to {state}"
+                    ),
+                    **details,
+                    "color": {"open": "red", "half_open": "orange", "closed": "green"}[state],
+                },
+            )
+        except Exception:
+            pass  # Don't let Discord failures break the main flow
+
+
 def _join_url(base: str, endpoint: str) -> str:
     if endpoint.startswith("http"):
         return endpoint
     return f"{base.rstrip('/')}/{endpoint.lstrip('/')}"
 
 
-class WordPressClient:
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_http_client(settings: Settings, timeout: float) -> httpx.AsyncClient:
+    """Create a pooled keep-alive client using the shared ``http`` settings."""
+    http = settings.http
+    limits = httpx.Limits(
+        max_connections=http.max_connections,
+        max_keepalive_connections=http.max_keepalive_connections,
+        keepalive_expiry=http.keepalive_expiry_seconds,
+    )
+    http2 = http.http2
+    if http2 and not _http2_available():
+        logger.warning(
+            "http.http2_unavailable",
+            extra={"extra_data": {"reason": "h2 package not installed"}},
+        )
+        http2 = False
+    return httpx.AsyncClient(timeout=timeout, limits=limits, http2=http2)
+
+
+class ValidationCache:
+    """LRU cache of ``validate_username`` responses keyed on lowercase username.
+
+    Valid and invalid results expire after separate TTLs. Only the fields the sync
+    relies on (``validUser``, ``verifiedUserName``, ``allUserSuggestions``) are kept.
+    """
+
+    _FIELDS = ("validUser", "verifiedUserName", "allUserSuggestions")
+
+    def __init__(self, config: ValidationCacheConfig):
+        self._config = config
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._path = pathlib.Path(config.persist_path) if config.persist_path else None
+        self.hits = 0
+        self.misses = 0
+        if self._path is not None:
+            self._load()
+
+    def get(self, username: str) -> Optional[Dict[str, Any]]:
+        key = username.lower()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(result)
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, username: str, result: Dict[str, Any]) -> None:
+        ttl = (
+            self._config.positive_ttl_seconds
+            if result.get("validUser")
+            else self._config.negative_ttl_seconds
+        )
+        if ttl <= 0:
+            return
+        key = username.lower()
+        cached = {field: result[field] for field in self._FIELDS if field in result}
+        self._entries[key] = (time.time() + ttl, cached)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._config.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def _load(self) -> None:
+        if self._path is None or not self._path.exists():
+            return
+        try:
+            with self._path.open("r", encoding="utf-8") as handle:
+                raw = json.load(handle)
+        except (OSError, ValueError) as exc:
+            logger.warning(
+                "tradingview.validation_cache_load_failed",
+                extra={"extra_data": {"path": str(self._path), "error": str(exc)}},
+            )
+            return
+        now = time.time()
+        for key, (expires_at, result) in raw.items():
+            if expires_at > now:
+                self._entries[key] = (expires_at, result)
+        while len(self._entries) > self._config.max_entries:
+            self._entries.popitem(last=False)
+
+    def persist(self) -> None:
+        if self._path is None:
+            return
+        now = time.time()
+        payload = {
+            key: [expires_at, result]
+            for key, (expires_at, result) in self._entries.items()
+            if expires_at > now
+        }
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_name(self._path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as handle:
+            json.dump(payload, handle)
+        os.replace(tmp_path, self._path)
+
+
+class AdaptiveRateLimiter:
+    """Async token bucket whose rate adapts to TradingView throttling (AIMD).
+
+    Every success adds ``increase_per_success`` req/s up to the configured ceiling; a
+    429 multiplies the rate by ``decrease_factor`` and pauses the whole bucket for
+    the response's ``Retry-After``. Waiters are served in arrival order.
+    """
+
+    def __init__(self, config: RateLimitConfig):
+        self._config = config
+        self.rate = config.requests_per_second
+        self._tokens = float(config.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.throttled = 0
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            # Limiters are shared process-wide and outlive event loops; locks cannot.
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    if now < self._paused_until:
+                        await asyncio.sleep(self._paused_until - now)
+                        continue
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    await asyncio.sleep((1 - self._tokens) / self.rate)
+        finally:
+            self.waiting -= 1
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._updated)
+        self._tokens = min(float(self._config.burst), self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def on_success(self) -> None:
+        self.rate = min(
+            self._config.requests_per_second, self.rate + self._config.increase_per_success
+        )
+
+    def on_throttle(self, retry_after: Optional[float]) -> None:
+        self.throttled += 1
+        now = time.monotonic()
+        # Concurrent requests all see the same 429; back off once per pause window.
+        if now >= self._paused_until:
+            self.rate = max(
+                self._config.min_requests_per_second, self.rate * self._config.decrease_factor
+            )
+        if retry_after is None:
+            retry_after = self._config.default_retry_after_seconds
+        retry_after = min(retry_after, self._config.max_retry_after_seconds)
+        self._refill(now)
+        self._tokens = 0.0
+        self._paused_until = max(self._paused_until, now + retry_after)
+
+    def reset_peak(self) -> None:
+        self.peak_waiting = self.waiting
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate": round(self.rate, 3),
+            "queue_depth": self.waiting,
+            "peak_queue_depth": self.peak_waiting,
+            "throttled": self.throttled,
+        }
+
+
+# Shared by every client in the process, so the sync, webhook worker, retry drain
+# and expiry sweep draw on one rate budget and see the same circuit state.
+_CIRCUIT_BREAKERS: Dict[Tuple[str, str, str], CircuitBreaker] = {}
+_RATE_LIMITERS: Dict[str, AdaptiveRateLimiter] = {}
+
+
+def get_circuit_breaker(
+    settings: Settings, service: str, base_url: str, endpoint: str
+) -> Optional[CircuitBreaker]:
+    """The process-wide breaker for ``endpoint`` of ``service`` at ``base_url``."""
+    config = settings.circuit_breaker
+    if not config.enabled:
+        return None
+    key = (service, base_url, endpoint)
+    breaker = _CIRCUIT_BREAKERS.get(key)
+    if breaker is None:
+        breaker = CircuitBreaker(f"{service}.{endpoint}", config, settings)
+        _CIRCUIT_BREAKERS[key] = breaker
+    return breaker
+
+
+def get_rate_limiter(settings: Settings) -> Optional[AdaptiveRateLimiter]:
+    """The process-wide TradingView rate limiter for the configured base URL."""
+    config = settings.tradingview.rate_limit
+    if not config.enabled:
+        return None
+    key = str(settings.tradingview.base_url)
+    limiter = _RATE_LIMITERS.get(key)
+    if limiter is None:
+        limiter = AdaptiveRateLimiter(config)
+        _RATE_LIMITERS[key] = limiter
+    return limiter
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Parse ``Retry-After`` as delta-seconds or an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(tz=timezone.utc)).total_seconds())
+
+
+class _PooledClientMixin:
+    """Owns one long-lived ``httpx.AsyncClient`` shared by every request."""
+
+    _settings: Settings
+    _timeout: int
+    _client: Optional[httpx.AsyncClient]
+
+    _service: str
+    _base_url: str
+
+    def _breaker(self, endpoint: str) -> Optional[CircuitBreaker]:
+        return get_circuit_breaker(self._settings, self._service, self._base_url, endpoint)
+
+    def circuit_open(self, endpoint: str) -> bool:
+        """True when calls to ``endpoint`` would currently fail fast."""
+        breaker = _CIRCUIT_BREAKERS.get((self._service, self._base_url, endpoint))
+        return breaker is not None and breaker.is_open
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = build_http_client(self._settings, self._timeout)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        self._get_client()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+
+class WordPressClient(_PooledClientMixin):
     def __init__(self, settings: Settings):
         self._settings = settings
         self._base_url = str(settings.wordpress.base_url)
         self._endpoint = settings.wordpress.transactions_endpoint
         self._since_param = settings.wordpress.since_param
+        self._product_param = settings.wordpress.product_param
         self._timeout = settings.wordpress.timeout_seconds
         self._limit = settings.wordpress.transactions_limit
+        self._page_param = settings.wordpress.page_param
         self._api_key = settings.wordpress.api_key
         if settings.wordpress.basic_auth_user and settings.wordpress.basic_auth_password:
             self._auth = httpx.BasicAuth(
@@ -40,8 +438,12 @@ class WordPressClient:
             )
         else:
             self._auth = None
+        self._client = None
+        self._service = "wordpress"
 
-    async def fetch_transactions(self, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    def _request_parts(
+        self, since: Optional[datetime], product_ids: Optional[Sequence[str]] = None
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
         url = _join_url(self._base_url, self._endpoint)
         headers = {}
         if self._api_key:
@@ -51,63 +453,313 @@ class WordPressClient:
             params["limit"] = self._limit
         if since:
             params[self._since_param] = since.astimezone(timezone.utc).isoformat()
-        async with httpx.AsyncClient(timeout=self._timeout) as client:
+        if product_ids and self._product_param:
+            params[self._product_param] = ",".join(product_ids)
+        return url, headers, params
+
+    def _raise_fetch_failed(self, exc: httpx.HTTPStatusError) -> NoReturn:
+        logger.error(
+            "wordpress.fetch_failed",
+            extra={
+                "extra_data": {
+                    "status_code": exc.response.status_code,
+                    "url": str(exc.request.url),
+                }
+            },
+        )
+        # With the circuit breaker on, Discord hears about state changes instead.
+        if self._breaker("transactions") is not None:
+            raise ApiError(
+                "WordPress transaction fetch failed",
+                status_code=exc.response.status_code,
+            ) from exc
+        # Send Discord alert
+        try:
+            from .discord_alert import send_discord_alert_if_enabled
+            send_discord_alert_if_enabled(
+                self._settings,
+                message={
+                    "title": "WordPress API Failure",
+                    "description": "Failed to fetch transactions from WordPress API",
+                    "status_code": exc.response.status_code,
+                    "url": str(exc.request.url),
+                    "error": f"HTTP {exc.response.status_code}",
+                    "color": "red"
+                }
+            )
+        except Exception:
+            pass  # Don't let Discord failures break the main flow
+        raise ApiError(
+            "WordPress transaction fetch failed",
+            status_code=exc.response.status_code,
+        ) from exc
+
+    def _record_outcome(self, status_code: Optional[int]) -> None:
+        """Feed a response status (``None`` for a transport error) to the breaker."""
+        breaker = self._breaker("transactions")
+        if breaker is None:
+            return
+        if status_code is None or status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    async def fetch_transactions(
+        self, since: Optional[datetime] = None, product_ids: Optional[Sequence[str]] = None
+    ) -> List[Dict[str, Any]]:
+        url, headers, params = self._request_parts(since, product_ids)
+        breaker = self._breaker("transactions")
+        trial = breaker.before_call() if breaker is not None else None
+        client = self._get_client()
+        started = time.perf_counter()
+        try:
             response = await client.get(
                 url, params=params, headers=headers, auth=self._auth
             )
+        except httpx.HTTPError:
+            self._record_outcome(None)
+            raise
+        finally:
+            metrics.API_LATENCY.observe(time.perf_counter() - started, metrics.FETCH_TRANSACTIONS)
+            if breaker is not None:
+                breaker.release(trial)
+        self._record_outcome(response.status_code)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as exc:
+            self._raise_fetch_failed(exc)
+
+        return _transactions_from_payload(response.json())
+
+    async def iter_transactions(
+        self, since: Optional[datetime] = None, product_ids: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield transactions as they are parsed off the wire, page by page.
+
+        When ``page_param`` and ``transactions_limit`` are configured, pages are
+        requested until one returns fewer than ``transactions_limit`` items.
+        """
+        url, headers, params = self._request_parts(since, product_ids)
+        paginate = self._page_param is not None and self._limit is not None
+        client = self._get_client()
+        breaker = self._breaker("transactions")
+        page = 1
+        while True:
+            if paginate:
+                params[self._page_param] = page
+            trial = breaker.before_call() if breaker is not None else None
+            count = 0
+            started = time.perf_counter()
             try:
-                response.raise_for_status()
-            except httpx.HTTPStatusError as exc:
-                logger.error(
-                    "wordpress.fetch_failed",
-                    extra={
-                        "extra_data": {
-                            "status_code": exc.response.status_code,
-                            "url": str(exc.request.url),
-                        }
-                    },
+                async with client.stream(
+                    "GET", url, params=params, headers=headers, auth=self._auth
+                ) as response:
+                    self._record_outcome(response.status_code)
+                    try:
+                        response.raise_for_status()
+                    except httpx.HTTPStatusError as exc:
+                        await response.aread()
+                        self._raise_fetch_failed(exc)
+                    parser = JsonArrayParser()
+                    async for chunk in response.aiter_bytes():
+                        for item in parser.feed(chunk):
+                            count += 1
+                            yield item
+                    for item in parser.close():
+                        count += 1
+                        yield item
+            except httpx.HTTPError:
+                # Connection failures, including ones that cut the body off mid-stream.
+                self._record_outcome(None)
+                raise
+            finally:
+                # Covers the whole page, including time the consumer spent between items.
+                metrics.API_LATENCY.observe(
+                    time.perf_counter() - started, metrics.FETCH_TRANSACTIONS
                 )
-                # Send Discord alert
-                try:
-                    from .discord_alert import send_discord_alert_if_enabled
-                    send_discord_alert_if_enabled(
-                        self._settings,
-                        message={
-                            "title": "WordPress API Failure",
-                            "description": "Failed to fetch transactions from WordPress API",
-                            "status_code": exc.response.status_code,
-                            "url": str(exc.request.url),
-                            "error": f"HTTP {exc.response.status_code}",
-                            "color": "red"
-                        }
+                if breaker is not None:
+                    breaker.release(trial)
+            logger.debug(
+                "wordpress.page_fetched",
+                extra={"extra_data": {"page": page, "count": count}},
+            )
+            if not paginate or count < self._limit:
+                return
+            page += 1
+
+
+def _transactions_from_payload(payload: Any) -> List[Dict[str, Any]]:
+    if isinstance(payload, dict):
+        data = payload.get("data")
+        if isinstance(data, list):
+            return _transaction_items(data)
+    if isinstance(payload, list):
+        return _transaction_items(payload)
+    _warn_unexpected_payload(type(payload).__name__)
+    return []
+
+
+def _transaction_items(items: List[Any]) -> List[Dict[str, Any]]:
+    return [item for item in items if _is_transaction(item)]
+
+
+def _is_transaction(item: Any) -> bool:
+    if isinstance(item, dict):
+        return True
+    logger.warning(
+        "wordpress.unexpected_item",
+        extra={"extra_data": {"item_type": type(item).__name__}},
+    )
+    return False
+
+
+def _warn_unexpected_payload(payload_type: str) -> None:
+    logger.warning(
+        "wordpress.unexpected_response",
+        extra={"extra_data": {"payload_type": payload_type}},
+    )
+
+
+class JsonArrayParser:
+    """Incrementally parse a transactions body, returning items as soon as they complete.
+
+    Both a top-level array and the ``{"data": [...]}`` envelope are streamed; the
+    envelope's other members are decoded and dropped. Items that are not JSON
+    objects are skipped with a warning. Any other body cannot hold transactions and
+    is buffered, then handed to :func:`_transactions_from_payload` by :meth:`close`.
+    """
+
+    _WHITESPACE = re.compile(r"[ \t\n\r]*")
+    _NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+
+    def __init__(self) -> None:
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._state = "start"
+        self._envelope = False
+        self._key: Optional[str] = None
+        self._has_data = False
+        self._final = False
+
+    def feed(self, data: bytes) -> List[Dict[str, Any]]:
+        self._buffer += self._text.decode(data)
+        return self._drain()
+
+    def close(self) -> List[Dict[str, Any]]:
+        self._buffer += self._text.decode(b"", final=True)
+        self._final = True
+        items = self._drain()
+        if self._state == "buffered":
+            return items + _transactions_from_payload(json.loads(self._buffer))
+        if self._state != "done":
+            raise ValueError("Truncated JSON body in response")
+        if self._envelope and not self._has_data:
+            _warn_unexpected_payload("dict")
+        return items
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]] = []
+        buffer = self._buffer
+        position = 0
+        skip = self._WHITESPACE.match
+        decode = self._decoder.raw_decode
+        while self._state not in ("done", "buffered"):
+            position = skip(buffer, position).end()
+            if position >= len(buffer):
+                break
+            char = buffer[position]
+            state = self._state
+            if state == "start":
+                if char == "[":
+                    self._state = "item_or_end"
+                elif char == "{":
+                    self._envelope = True
+                    self._state = "key_or_end"
+                else:
+                    logger.warning(
+                        "wordpress.response_buffered",
+                        extra={"extra_data": {"first_char": char}},
                     )
-                except Exception:
-                    pass  # Don't let Discord failures break the main flow
-                raise ApiError(
-                    "WordPress transaction fetch failed",
-                    status_code=exc.response.status_code,
-                ) from exc
+                    self._state = "buffered"
+                    break
+                position += 1
+            elif char == "]" and state in ("item_or_end", "comma"):
+                self._state = "member_comma" if self._envelope else "done"
+                position += 1
+            elif state == "comma":
+                if char != ",":
+                    raise ValueError(f"Unexpected {char!r} between JSON array items")
+                self._state = "item"
+                position += 1
+            elif state in ("item_or_end", "item"):
+                try:
+                    value, end = decode(buffer, position)
+                except json.JSONDecodeError:
+                    break  # item not complete yet; wait for more data
+                if self._may_continue(value, end, buffer):
+                    break
+                position = end
+                if _is_transaction(value):
+                    items.append(value)
+                self._state = "comma"
+            elif char == "}" and state in ("key_or_end", "member_comma"):
+                self._state = "done"
+                position += 1
+            elif state == "member_comma":
+                if char != ",":
+                    raise ValueError(f"Unexpected {char!r} between JSON object members")
+                self._state = "key"
+                position += 1
+            elif state in ("key_or_end", "key"):
+                try:
+                    key, end = decode(buffer, position)
+                except json.JSONDecodeError:
+                    break
+                if not isinstance(key, str):
+                    raise ValueError("Expected a string key in JSON object")
+                self._key = key
+                self._state = "colon"
+                position = end
+            elif state == "colon":
+                if char != ":":
+                    raise ValueError(f"Unexpected {char!r} after JSON object key")
+                self._state = "value"
+                position += 1
+            elif self._key == "data" and char == "[":
+                self._has_data = True
+                self._state = "item_or_end"
+                position += 1
+            else:
+                # Envelope metadata (totals, page counts); decoded only to skip past it.
+                try:
+                    value, end = decode(buffer, position)
+                except json.JSONDecodeError:
+                    break
+                if self._may_continue(value, end, buffer):
+                    break
+                position = end
+                self._state = "member_comma"
+        self._buffer = buffer[position:]
+        return items
 
-        payload = response.json()
-        if isinstance(payload, dict):
-            data = payload.get("data")
-            if isinstance(data, list):
-                return data
-        if isinstance(payload, list):
-            return payload
-        logger.warning(
-            "wordpress.unexpected_response",
-            extra={"extra_data": {"payload_type": type(payload).__name__}},
+    def _may_continue(self, value: Any, end: int, buffer: str) -> bool:
+        """A number running into the end of the buffer may go on in the next chunk."""
+        return (
+            not self._final
+            and isinstance(value, (int, float))
+            and not isinstance(value, bool)
+            and self._NUMBER_TAIL.match(buffer, end).end() == len(buffer)
         )
-        return []
 
 
-class TradingViewClient:
+class TradingViewClient(_PooledClientMixin):
     def __init__(self, settings: Settings):
         self._settings = settings
         self._base_url = str(settings.tradingview.base_url)
         self._grant_endpoint = settings.tradingview.grant_endpoint
         self._update_endpoint = settings.tradingview.update_endpoint
+        self._revoke_endpoint = settings.tradingview.revoke_endpoint
         self._list_endpoint = settings.tradingview.list_users_endpoint
         self._validate_endpoint = settings.tradingview.validate_endpoint
         self._timeout = settings.tradingview.timeout_seconds
@@ -116,29 +768,79 @@ class TradingViewClient:
             "Content-Type": "application/json",
         }
         self._max_retries = settings.tradingview.max_retries
-        self._backoff = settings.tradingview.retry_backoff_seconds 
+        self._backoff = settings.tradingview.retry_backoff_seconds
+        self._client = None
+        self._service = "tradingview"
+        cache_config = settings.tradingview.validation_cache
+        self.validation_cache: Optional[ValidationCache] = (
+            ValidationCache(cache_config) if cache_config.enabled else None
+        )
+        self.rate_limiter: Optional[AdaptiveRateLimiter] = get_rate_limiter(settings)
+
+    async def _request(
+        self, method: str, url: str, circuit: str, **kwargs: Any
+    ) -> httpx.Response:
+        """Send one request through the endpoint's circuit breaker and the shared rate limiter."""
+        breaker = self._breaker(circuit)
+        trial = breaker.before_call() if breaker is not None else None
+        limiter = self.rate_limiter
+        try:
+            if limiter is not None:
+                await limiter.acquire()
+            client = self._get_client()
+            try:
+                response = await client.request(method, url, headers=self._headers, **kwargs)
+            except httpx.HTTPError:
+                if breaker is not None:
+                    breaker.record_failure()
+                raise
+            if breaker is not None:
+                # 429 means the backend is up but busy; the rate limiter deals with it.
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                elif response.status_code != 429:
+                    breaker.record_success()
+        finally:
+            if breaker is not None:
+                breaker.release(trial)
+        if limiter is not None:
+            if response.status_code == 429:
+                limiter.on_throttle(_retry_after_seconds(response))
+            elif response.status_code < 500:
+                limiter.on_success()
+        return response
+
+    def persist_validation_cache(self) -> None:
+        if self.validation_cache is None:
+            return
+        try:
+            self.validation_cache.persist()
+        except OSError as exc:
+            logger.warning(
+                "tradingview.validation_cache_persist_failed",
+                extra={"extra_data": {"error": str(exc)}},
+            )
 
     async def list_script_users(self, script_id: str) -> List[Dict[str, Any]]:
         endpoint = self._list_endpoint.replace("{scriptId}", script_id)
         url = _join_url(self._base_url, endpoint)
-        async with httpx.AsyncClient(timeout=self._timeout) as client:
-            response = await client.get(url, headers=self._headers)
-            try:
-                response.raise_for_status()
-            except httpx.HTTPStatusError as exc:
-                logger.error(
-                    "tradingview.list_failed",
-                    extra={
-                        "extra_data": {
-                            "status_code": exc.response.status_code,
-                            "scriptId": script_id,
-                        }
-                    },
-                )
-                raise ApiError(
-                    "TradingView list users failed",
-                    status_code=exc.response.status_code,
-                ) from exc
+        response = await self._request("GET", url, circuit="list")
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as exc:
+            logger.error(
+                "tradingview.list_failed",
+                extra={
+                    "extra_data": {
+                        "status_code": exc.response.status_code,
+                        "scriptId": script_id,
+                    }
+                },
+            )
+            raise ApiError(
+                "TradingView list users failed",
+                status_code=exc.response.status_code,
+            ) from exc
         payload = response.json()
         if isinstance(payload, dict):
             data = payload.get("data")
@@ -153,37 +855,51 @@ class TradingViewClient:
         return []
 
     async def validate_username(self, username: str) -> Dict[str, Any]:
+        cache = self.validation_cache
+        if cache is not None:
+            cached = cache.get(username)
+            if cached is not None:
+                return cached
+        started = time.perf_counter()
+        try:
+            result = await self._validate_username_remote(username)
+        finally:
+            metrics.API_LATENCY.observe(time.perf_counter() - started, metrics.VALIDATE_USERNAME)
+        if cache is not None:
+            cache.put(username, result)
+        return result
+
+    async def _validate_username_remote(self, username: str) -> Dict[str, Any]:
         endpoint = self._validate_endpoint.replace("{username}", username)
         url = _join_url(self._base_url, endpoint)
-        async with httpx.AsyncClient(timeout=self._timeout) as client:
-            try:
-                response = await client.get(url, headers=self._headers)
-                response.raise_for_status()
-            except httpx.HTTPStatusError as exc:
-                logger.error(
-                    "tradingview.validate_failed",
-                    extra={
-                        "extra_data": {
-                            "status_code": exc.response.status_code,
-                            "username": username,
-                        }
-                    },
-                )
-                raise ApiError(
-                    "TradingView validate username failed",
-                    status_code=exc.response.status_code,
-                ) from exc
-            except httpx.HTTPError as exc:
-                logger.error(
-                    "tradingview.validate_transport_error",
-                    extra={
-                        "extra_data": {
-                            "username": username,
-                            "error": str(exc),
-                        }
-                    },
-                )
-                raise ApiError("TradingView validate username failed") from exc
+        try:
+            response = await self._request("GET", url, circuit="validate")
+            response.raise_for_status()
+        except httpx.HTTPStatusError as exc:
+            logger.error(
+                "tradingview.validate_failed",
+                extra={
+                    "extra_data": {
+                        "status_code": exc.response.status_code,
+                        "username": username,
+                    }
+                },
+            )
+            raise ApiError(
+                "TradingView validate username failed",
+                status_code=exc.response.status_code,
+            ) from exc
+        except httpx.HTTPError as exc:
+            logger.error(
+                "tradingview.validate_transport_error",
+                extra={
+                    "extra_data": {
+                        "username": username,
+                        "error": str(exc),
+                    }
+                },
+            )
+            raise ApiError("TradingView validate username failed") from exc
         payload = response.json()
         if isinstance(payload, dict):
             return payload
@@ -193,22 +909,48 @@ class TradingViewClient:
         )
         raise ApiError("Unexpected TradingView validation response")
 
-    async def grant_access(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        return await self._post_with_retry(
-            endpoint=self._grant_endpoint,
-            payload=payload,
-            success_event="tradingview.grant_success",
-            failure_event="tradingview.grant_failed",
-            transport_event="tradingview.grant_transport_error",
-        )
+    async def grant_access(
+        self, payload: Dict[str, Any], retries: Optional[int] = None
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            return await self._post_with_retry(
+                endpoint=self._grant_endpoint,
+                payload=payload,
+                success_event="tradingview.grant_success",
+                failure_event="tradingview.grant_failed",
+                transport_event="tradingview.grant_transport_error",
+                circuit="grant",
+                retries=retries,
+            )
+        finally:
+            metrics.API_LATENCY.observe(time.perf_counter() - started, metrics.GRANT_ACCESS)
 
-    async def update_access(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+    async def update_access(
+        self, payload: Dict[str, Any], retries: Optional[int] = None
+    ) -> Dict[str, Any]:
         return await self._post_with_retry(
             endpoint=self._update_endpoint,
             payload=payload,
             success_event="tradingview.update_success",
             failure_event="tradingview.update_failed",
             transport_event="tradingview.update_transport_error",
+            circuit="update",
+            retries=retries,
+        )
+
+    async def revoke_access(
+        self, script_id: str, username: str, retries: Optional[int] = None
+    ) -> Dict[str, Any]:
+        return await self._post_with_retry(
+            endpoint=self._revoke_endpoint,
+            payload={"scriptId": script_id, "username": username},
+            success_event="tradingview.revoke_success",
+            failure_event="tradingview.revoke_failed",
+            transport_event="tradingview.revoke_transport_error",
+            circuit="revoke",
+            retries=retries,
+            method="DELETE",
         )
 
     async def _post_with_retry(
@@ -218,62 +960,72 @@ class TradingViewClient:
         success_event: str,
         failure_event: str,
         transport_event: str,
+        circuit: str,
+        retries: Optional[int] = None,
+        method: str = "POST",
     ) -> Dict[str, Any]:
+        """Send with in-line backoff; ``retries=0`` sends once and leaves retrying to the caller."""
+        max_retries = self._max_retries if retries is None else retries
         url = _join_url(self._base_url, endpoint)
         attempt = 0
         last_error: Optional[Exception] = None
-        while attempt <= self._max_retries:
-            async with httpx.AsyncClient(timeout=self._timeout) as client:
-                try:
-                    response = await client.post(url, headers=self._headers, json=payload)
-                    response.raise_for_status()
-                    logger.info(
-                        success_event,
-                        extra={
-                            "extra_data": {
-                                "status_code": response.status_code,
-                                "url": url,
-                                "payload": {
-                                    "scriptId": payload.get("scriptId"),
-                                    "username": payload.get("username"),
-                                },
-                            }
-                        },
-                    )
-                    return response.json()
-                except httpx.HTTPStatusError as exc:
-                    last_error = exc
-                    logger.warning(
-                        failure_event,
-                        extra={
-                            "extra_data": {
-                                "attempt": attempt + 1,
-                                "status_code": exc.response.status_code,
-                                "payload": {
-                                    "scriptId": payload.get("scriptId"),
-                                    "username": payload.get("username"),
-                                },
-                            }
-                        },
-                    )
-                except httpx.HTTPError as exc:
-                    last_error = exc
-                    logger.warning(
-                        transport_event,
-                        extra={
-                            "extra_data": {
-                                "attempt": attempt + 1,
-                                "payload": {
-                                    "scriptId": payload.get("scriptId"),
-                                    "username": payload.get("username"),
-                                },
-                                "error": str(exc),
-                            }
-                        },
-                    )
-            if attempt == self._max_retries:
+        while attempt <= max_retries:
+            throttled = False
+            try:
+                response = await self._request(method, url, circuit=circuit, json=payload)
+                response.raise_for_status()
+                logger.info(
+                    success_event,
+                    extra={
+                        "extra_data": {
+                            "status_code": response.status_code,
+                            "url": url,
+                            "payload": {
+                                "scriptId": payload.get("scriptId"),
+                                "username": payload.get("username"),
+                            },
+                        }
+                    },
+                )
+                # DELETE endpoints may answer 204 with no body.
+                return response.json() if response.content else {}
+            except httpx.HTTPStatusError as exc:
+                last_error = exc
+                throttled = exc.response.status_code == 429
+                logger.warning(
+                    failure_event,
+                    extra={
+                        "extra_data": {
+                            "attempt": attempt + 1,
+                            "status_code": exc.response.status_code,
+                            "payload": {
+                                "scriptId": payload.get("scriptId"),
+                                "username": payload.get("username"),
+                            },
+                        }
+                    },
+                )
+            except httpx.HTTPError as exc:
+                last_error = exc
+                logger.warning(
+                    transport_event,
+                    extra={
+                        "extra_data": {
+                            "attempt": attempt + 1,
+                            "payload": {
+                                "scriptId": payload.get("scriptId"),
+                                "username": payload.get("username"),
+                            },
+                            "error": str(exc),
+                        }
+                    },
+                )
+            if attempt == max_retries or self.circuit_open(circuit):
+                # An open circuit would reject the retry anyway; don't sleep for it.
                 break
-            await asyncio.sleep(self._backoff[min(attempt, len(self._backoff) - 1)])
+            # On a 429 the limiter already paused every caller for Retry-After.
+            if not (throttled and self.rate_limiter is not None):
+                await asyncio.sleep(self._backoff[min(attempt, len(self._backoff) - 1)])
             attempt += 1
 
         raise ApiError(
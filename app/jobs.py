@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from .config import Settings
+from .io import TradingViewClient, WordPressClient
+from .sync import SyncProgress, run_sync
+
+logger = logging.getLogger(__name__)
+
+# Orders this process's masterData jobs (sync jobs, scheduled retry drains, expiry
+# revocations, webhook batches) so they queue here instead of polling the file lock.
+# Exclusion across processes comes from app.locks.masterdata_lock, which run_sync,
+# process_transactions, drain_retry_queue and revoke_expired_access take themselves.
+master_lock = asyncio.Lock()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(tz=timezone.utc)
+
+
+@dataclass
+class SyncJob:
+    id: str
+    trigger: str
+    dry_run: bool
+    status: str = "queued"  # queued -> running -> succeeded | failed
+    progress: SyncProgress = field(default_factory=SyncProgress)
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=_utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    async def wait(self) -> "SyncJob":
+        if self.task is not None:
+            await asyncio.shield(self.task)
+        return self
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "trigger": self.trigger,
+            "dry_run": self.dry_run,
+            **self.progress.as_dict(),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class SyncJobManager:
+    """Runs syncs as background tasks with single-flight semantics.
+
+    A trigger that arrives while a job with the same dry-run mode is queued or running
+    gets that job back instead of starting another pass over the same master files.
+    """
+
+    def __init__(self, history: int = 50) -> None:
+        self._jobs: "OrderedDict[str, SyncJob]" = OrderedDict()
+        self._history = history
+
+    def get(self, job_id: str) -> Optional[SyncJob]:
+        return self._jobs.get(job_id)
+
+    def submit(
+        self,
+        settings: Settings,
+        dry_run: Optional[bool] = None,
+        trigger: str = "api",
+        wp_client: Optional[WordPressClient] = None,
+        tv_client: Optional[TradingViewClient] = None,
+    ) -> Tuple[SyncJob, bool]:
+        """Start a sync job, or return the active one. The flag is ``True`` when coalesced."""
+        if dry_run is None:
+            dry_run = settings.scheduler.dry_run
+        for job in self._jobs.values():
+            if job.active and job.dry_run == dry_run:
+                logger.info(
+                    "sync_job.coalesced",
+                    extra={"extra_data": {"jobId": job.id, "trigger": trigger}},
+                )
+                return job, True
+
+        if dry_run != settings.scheduler.dry_run:
+            # Copy instead of flipping the flag on the shared, cached settings object.
+            settings = settings.model_copy(
+                update={"scheduler": settings.scheduler.model_copy(update={"dry_run": dry_run})}
+            )
+        job = SyncJob(id=uuid.uuid4().hex, trigger=trigger, dry_run=dry_run)
+        self._jobs[job.id] = job
+        self._prune()
+        job.task = asyncio.get_running_loop().create_task(
+            self._run(job, settings, wp_client, tv_client)
+        )
+        logger.info(
+            "sync_job.queued",
+            extra={"extra_data": {"jobId": job.id, "trigger": trigger, "dryRun": dry_run}},
+        )
+        return job, False
+
+    async def _run(
+        self,
+        job: SyncJob,
+        settings: Settings,
+        wp_client: Optional[WordPressClient],
+        tv_client: Optional[TradingViewClient],
+    ) -> None:
+        async with master_lock:
+            job.status = "running"
+            job.started_at = _utcnow()
+            try:
+                job.result = await run_sync(
+                    settings, wp_client=wp_client, tv_client=tv_client, progress=job.progress
+                )
+                job.status = "succeeded"
+            except Exception as exc:
+                job.status = "failed"
+                job.error = str(exc)
+                logger.exception(
+                    "sync_job.failed", extra={"extra_data": {"jobId": job.id, "error": str(exc)}}
+                )
+            finally:
+                job.finished_at = _utcnow()
+        logger.info(
+            "sync_job.finished",
+            extra={
+                "extra_data": {
+                    "jobId": job.id,
+                    "status": job.status,
+                    "seconds": round((job.finished_at - job.started_at).total_seconds(), 3),
+                }
+            },
+        )
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[: max(0, len(self._jobs) - self._history)]:
+            del self._jobs[job_id]
+
+
+_MANAGER: Optional[SyncJobManager] = None
+
+
+def get_job_manager(settings: Settings) -> SyncJobManager:
+    global _MANAGER
+    if _MANAGER is None:
+        _MANAGER = SyncJobManager(history=settings.sync.job_history)
+    return _MANAGER
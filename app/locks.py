@@ -0,0 +1,151 @@
+"""Cross-process lock around masterData mutations.
+
+``launch.py api`` and ``launch.py scheduler`` run as separate processes, and batch
+tools can run next to both, so an :class:`asyncio.Lock` cannot keep them from
+rewriting the same master snapshots and journals at once. :class:`MasterDataLock`
+takes an exclusive OS lock on ``<masterdata_dir>/masterdata.lock`` (``flock`` on
+POSIX, ``msvcrt.locking`` on Windows). The lock is released when its file
+descriptor closes, so a crashed holder never leaves it stuck.
+
+Acquisition polls with a non-blocking lock call and ``asyncio.sleep`` so a
+waiting coroutine never blocks the event loop and can be cancelled while waiting.
+A task that already holds the lock (or was started while its parent held it) may
+enter it again; the nested acquire is a no-op, so a caller such as the webhook
+worker can hold the lock across calls that take it themselves.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import pathlib
+import time
+from contextvars import ContextVar
+from typing import FrozenSet, Optional
+
+from .config import Settings
+
+try:  # pragma: no cover - platform specific
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILENAME = "masterdata.lock"
+
+# Lock files held by the current task context.
+_HELD: ContextVar[FrozenSet[str]] = ContextVar("masterdata_locks_held", default=frozenset())
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:  # pragma: no cover - Windows
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:  # pragma: no cover - Windows
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class MasterDataLock:
+    """Exclusive lock shared by every process using one masterdata_dir.
+
+    Reentrant within one task context only; other tasks in the same process wait
+    like any other process would.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        poll_interval: float = 0.05,
+        max_poll_interval: float = 1.0,
+    ) -> None:
+        self.path = path
+        self._poll_interval = poll_interval
+        self._max_poll_interval = max_poll_interval
+        self._fd: Optional[int] = None
+        self._nested = False
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None or self._nested
+
+    async def acquire(self) -> None:
+        if self.held:
+            raise RuntimeError(f"{self.path} is already held by this lock object")
+        key = str(self.path)
+        if key in _HELD.get():
+            self._nested = True
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        started = time.monotonic()
+        delay = self._poll_interval
+        logged = False
+        try:
+            while not _try_lock(fd):
+                if not logged and time.monotonic() - started >= 5:
+                    logged = True
+                    logger.info(
+                        "masterdata.lock_waiting",
+                        extra={"extra_data": {"path": str(self.path)}},
+                    )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self._max_poll_interval)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        _HELD.set(_HELD.get() | {key})
+
+    def release(self) -> None:
+        if self._nested:
+            self._nested = False
+            return
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        _HELD.set(_HELD.get() - {str(self.path)})
+        try:
+            _unlock(fd)
+        finally:
+            os.close(fd)
+
+    async def __aenter__(self) -> "MasterDataLock":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+
+def lock_held(path: pathlib.Path) -> bool:
+    """Whether the current task context holds the :class:`MasterDataLock` on ``path``."""
+    return str(path) in _HELD.get()
+
+
+def masterdata_lock_path(settings: Settings) -> pathlib.Path:
+    return (settings.masterdata_path / LOCK_FILENAME).resolve()
+
+
+def masterdata_lock(settings: Settings) -> MasterDataLock:
+    """A fresh lock object on ``<masterdata_dir>/masterdata.lock``; use with ``async with``."""
+    return MasterDataLock(masterdata_lock_path(settings))
+
+
+def masterdata_lock_held(settings: Settings) -> bool:
+    """Whether the current task context holds :func:`masterdata_lock`."""
+    return lock_held(masterdata_lock_path(settings))
@@ -1,29 +1,38 @@
 from __future__ import annotations
 
 import logging
+import re
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set
 
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, Field, SkipValidation, ValidationError
 
+from . import metrics
 from .config import ProductConfig, Settings
 from .storage import AccessRecord
 
 logger = logging.getLogger(__name__)
 
 
+_ZERO_DATE = "0000-00-00"
+_DATETIME_PARSERS = (
+    lambda v: datetime.fromisoformat(v.replace("Z", "+00:00")),
+    lambda v: datetime.strptime(v, "%Y-%m-%d %H:%M:%S"),
+    lambda v: datetime.strptime(v, "%Y-%m-%d %H:%M:%S.%f"),
+)
+
+
 def _parse_datetime(value: str) -> datetime:
     if not value:
         raise ValueError("Empty datetime value")
 
     candidate = value.strip()
-    attempts = [
-        lambda v: datetime.fromisoformat(v.replace("Z", "+00:00")),
-        lambda v: datetime.strptime(v, "%Y-%m-%d %H:%M:%S"),
-        lambda v: datetime.strptime(v, "%Y-%m-%d %H:%M:%S.%f"),
-    ]
-
-    for attempt in attempts:
+    if candidate.startswith(_ZERO_DATE):
+        # MemberPress's "never expires" value; no parser accepts year 0, and letting
+        # all three fail costs more than a successful parse.
+        raise ValueError(f"Invalid datetime format: {value}")
+    for attempt in _DATETIME_PARSERS:
         try:
             dt = attempt(candidate)
             if dt.tzinfo is None:
@@ -94,7 +103,8 @@ class NormalizedTransaction(BaseModel):
     subscription_type: Optional[str] = None
     stacking_allowed: bool = True
     remarks: Optional[str] = None
-    raw: Dict
+    # Kept as a reference to the source row; validating it would copy every payload.
+    raw: SkipValidation[Dict]
 
 
 class Action(BaseModel):
@@ -107,160 +117,250 @@ def normalize_transactions(
     raw_transactions: Iterable[Dict],
     settings: Settings,
 ) -> List[NormalizedTransaction]:
+    """Normalize raw WordPress transactions, skipping ones we cannot act on.
+
+    Rows whose fields already have the exact types the pydantic models expect skip
+    model validation; anything unusual is validated first. Both then go through the
+    same field parsing in :func:`_normalize_row`.
+    """
+    started = time.perf_counter()
     normalized: List[NormalizedTransaction] = []
     allowed_statuses = {status.lower() for status in settings.wordpress.status_filter}
+    products = {str(key): product for key, product in settings.products.items()}
 
     for raw in raw_transactions:
-        try:
-            transaction = WordPressTransaction.model_validate(raw)
-        except ValidationError as exc:
-            logger.warning(
-                "transaction.validation_failed",
-                extra={
-                    "extra_data": {
-                        "errors": exc.errors(),
-                        "transaction": raw.get("transaction_id"),
-                    }
-                },
-            )
-            continue
+        if type(raw) is dict and _is_plain_transaction(raw):
+            txn = _normalize_row(raw, raw, products, allowed_statuses)
+        else:
+            txn = _normalize_validated(raw, products, allowed_statuses)
+        if txn is not None:
+            normalized.append(txn)
+    metrics.LOCAL_LATENCY.observe(time.perf_counter() - started, metrics.NORMALIZE_TRANSACTIONS)
+    return normalized
 
-        status_value = (
-            transaction.status
-            or transaction.txn_status
-            or raw.get("status")
-            or raw.get("txn_status")
-            or ""
-        ).strip()
-        if allowed_statuses and status_value.lower() not in allowed_statuses:
-            continue
 
-        product = settings.product_for(transaction.product_id)
-        if not product:
-            logger.warning(
-                "transaction.unknown_product",
-                extra={
-                    "extra_data": {
-                        "transactionId": transaction.transaction_id,
-                        "productId": transaction.product_id,
-                    }
-                },
-            )
+def _normalize_validated(
+    raw: Dict,
+    products: Dict[str, ProductConfig],
+    allowed_statuses: Set[str],
+) -> Optional[NormalizedTransaction]:
+    try:
+        transaction = WordPressTransaction.model_validate(raw)
+    except ValidationError as exc:
+        logger.warning(
+            "transaction.validation_failed",
+            extra={
+                "extra_data": {
+                    "errors": exc.errors(),
+                    "transaction": raw.get("transaction_id"),
+                }
+            },
+        )
+        return None
+
+    # Validated fields have the same types a plain row does, so both share one reader.
+    row = dict(transaction.__dict__)
+    row["user"] = transaction.user.__dict__ if transaction.user else None
+    row["remarks"] = raw.get("remarks")
+    row["note"] = raw.get("note")
+    return _normalize_row(row, raw, products, allowed_statuses)
+
+
+_OPTIONAL_STR_FIELDS = (
+    "user_id",
+    "user_email",
+    "user_login",
+    "display_name",
+    "status",
+    "txn_status",
+    "type",
+    "txn_type",
+    "subscription_id",
+    "parent_transaction_id",
+    "gateway",
+    "trans_num",
+    "expires_at",
+    "subscription_status",
+    # Not model fields, but copied into NormalizedTransaction.remarks.
+    "remarks",
+    "note",
+)
+_OPTIONAL_FLOAT_FIELDS = ("amount", "total")
+_DECIMAL_RE = re.compile(r"-?\d+(?:\.\d+)?")
+_USER_FIELDS = ("id", "email", "username", "display_name")
+
+
+def _is_plain_transaction(raw: Dict) -> bool:
+    """True when pydantic would accept ``raw`` as-is, without any coercion."""
+    get = raw.get
+    if (
+        type(get("transaction_id")) is not str
+        or type(get("product_id")) is not str
+        or type(get("created_at")) is not str
+    ):
+        return False
+    for name in _OPTIONAL_STR_FIELDS:
+        value = get(name)
+        if value is not None and type(value) is not str:
+            return False
+    for name in _OPTIONAL_FLOAT_FIELDS:
+        value = get(name)
+        if value is None or type(value) is float or type(value) is int:
             continue
+        # WordPress serialises amounts as decimal strings ("49.00").
+        if type(value) is not str or not _DECIMAL_RE.fullmatch(value):
+            return False
+    user = get("user")
+    if user is not None:
+        if type(user) is not dict:
+            return False
+        for name in _USER_FIELDS:
+            value = user.get(name)
+            if value is not None and type(value) is not str:
+                return False
+    meta = get("user_meta")
+    if meta is not None:
+        if type(meta) is not dict:
+            return False
+        for key in meta:
+            if type(key) is not str:
+                return False
+    return True
+
+
+def _normalize_row(
+    row: Dict,
+    raw: Dict,
+    products: Dict[str, ProductConfig],
+    allowed_statuses: Set[str],
+) -> Optional[NormalizedTransaction]:
+    """Field parsing shared by plain and validated rows.
+
+    ``row`` must hold exactly the types the pydantic models accept: either a row that
+    passed :func:`_is_plain_transaction` or a validated model dumped back to a dict.
+    ``raw`` is the source row kept on the result.
+    """
+    get = row.get
+    transaction_id = row["transaction_id"]
+    product_id = row["product_id"]
+
+    status_value = (get("status") or get("txn_status") or "").strip()
+    if allowed_statuses and status_value.lower() not in allowed_statuses:
+        return None
+
+    product = products.get(product_id)
+    if not product:
+        logger.warning(
+            "transaction.unknown_product",
+            extra={
+                "extra_data": {
+                    "transactionId": transaction_id,
+                    "productId": product_id,
+                }
+            },
+        )
+        return None
+
+    try:
+        created_at = _parse_datetime(row["created_at"])
+    except ValueError:
+        logger.warning(
+            "transaction.invalid_created_at",
+            extra={
+                "extra_data": {
+                    "transactionId": transaction_id,
+                    "created_at": row["created_at"],
+                }
+            },
+        )
+        return None
 
+    expires_at = get("expires_at")
+    source_expiry = None
+    if expires_at:
         try:
-            created_at = transaction.created_at_dt
+            source_expiry = _parse_datetime(expires_at)
         except ValueError:
-            logger.warning(
-                "transaction.invalid_created_at",
-                extra={
-                    "extra_data": {
-                        "transactionId": transaction.transaction_id,
-                        "created_at": transaction.created_at,
-                    }
-                },
-            )
-            continue
-
-        computed_expiry = compute_expiry(
-            created_at,
-            product.duration_days,
-            transaction.expires_at_dt,
+            source_expiry = None
+    computed_expiry = compute_expiry(created_at, product.duration_days, source_expiry)
+
+    meta = get("user_meta")
+    meta_username = None
+    if meta:
+        candidate = meta.get("tradingview_username")
+        if isinstance(candidate, str):
+            candidate = candidate.strip()
+            if candidate:
+                meta_username = candidate
+
+    if not meta_username:
+        logger.warning(
+            "transaction.missing_tradingview_username",
+            extra={
+                "extra_data": {
+                    "transactionId": transaction_id,
+                    "productId": product_id,
+                }
+            },
         )
-
-        meta_username = None
-        if transaction.user_meta:
-            candidate = transaction.user_meta.get("tradingview_username")
-            if isinstance(candidate, str):
-                candidate = candidate.strip()
-                if candidate:
-                    meta_username = candidate
-
-        if not meta_username:
-            logger.warning(
-                "transaction.missing_tradingview_username",
-                extra={
-                    "extra_data": {
-                        "transactionId": transaction.transaction_id,
-                        "productId": transaction.product_id,
-                    }
-                },
-            )
-            continue
-
-        username = meta_username
-
-        email = (
-            transaction.user.email if transaction.user and transaction.user.email else None
-        ) or transaction.user_email or raw.get("user_email")
-        if not email:
-            logger.warning(
-                "transaction.missing_email",
-                extra={
-                    "extra_data": {
-                        "transactionId": transaction.transaction_id,
-                        "productId": transaction.product_id,
-                    }
-                },
-            )
-            continue
-
-        wp_user_id = (
-            transaction.user.id if transaction.user and transaction.user.id else None
-        ) or transaction.user_id or raw.get("user_id")
-        if not wp_user_id:
-            logger.warning(
-                "transaction.missing_user_id",
-                extra={
-                    "extra_data": {
-                        "transactionId": transaction.transaction_id,
-                        "productId": transaction.product_id,
-                    }
-                },
-            )
-            continue
-
-        display_name = (
-            transaction.user.display_name if transaction.user and transaction.user.display_name else None
-        ) or transaction.display_name or raw.get("display_name")
-        if not display_name and transaction.user_meta:
-            first = transaction.user_meta.get("first_name")
-            last = transaction.user_meta.get("last_name")
-            parts = [part for part in [first, last] if part]
-            if parts:
-                display_name = " ".join(parts)
-
-        remarks = raw.get("remarks") or raw.get("note")
-        if not remarks:
-            remarks = "paid" if status_value.lower() == "complete" else status_value or "paid"
-
-        wp_username = (
-            transaction.user_login
-            or raw.get("user_login")
-            or (transaction.user.username if transaction.user and transaction.user.username else None)
-            or username
+        return None
+
+    user = get("user") or {}
+    email = user.get("email") or get("user_email")
+    if not email:
+        logger.warning(
+            "transaction.missing_email",
+            extra={
+                "extra_data": {
+                    "transactionId": transaction_id,
+                    "productId": product_id,
+                }
+            },
         )
-
-        normalized.append(
-            NormalizedTransaction(
-                transaction_id=transaction.transaction_id,
-                product_id=transaction.product_id,
-                script_id=product.script_id,
-                username=username,
-                email=email,
-                wp_username=wp_username,
-                wp_user_id=str(wp_user_id),
-                display_name=display_name,
-                created_at=created_at,
-                computed_expiry=computed_expiry,
-                duration_days=product.duration_days,
-                subscription_type=product.subscription_type,
-                stacking_allowed=product.stacking_allowed,
-                remarks=remarks,
-                raw=raw,
-            )
+        return None
+
+    wp_user_id = user.get("id") or get("user_id")
+    if not wp_user_id:
+        logger.warning(
+            "transaction.missing_user_id",
+            extra={
+                "extra_data": {
+                    "transactionId": transaction_id,
+                    "productId": product_id,
+                }
+            },
         )
-    return normalized
+        return None
+
+    display_name = user.get("display_name") or get("display_name")
+    if not display_name and meta:
+        parts = [part for part in [meta.get("first_name"), meta.get("last_name")] if part]
+        if parts:
+            display_name = " ".join(parts)
+
+    remarks = get("remarks") or get("note")
+    if not remarks:
+        remarks = "paid" if status_value.lower() == "complete" else status_value or "paid"
+
+    wp_username = get("user_login") or user.get("username") or meta_username
+
+    return NormalizedTransaction(
+        transaction_id=transaction_id,
+        product_id=product_id,
+        script_id=product.script_id,
+        username=meta_username,
+        email=email,
+        wp_username=wp_username,
+        wp_user_id=wp_user_id,
+        display_name=display_name,
+        created_at=created_at,
+        computed_expiry=computed_expiry,
+        duration_days=product.duration_days,
+        subscription_type=product.subscription_type,
+        stacking_allowed=product.stacking_allowed,
+        remarks=remarks,
+        raw=raw,
+    )
 
 
 def compute_expiry(
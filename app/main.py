@@ -1,11 +1,53 @@
 from __future__ import annotations
 
-from fastapi import Depends, FastAPI
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
 
 from .config import Settings, get_settings
-from .sync import run_sync
+from .email import get_outbox
+from .jobs import get_job_manager
+from .metrics import REGISTRY
+from .webhooks import (
+    get_webhook_queue,
+    stop_webhook_queue,
+    transactions_from_payload,
+    verify_signature,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def _lifespan(_: FastAPI) -> AsyncIterator[None]:
+    settings = get_settings()
+    config = settings.webhook
+    if config.enabled and not config.secret:
+        logger.error(
+            "webhook.secret_missing",
+            extra={"extra_data": {"detail": "webhook.enabled is set without webhook.secret"}},
+        )
+    # POST /sync jobs and webhook batches only enqueue mail; this worker sends it.
+    outbox = get_outbox(settings)
+    if outbox is not None:
+        outbox.start()
+    yield
+    await stop_webhook_queue()
+    if outbox is not None:
+        await outbox.stop()
+
+
+app = FastAPI(title="Access Management Sync", lifespan=_lifespan)
+
 
-app = FastAPI(title="Access Management Sync")
+def _settings() -> Settings:
+    # FastAPI cannot read the signature through get_settings' lru_cache wrapper.
+    return get_settings()
 
 
 @app.get("/health")
@@ -13,9 +55,69 @@ async def health_check() -> dict:
     return {"status": "ok"}
 
 
-@app.post("/sync")
-async def trigger_sync(dry_run: bool = False, settings: Settings = Depends(get_settings)) -> dict:
-    if dry_run:
-        settings.scheduler.dry_run = True
-    return await run_sync(settings)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """This process's series only; the scheduler exports its own on scheduler.metrics_port."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/sync", status_code=202)
+async def trigger_sync(
+    response: Response,
+    dry_run: bool = False,
+    wait: bool = False,
+    settings: Settings = Depends(_settings),
+) -> dict:
+    """Queue a sync and return its job id; poll ``GET /sync/{job_id}`` for progress.
+
+    If a sync in the same mode is already queued or running, that job is returned
+    with ``coalesced: true``. ``wait=true`` blocks until the job finishes.
+    """
+    job, coalesced = get_job_manager(settings).submit(
+        settings, dry_run=dry_run or settings.scheduler.dry_run
+    )
+    if wait:
+        await job.wait()
+        response.status_code = 200
+    return {**job.as_dict(), "coalesced": coalesced}
+
+
+@app.get("/sync/{job_id}")
+async def sync_status(job_id: str, settings: Settings = Depends(_settings)) -> dict:
+    job = get_job_manager(settings).get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown sync job")
+    return job.as_dict()
+
+
+@app.post("/webhooks/transaction", status_code=202)
+async def transaction_webhook(request: Request, settings: Settings = Depends(_settings)) -> dict:
+    """Accept pushed MemberPress transactions and queue them for granting.
+
+    Polling keeps running as a reconciliation pass; anything granted here is
+    recorded as processed, so the poll skips it.
+    """
+    config = settings.webhook
+    if not config.enabled:
+        raise HTTPException(status_code=404, detail="Webhook ingestion is disabled")
+    if not config.secret:
+        # Unsigned pushes could grant anyone access, so the endpoint stays closed.
+        raise HTTPException(status_code=503, detail="Webhook secret is not configured")
+    body = await request.body()
+    if not verify_signature(
+        config.secret, body, request.headers.get(config.signature_header)
+    ):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body is not valid JSON")
 
+    rows = transactions_from_payload(payload)
+    if not rows:
+        return {"accepted": 0, "ignored": True}
+    queue = get_webhook_queue(settings)
+    accepted, dropped = queue.submit(rows)
+    if dropped and not accepted:
+        raise HTTPException(status_code=503, detail="Webhook queue is full")
+    return {"accepted": accepted, "dropped": dropped, "queue_depth": queue.depth}
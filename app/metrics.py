@@ -0,0 +1,284 @@
+"""In-process metrics registry rendered in the Prometheus text exposition format.
+
+Instruments are created once at import time. Label values are passed as tuples so
+that hot paths can hand over a module-level constant: recording a sample is a dict
+lookup plus an in-place add, with no locks and no per-call objects. All updates
+happen on the event loop thread, so no further synchronisation is needed.
+
+The registry is per process, and each process exports its own samples. The API
+serves them on ``GET /metrics``. The scheduler serves them from :func:`start_exporter`
+on ``scheduler.metrics_port``. Scrape both, and aggregate across instances:
+
+* API process: syncs started by ``POST /sync`` and webhook batches, plus the webhook
+  series (``access_sync_webhook_*``).
+* Scheduler process: scheduled syncs, retry drains and the expiry sweep.
+
+Both processes export the sync, latency, queue-depth and
+``access_sync_last_success_timestamp_seconds`` series for the runs they perform.
+Sum the counters and histograms across instances, and take the ``max`` of the
+last-success timestamps.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+logger = logging.getLogger(__name__)
+
+_API_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_LOCAL_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, labels: LabelValues = ()) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, labels: LabelValues = ()) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, labels: LabelValues = ()) -> None:
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = _API_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket..., overflow, sum]. Cumulated on render.
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, labels: LabelValues = ()) -> None:
+        row = self._values.get(labels)
+        if row is None:
+            row = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def count(self, labels: LabelValues = ()) -> int:
+        row = self._values.get(labels)
+        return int(sum(row[:-1])) if row else 0
+
+    def samples(self) -> Iterable[str]:
+        for labels, row in sorted(self._values.items()):
+            cumulative = 0.0
+            for bound, hits in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += hits
+                le = 'le="' + _format_value(bound) + '"'
+                yield (
+                    f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} "
+                    f"{_format_value(cumulative)}"
+                )
+            label_text = _format_labels(self.label_names, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(row[-1])}"
+            yield f"{self.name}_count{label_text} {_format_value(cumulative)}"
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labels))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = _API_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+SYNC_SUMMARY = REGISTRY.counter(
+    "access_sync_summary_total",
+    "Running total of each numeric run_sync summary key.",
+    ("key",),
+)
+SYNC_LAST_RUN = REGISTRY.gauge(
+    "access_sync_last_run",
+    "Point-in-time summary values (rates, queue depths) from the latest sync.",
+    ("key",),
+)
+SYNC_RUNS = REGISTRY.counter(
+    "access_sync_runs_total", "Completed and failed sync runs.", ("status",)
+)
+API_LATENCY = REGISTRY.histogram(
+    "access_sync_api_request_seconds",
+    "Latency of WordPress and TradingView calls.",
+    ("operation",),
+    _API_BUCKETS,
+)
+LOCAL_LATENCY = REGISTRY.histogram(
+    "access_sync_local_operation_seconds",
+    "Time spent normalizing transactions and loading or saving masterData.",
+    ("operation",),
+    _LOCAL_BUCKETS,
+)
+RETRY_QUEUE_DEPTH = REGISTRY.gauge(
+    "access_sync_retry_queue_depth", "Queued grant retries per script.", ("script_id",)
+)
+MANUAL_REVIEW_DEPTH = REGISTRY.gauge(
+    "access_sync_manual_review_depth", "Manual review entries per script.", ("script_id",)
+)
+LAST_SUCCESS = REGISTRY.gauge(
+    "access_sync_last_success_timestamp_seconds",
+    "Unix time of the last successful sync per script.",
+    ("script_id",),
+)
+WEBHOOK_TRANSACTIONS = REGISTRY.counter(
+    "access_sync_webhook_transactions_total",
+    "Transactions received on POST /webhooks/transaction, by outcome.",
+    ("outcome",),
+)
+WEBHOOK_LATENCY = REGISTRY.histogram(
+    "access_sync_webhook_latency_seconds",
+    "Time from webhook receipt until its batch finished processing.",
+)
+
+# Label tuples for the hot paths, built once.
+VALIDATE_USERNAME = ("validate_username",)
+GRANT_ACCESS = ("grant_access",)
+FETCH_TRANSACTIONS = ("fetch_transactions",)
+NORMALIZE_TRANSACTIONS = ("normalize_transactions",)
+LOAD_MASTER = ("load_master",)
+SAVE_MASTER = ("save_master",)
+
+
+# Summary keys that describe a point in time rather than events during the run.
+_SUMMARY_GAUGE_KEYS = frozenset(
+    {"tv_rate_per_second", "tv_queue_depth", "tv_peak_queue_depth", "emails_queued"}
+)
+
+
+def record_sync_summary(summary: Dict) -> None:
+    for key, value in summary.items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            continue
+        if key in _SUMMARY_GAUGE_KEYS:
+            SYNC_LAST_RUN.set(value, (key,))
+        else:
+            SYNC_SUMMARY.inc(value, (key,))
+
+
+def record_queue_depths(masters: Iterable) -> None:
+    for master in masters:
+        labels = (master.script_id,)
+        RETRY_QUEUE_DEPTH.set(len(master.retry_queue), labels)
+        MANUAL_REVIEW_DEPTH.set(len(master.manual_review), labels)
+
+
+async def _serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+        # Drain the headers; the request body, if any, is ignored.
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+            if line in (b"\r\n", b"\n", b""):
+                break
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, content_type = "200 OK", "text/plain; version=0.0.4"
+            body = REGISTRY.render().encode("utf-8")
+        else:
+            status, content_type, body = "404 Not Found", "text/plain", b"Not Found\n"
+        writer.write(
+            (
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+            ).encode("latin-1")
+            + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_exporter(host: str, port: int) -> asyncio.AbstractServer:
+    """Serve this process's registry on ``GET /metrics`` at ``host:port``.
+
+    For processes without the FastAPI app (the scheduler); close the returned server
+    to stop it.
+    """
+    server = await asyncio.start_server(_serve_metrics, host, port)
+    logger.info("metrics.exporter_started", extra={"extra_data": {"host": host, "port": port}})
+    return server
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from .config import RetryConfig, Settings, get_settings
+from .io import ApiError, CircuitOpenError, TradingViewClient
+from .locks import masterdata_lock
+from .storage import (
+    AccessRecord,
+    ManualReviewEntry,
+    MasterData,
+    RetryEntry,
+    load_master,
+    save_masters,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(tz=timezone.utc)
+
+
+def retry_delay(config: RetryConfig, attempts: int) -> timedelta:
+    """Exponential backoff before the retry that follows ``attempts`` failed ones."""
+    seconds = config.base_delay_seconds * 2 ** min(attempts, 32)
+    return timedelta(seconds=min(seconds, config.max_delay_seconds))
+
+
+def covers_transactions(record: AccessRecord, transaction_ids: List[str]) -> bool:
+    """Whether ``record`` already includes the grants for every one of ``transaction_ids``."""
+    granted = {item.transaction_id for item in record.history}
+    granted.add(record.last_transaction_id)
+    return all(txn_id in granted for txn_id in transaction_ids)
+
+
+def rederive_record(entry: RetryEntry, existing: AccessRecord) -> Optional[AccessRecord]:
+    """The record ``entry`` should grant now that the user holds ``existing``.
+
+    A grant that failed was derived from the record as it was then; if a later
+    transaction was granted in the meantime, the retried extension goes on top of
+    that. Returns None when the entry predates ``access_from`` and its access is no
+    longer clearly an extension, so it cannot be re-derived safely.
+    """
+    record = entry.record
+    if entry.access_from is None:
+        return record if existing.expiry < record.expiry else None
+    start = max(existing.expiry, entry.access_from)
+    shift = start - entry.access_from
+    update: Dict = {}
+    if shift:
+        update["expiry"] = record.expiry + shift
+        update["history"] = [
+            item.model_copy(update={"expires_at": item.expires_at + shift})
+            for item in record.history
+        ]
+    if existing.last_transaction_at > record.last_transaction_at:
+        update["last_transaction_id"] = existing.last_transaction_id
+        update["last_transaction_at"] = existing.last_transaction_at
+    return record.model_copy(update=update) if update else record
+
+
+class RetryIndex:
+    """Min-heap of queued retries across all masters, ordered by ``next_attempt_at``."""
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[datetime, int, MasterData, RetryEntry]] = []
+        # Tie-breaker so equal timestamps keep queue order and never compare masters.
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, master: MasterData, entry: RetryEntry) -> None:
+        heapq.heappush(self._heap, (entry.next_attempt_at, next(self._counter), master, entry))
+
+    def pop_due(self, now: datetime) -> Optional[Tuple[MasterData, RetryEntry]]:
+        if not self._heap or self._heap[0][0] > now:
+            return None
+        _, _, master, entry = heapq.heappop(self._heap)
+        return master, entry
+
+
+async def drain_retry_queue(
+    settings: Optional[Settings] = None,
+    tv_client: Optional[TradingViewClient] = None,
+    now: Optional[datetime] = None,
+) -> Dict:
+    """Retry every queued grant whose ``next_attempt_at`` has passed.
+
+    Each due entry gets a single TradingView call. Entries whose transactions the
+    user's record already covers are dropped; otherwise the expiry is re-derived on
+    top of the user's current record, so access granted since the failure is kept.
+    Successes store that record; failures are rescheduled with exponential backoff
+    until ``retry.max_attempts`` is reached, then moved to manual review.
+    """
+    settings = settings or get_settings()
+    owned_client = tv_client is None
+    if tv_client is None:
+        tv_client = TradingViewClient(settings)
+    try:
+        async with masterdata_lock(settings):
+            return await _drain_retry_queue(settings, tv_client, now or _utcnow())
+    finally:
+        if owned_client:
+            await tv_client.aclose()
+
+
+async def _drain_retry_queue(
+    settings: Settings, tv_client: TradingViewClient, now: datetime
+) -> Dict:
+    config = settings.retry
+    script_ids = sorted({product.script_id for product in settings.products.values()})
+    masters = {script_id: load_master(settings, script_id) for script_id in script_ids}
+
+    index = RetryIndex()
+    for master in masters.values():
+        for entry in master.retry_queue:
+            index.push(master, entry)
+
+    summary = {
+        "queued": len(index),
+        "attempted": 0,
+        "succeeded": 0,
+        "superseded": 0,
+        "rederived": 0,
+        "manual_review": 0,
+        "rescheduled": 0,
+        "exhausted": 0,
+        "dry_run_skipped": 0,
+        "deferred_circuit_open": 0,
+    }
+    user_locks: Dict[Tuple[str, str], asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def retry_entry(master: MasterData, entry: RetryEntry) -> None:
+        username = str(entry.payload.get("username") or "")
+        transaction_ids = entry.transaction_ids or [entry.transaction_id]
+        existing = master.users.get(username)
+        record = entry.record
+        payload = entry.payload
+
+        if record is not None and existing and covers_transactions(existing, transaction_ids):
+            # The grant landed after all (recovery, another run); nothing to send.
+            master.remove_retry(entry)
+            for txn_id in transaction_ids:
+                master.register_processed(txn_id)
+            summary["superseded"] += 1
+            logger.info(
+                "retry.superseded",
+                extra={
+                    "extra_data": {
+                        "scriptId": master.script_id,
+                        "username": username,
+                        "transactionId": entry.transaction_id,
+                    }
+                },
+            )
+            return
+
+        if record is not None and existing is not None:
+            record = rederive_record(entry, existing)
+            if record is None:
+                master.remove_retry(entry)
+                for txn_id in transaction_ids:
+                    master.record_manual_review(
+                        ManualReviewEntry(transaction_id=txn_id, reason="retry_stale_expiry")
+                    )
+                    master.register_processed(txn_id)
+                summary["manual_review"] += 1
+                logger.warning(
+                    "retry.stale_expiry",
+                    extra={
+                        "extra_data": {
+                            "scriptId": master.script_id,
+                            "username": username,
+                            "transactionId": entry.transaction_id,
+                        }
+                    },
+                )
+                return
+            if record.expiry != entry.record.expiry:
+                payload = {**payload, "expiry": record.expiry.date().isoformat()}
+                summary["rederived"] += 1
+                logger.info(
+                    "retry.rederived",
+                    extra={
+                        "extra_data": {
+                            "scriptId": master.script_id,
+                            "username": username,
+                            "transactionId": entry.transaction_id,
+                            "expiry": record.expiry.isoformat(),
+                        }
+                    },
+                )
+
+        if settings.scheduler.dry_run:
+            summary["dry_run_skipped"] += 1
+            logger.info(
+                "dry_run.retry",
+                extra={"extra_data": {"transactionId": entry.transaction_id, "payload": payload}},
+            )
+            return
+
+        try:
+            await tv_client.grant_access(payload, retries=0)
+        except CircuitOpenError:
+            # Rejected locally; an outage must not use up the entry's attempts.
+            summary["deferred_circuit_open"] += 1
+            return
+        except ApiError as exc:
+            summary["attempted"] += 1
+            if entry.attempts + 1 >= config.max_attempts:
+                master.remove_retry(entry)
+                for txn_id in transaction_ids:
+                    master.record_manual_review(
+                        ManualReviewEntry(transaction_id=txn_id, reason="retry_exhausted")
+                    )
+                    master.register_processed(txn_id)
+                summary["exhausted"] += 1
+                logger.error(
+                    "retry.exhausted",
+                    extra={
+                        "extra_data": {
+                            "scriptId": master.script_id,
+                            "username": username,
+                            "transactionId": entry.transaction_id,
+                            "attempts": entry.attempts + 1,
+                            "error": str(exc),
+                        }
+                    },
+                )
+                return
+            next_attempt_at = now + retry_delay(config, entry.attempts + 1)
+            master.reschedule_retry(entry, next_attempt_at, str(exc))
+            summary["rescheduled"] += 1
+            logger.warning(
+                "retry.rescheduled",
+                extra={
+                    "extra_data": {
+                        "scriptId": master.script_id,
+                        "username": username,
+                        "transactionId": entry.transaction_id,
+                        "attempts": entry.attempts,
+                        "next_attempt_at": next_attempt_at.isoformat(),
+                    }
+                },
+            )
+            return
+
+        summary["attempted"] += 1
+        master.remove_retry(entry)
+        if record is not None:
+            processed_at = _utcnow()
+            history = list(existing.history) if existing else []
+            history.extend(
+                item.model_copy(update={"processed_at": processed_at})
+                for item in record.history
+            )
+            master.record_user(username, record.model_copy(update={"history": history}))
+        for txn_id in transaction_ids:
+            master.register_processed(txn_id)
+        summary["succeeded"] += 1
+        logger.info(
+            "retry.succeeded",
+            extra={
+                "extra_data": {
+                    "scriptId": master.script_id,
+                    "username": username,
+                    "transactionId": entry.transaction_id,
+                    "attempts": entry.attempts + 1,
+                }
+            },
+        )
+
+    async def worker() -> None:
+        while True:
+            item = index.pop_due(now)
+            if item is None:
+                return
+            master, entry = item
+            username = str(entry.payload.get("username") or "").lower()
+            # Entries for one user run in heap order; the lock is taken before the
+            # next pop, so a later entry can never overtake an earlier one.
+            async with user_locks[(master.script_id, username)]:
+                await retry_entry(master, entry)
+
+    await asyncio.gather(*(worker() for _ in range(config.concurrency)))
+
+    save_masters(settings, masters.values())
+
+    remaining = [entry for master in masters.values() for entry in master.retry_queue]
+    summary["pending"] = len(remaining)
+    summary["next_attempt_at"] = (
+        min(entry.next_attempt_at for entry in remaining).isoformat() if remaining else None
+    )
+    logger.info("retry.drain_completed", extra={"extra_data": summary})
+    return summary
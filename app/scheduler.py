@@ -8,7 +8,13 @@ from typing import Optional
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from .config import get_settings
-from .sync import run_sync
+from .discord_alert import flush_discord_alerts
+from .email import get_outbox
+from .expiry import revoke_expired_access
+from .io import TradingViewClient, WordPressClient
+from .jobs import get_job_manager, master_lock
+from .metrics import start_exporter
+from .retry import drain_retry_queue
 from .storage import load_master
 
 logger = logging.getLogger(__name__)
@@ -71,17 +77,83 @@ async def start_scheduler(config_path: Optional[str] = None, dry_run: Optional[b
     if dry_run is not None:
         settings.scheduler.dry_run = dry_run
     scheduler = AsyncIOScheduler()
+    # Long-lived clients keep their connection pools warm across scheduled runs.
+    wp_client = WordPressClient(settings)
+    tv_client = TradingViewClient(settings)
+
+    # Sync, retry drains and revocations all rewrite masterData, so they never interleave:
+    # each takes the cross-process masterData lock, and master_lock queues them in here.
+    # Syncs go through the job manager, which holds app.jobs.master_lock while running.
+    jobs = get_job_manager(settings)
+    # Invalid-username emails are queued on disk during syncs and sent from here.
+    outbox = get_outbox(settings)
+    if outbox is not None:
+        outbox.start()
+    # Scheduled runs record into this process's registry, which the API cannot see.
+    exporter = None
+    if settings.scheduler.metrics_port is not None:
+        try:
+            exporter = await start_exporter(
+                settings.scheduler.metrics_host, settings.scheduler.metrics_port
+            )
+        except OSError as exc:
+            # Metrics are optional; a taken port must not keep the scheduler down.
+            logger.warning(
+                "scheduler.metrics_exporter_failed",
+                extra={
+                    "extra_data": {
+                        "host": settings.scheduler.metrics_host,
+                        "port": settings.scheduler.metrics_port,
+                        "error": str(exc),
+                    }
+                },
+            )
+
+    async def sync_job() -> None:
+        job, _ = jobs.submit(
+            settings, trigger="scheduler", wp_client=wp_client, tv_client=tv_client
+        )
+        await job.wait()
+
+    async def retry_job() -> None:
+        async with master_lock:
+            await drain_retry_queue(settings, tv_client=tv_client)
+
+    async def expiry_job() -> None:
+        async with master_lock:
+            await revoke_expired_access(settings, tv_client=tv_client)
 
     scheduler.add_job(
-        run_sync,
+        sync_job,
         "interval",
         minutes=settings.scheduler.interval_minutes,
-        kwargs={"settings": settings},
         id="access_sync",
         max_instances=1,
         coalesce=True,
     )
+
+    if settings.retry.enabled:
+        scheduler.add_job(
+            retry_job,
+            "interval",
+            minutes=settings.retry.interval_minutes,
+            id="retry_queue",
+            max_instances=1,
+            coalesce=True,
+        )
     
+    if settings.expiry.enabled:
+        scheduler.add_job(
+            expiry_job,
+            "cron",
+            hour=settings.expiry.run_hour,
+            minute=settings.expiry.run_minute,
+            timezone=timezone.utc,
+            id="expiry_revocation",
+            max_instances=1,
+            coalesce=True,
+        )
+
     # Add health check job - runs every 30 minutes to check if sync is stale
     scheduler.add_job(
         _check_sync_health,
@@ -97,7 +169,10 @@ async def start_scheduler(config_path: Optional[str] = None, dry_run: Optional[b
         "scheduler.started",
         extra={
             "extra_data": {
-                "intervalMinutes": settings.scheduler.interval_minutes
+                "intervalMinutes": settings.scheduler.interval_minutes,
+                "retryIntervalMinutes": (
+                    settings.retry.interval_minutes if settings.retry.enabled else None
+                ),
             }
         },
     )
@@ -108,6 +183,14 @@ async def start_scheduler(config_path: Optional[str] = None, dry_run: Optional[b
         logger.info("scheduler.stopping")
     finally:
         scheduler.shutdown()
+        await wp_client.aclose()
+        await tv_client.aclose()
+        if outbox is not None:
+            await outbox.stop()
+        if exporter is not None:
+            exporter.close()
+            await exporter.wait_closed()
+        await flush_discord_alerts()
         logger.info("scheduler.stopped")
 
 
@@ -0,0 +1,477 @@
+from __future__ import annotations
+
+import json
+import logging
+import pathlib
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .storage import JsonMasterStore, MasterData, MasterStore, RetryEntry
+
+logger = logging.getLogger(__name__)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS masters (
+    script_id TEXT PRIMARY KEY,
+    last_synced_at TEXT,
+    last_processed_at TEXT,
+    processed_bloom TEXT
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    script_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    wp_user_id TEXT NOT NULL,
+    wp_username TEXT,
+    email TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    expiry TEXT NOT NULL,
+    last_transaction_id TEXT NOT NULL,
+    last_transaction_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (script_id, username)
+);
+CREATE INDEX IF NOT EXISTS idx_users_username ON users (username COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_users_expiry ON users (script_id, expiry);
+
+CREATE TABLE IF NOT EXISTS history (
+    script_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    transaction_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    expires_at TEXT NOT NULL,
+    processed_at TEXT NOT NULL,
+    note TEXT,
+    PRIMARY KEY (script_id, username, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_history_transaction ON history (transaction_id);
+
+CREATE TABLE IF NOT EXISTS processed_transactions (
+    script_id TEXT NOT NULL,
+    transaction_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    recorded_at INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (script_id, transaction_id)
+);
+CREATE INDEX IF NOT EXISTS idx_processed_seq ON processed_transactions (script_id, seq);
+
+CREATE TABLE IF NOT EXISTS retry_queue (
+    script_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    transaction_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    error_message TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    next_attempt_at TEXT NOT NULL,
+    context TEXT,
+    PRIMARY KEY (script_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_retry_transaction ON retry_queue (transaction_id);
+
+CREATE TABLE IF NOT EXISTS manual_review (
+    script_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    transaction_id TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    recorded_at TEXT NOT NULL,
+    PRIMARY KEY (script_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_manual_review_transaction ON manual_review (transaction_id);
+"""
+
+
+def _dt(value: Optional[datetime]) -> Optional[str]:
+    """Store datetimes as UTC ISO strings so lexical order matches time order."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+def _retry_context(entry: RetryEntry) -> Optional[str]:
+    if not entry.transaction_ids and entry.record is None and entry.access_from is None:
+        return None
+    return json.dumps(
+        entry.model_dump(mode="json", include={"transaction_ids", "record", "access_from"}),
+        sort_keys=True,
+    )
+
+
+@dataclass
+class _Baseline:
+    """Row images from the last load/save, diffed against on the next save."""
+
+    master_row: Tuple = ()
+    users: Dict[str, Tuple] = field(default_factory=dict)
+    history_len: Dict[str, int] = field(default_factory=dict)
+    processed: Set[str] = field(default_factory=set)
+    processed_seq: int = 0
+    retry_rows: List[Tuple] = field(default_factory=list)
+    review_rows: List[Tuple] = field(default_factory=list)
+
+
+class SqliteMasterStore(MasterStore):
+    """MasterData persisted as indexed rows in a single SQLite database.
+
+    ``save`` only upserts user rows and appends history entries that differ from
+    the snapshot taken at load time, so a sync touching a handful of users writes
+    a handful of rows.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Add columns introduced after a database was first created."""
+        retry_columns = {row[1] for row in self._conn.execute("PRAGMA table_info(retry_queue)")}
+        if "context" not in retry_columns:
+            self._conn.execute("ALTER TABLE retry_queue ADD COLUMN context TEXT")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def load(self, script_id: str) -> MasterData:
+        with self._lock:
+            master = self._read(script_id)
+        return master
+
+    def save(self, master: MasterData) -> None:
+        self.save_many([master])
+
+    def save_many(self, masters: Iterable[MasterData]) -> None:
+        masters = [
+            master
+            for master in masters
+            if master.is_dirty or not isinstance(master._store_baseline, _Baseline)
+        ]
+        if not masters:
+            return
+        baselines: List[_Baseline] = []
+        with self._lock:
+            with self._conn:
+                for master in masters:
+                    baselines.append(self._write(master))
+        # Only adopt the new snapshots once the transaction has committed.
+        for master, baseline in zip(masters, baselines):
+            master._store_baseline = baseline
+            master.clear_dirty()
+            logger.debug(
+                "masterdata.saved",
+                extra={"extra_data": {"scriptId": master.script_id, "path": str(self._path)}},
+            )
+
+    def _read(self, script_id: str) -> MasterData:
+        conn = self._conn
+        baseline = _Baseline()
+        master_row = conn.execute(
+            "SELECT last_synced_at, last_processed_at, processed_bloom FROM masters "
+            "WHERE script_id = ?",
+            (script_id,),
+        ).fetchone()
+        if master_row is None:
+            logger.info(
+                "masterdata.init",
+                extra={"extra_data": {"scriptId": script_id, "path": str(self._path)}},
+            )
+            master = MasterData(script_id=script_id)
+            master._store_baseline = baseline
+            return master
+        baseline.master_row = (script_id,) + tuple(master_row)
+
+        history: Dict[str, List[Dict[str, Any]]] = {}
+        for username, txn_id, action, expires_at, processed_at, note in conn.execute(
+            "SELECT username, transaction_id, action, expires_at, processed_at, note "
+            "FROM history WHERE script_id = ? ORDER BY username, seq",
+            (script_id,),
+        ):
+            history.setdefault(username, []).append(
+                {
+                    "transaction_id": txn_id,
+                    "action": action,
+                    "expires_at": expires_at,
+                    "processed_at": processed_at,
+                    "note": note,
+                }
+            )
+
+        users: Dict[str, Dict[str, Any]] = {}
+        for row in conn.execute(
+            "SELECT script_id, username, wp_user_id, wp_username, email, product_id, expiry, "
+            "last_transaction_id, last_transaction_at, status FROM users WHERE script_id = ?",
+            (script_id,),
+        ):
+            username = row[1]
+            entries = history.get(username, [])
+            baseline.users[username] = tuple(row)
+            baseline.history_len[username] = len(entries)
+            users[username] = {
+                "script_id": row[0],
+                "username": row[1],
+                "wp_user_id": row[2],
+                "wp_username": row[3],
+                "email": row[4],
+                "product_id": row[5],
+                "expiry": row[6],
+                "last_transaction_id": row[7],
+                "last_transaction_at": row[8],
+                "status": row[9],
+                "history": entries,
+            }
+
+        processed: List[str] = []
+        recorded_at: List[int] = []
+        for txn_id, seq, recorded in conn.execute(
+            "SELECT transaction_id, seq, recorded_at FROM processed_transactions "
+            "WHERE script_id = ? ORDER BY seq",
+            (script_id,),
+        ):
+            processed.append(txn_id)
+            recorded_at.append(recorded)
+            baseline.processed_seq = seq
+        baseline.processed = set(processed)
+
+        retry_queue = []
+        for row in conn.execute(
+            "SELECT transaction_id, payload, error_message, attempts, next_attempt_at, "
+            "context FROM retry_queue WHERE script_id = ? ORDER BY seq",
+            (script_id,),
+        ):
+            baseline.retry_rows.append(tuple(row))
+            entry = {
+                "transaction_id": row[0],
+                "payload": json.loads(row[1]),
+                "error_message": row[2],
+                "attempts": row[3],
+                "next_attempt_at": row[4],
+            }
+            if row[5]:
+                entry.update(json.loads(row[5]))
+            retry_queue.append(entry)
+
+        manual_review = []
+        for row in conn.execute(
+            "SELECT transaction_id, reason, recorded_at FROM manual_review "
+            "WHERE script_id = ? ORDER BY seq",
+            (script_id,),
+        ):
+            baseline.review_rows.append(tuple(row))
+            manual_review.append(
+                {"transaction_id": row[0], "reason": row[1], "recorded_at": row[2]}
+            )
+
+        master = MasterData.model_validate(
+            {
+                "script_id": script_id,
+                "last_synced_at": master_row[0],
+                "last_processed_at": master_row[1],
+                "processed_transactions": processed,
+                "processed_recorded_at": recorded_at,
+                "processed_bloom": master_row[2],
+                "users": users,
+                "retry_queue": retry_queue,
+                "manual_review": manual_review,
+            }
+        )
+        master._store_baseline = baseline
+        return master
+
+    def _write(self, master: MasterData) -> _Baseline:
+        conn = self._conn
+        script_id = master.script_id
+        previous = master._store_baseline
+        if not isinstance(previous, _Baseline):
+            # Not loaded from this store (bootstrap, migration): replace wholesale.
+            for table in ("users", "history", "processed_transactions", "retry_queue", "manual_review"):
+                conn.execute(f"DELETE FROM {table} WHERE script_id = ?", (script_id,))
+            previous = _Baseline()
+        baseline = _Baseline()
+
+        baseline.master_row = (
+            script_id,
+            _dt(master.last_synced_at),
+            _dt(master.last_processed_at),
+            master.processed_bloom,
+        )
+        if baseline.master_row != previous.master_row:
+            conn.execute(
+                "INSERT INTO masters (script_id, last_synced_at, last_processed_at, "
+                "processed_bloom) VALUES (?, ?, ?, ?) ON CONFLICT(script_id) DO UPDATE SET "
+                "last_synced_at = excluded.last_synced_at, "
+                "last_processed_at = excluded.last_processed_at, "
+                "processed_bloom = excluded.processed_bloom",
+                baseline.master_row,
+            )
+
+        user_upserts: List[Tuple] = []
+        history_inserts: List[Tuple] = []
+        history_resets: List[Tuple[str, str]] = []
+        for username, record in master.users.items():
+            row = (
+                script_id,
+                username,
+                record.wp_user_id,
+                record.wp_username,
+                record.email,
+                record.product_id,
+                _dt(record.expiry),
+                record.last_transaction_id,
+                _dt(record.last_transaction_at),
+                record.status,
+            )
+            baseline.users[username] = row
+            if previous.users.get(username) != row:
+                user_upserts.append(row)
+
+            known = previous.history_len.get(username, 0)
+            if len(record.history) < known:
+                history_resets.append((script_id, username))
+                known = 0
+            for seq in range(known, len(record.history)):
+                entry = record.history[seq]
+                history_inserts.append(
+                    (
+                        script_id,
+                        username,
+                        seq,
+                        entry.transaction_id,
+                        entry.action,
+                        _dt(entry.expires_at),
+                        _dt(entry.processed_at),
+                        entry.note,
+                    )
+                )
+            baseline.history_len[username] = len(record.history)
+
+        removed = [(script_id, username) for username in previous.users if username not in master.users]
+        if removed:
+            conn.executemany("DELETE FROM users WHERE script_id = ? AND username = ?", removed)
+        if removed or history_resets:
+            conn.executemany(
+                "DELETE FROM history WHERE script_id = ? AND username = ?",
+                removed + history_resets,
+            )
+        if user_upserts:
+            conn.executemany(
+                "INSERT INTO users (script_id, username, wp_user_id, wp_username, email, "
+                "product_id, expiry, last_transaction_id, last_transaction_at, status) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(script_id, username) DO UPDATE SET "
+                "wp_user_id = excluded.wp_user_id, wp_username = excluded.wp_username, "
+                "email = excluded.email, product_id = excluded.product_id, "
+                "expiry = excluded.expiry, last_transaction_id = excluded.last_transaction_id, "
+                "last_transaction_at = excluded.last_transaction_at, status = excluded.status",
+                user_upserts,
+            )
+        if history_inserts:
+            conn.executemany(
+                "INSERT OR REPLACE INTO history (script_id, username, seq, transaction_id, "
+                "action, expires_at, processed_at, note) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                history_inserts,
+            )
+
+        baseline.processed = set(master.processed_transactions)
+        baseline.processed_seq = previous.processed_seq
+        dropped = previous.processed - baseline.processed
+        if dropped:
+            conn.executemany(
+                "DELETE FROM processed_transactions WHERE script_id = ? AND transaction_id = ?",
+                [(script_id, txn_id) for txn_id in dropped],
+            )
+        added: List[Tuple] = []
+        processed_times = master.processed_transactions.recorded_times()
+        for txn_id, recorded in zip(master.processed_transactions, processed_times):
+            if txn_id not in previous.processed:
+                baseline.processed_seq += 1
+                added.append((script_id, txn_id, baseline.processed_seq, recorded))
+        if added:
+            conn.executemany(
+                "INSERT OR REPLACE INTO processed_transactions (script_id, transaction_id, seq, "
+                "recorded_at) VALUES (?, ?, ?, ?)",
+                added,
+            )
+
+        # Queues are short and rewritten in place whenever they change.
+        baseline.retry_rows = [
+            (
+                entry.transaction_id,
+                json.dumps(entry.payload),
+                entry.error_message,
+                entry.attempts,
+                _dt(entry.next_attempt_at),
+                _retry_context(entry),
+            )
+            for entry in master.retry_queue
+        ]
+        if baseline.retry_rows != previous.retry_rows:
+            conn.execute("DELETE FROM retry_queue WHERE script_id = ?", (script_id,))
+            conn.executemany(
+                "INSERT INTO retry_queue (script_id, seq, transaction_id, payload, "
+                "error_message, attempts, next_attempt_at, context) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(script_id, seq) + row for seq, row in enumerate(baseline.retry_rows)],
+            )
+
+        baseline.review_rows = [
+            (entry.transaction_id, entry.reason, _dt(entry.recorded_at))
+            for entry in master.manual_review
+        ]
+        if baseline.review_rows != previous.review_rows:
+            conn.execute("DELETE FROM manual_review WHERE script_id = ?", (script_id,))
+            conn.executemany(
+                "INSERT INTO manual_review (script_id, seq, transaction_id, reason, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(script_id, seq) + row for seq, row in enumerate(baseline.review_rows)],
+            )
+
+        return baseline
+
+
+def import_json_masters(
+    source_dir: pathlib.Path, store: SqliteMasterStore
+) -> Dict[str, int]:
+    """Import every JSON master in ``source_dir`` into ``store``.
+
+    Each script is read through :class:`JsonMasterStore`, so deltas still sitting in
+    ``<script_id>.journal.jsonl`` are replayed onto the snapshot. Existing SQLite rows
+    for an imported script are replaced. Returns the number of users imported per
+    script.
+    """
+    source = JsonMasterStore(source_dir)
+    script_ids = {path.stem for path in source_dir.glob("*.json")}
+    script_ids.update(
+        path.name[: -len(".journal.jsonl")] for path in source_dir.glob("*.journal.jsonl")
+    )
+    imported: Dict[str, int] = {}
+    masters: List[MasterData] = []
+    for script_id in sorted(script_ids):
+        path = source_dir / f"{script_id}.json"
+        master = source.load(script_id)
+        masters.append(master)
+        imported[master.script_id] = len(master.users)
+        logger.info(
+            "masterdata.migrate_file",
+            extra={
+                "extra_data": {
+                    "scriptId": master.script_id,
+                    "path": str(path),
+                    "users": len(master.users),
+                }
+            },
+        )
+    store.save_many(masters)
+    return imported
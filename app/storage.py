@@ -1,14 +1,27 @@
 from __future__ import annotations
 
+import abc
+import asyncio
+import base64
+import hashlib
+import heapq
+import itertools
 import json
 import logging
+import math
+import os
 import pathlib
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, GetCoreSchemaHandler, PrivateAttr, field_serializer
+from pydantic_core import core_schema
 
-from .config import Settings
+from . import metrics
+from .config import DedupeConfig, Settings
+from .locks import lock_held, masterdata_lock_path
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +30,165 @@ def _utcnow() -> datetime:
     return datetime.now(tz=timezone.utc)
 
 
+class ProcessedIndex:
+    """Insertion-ordered set of processed transaction IDs with O(1) membership.
+
+    Serializes as the plain list of IDs used by the original ``processed_transactions``
+    field; per-ID recording times travel separately in ``processed_recorded_at``.
+    """
+
+    __slots__ = ("_entries",)
+
+    def __init__(self, transaction_ids: Iterable[str] = (), recorded_at: int = 0):
+        self._entries: "OrderedDict[str, int]" = OrderedDict(
+            (txn_id, recorded_at) for txn_id in transaction_ids
+        )
+
+    def __contains__(self, transaction_id: object) -> bool:
+        return transaction_id in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, ProcessedIndex):
+            return list(self._entries.items()) == list(other._entries.items())
+        if isinstance(other, list):
+            return list(self._entries) == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"ProcessedIndex({len(self._entries)} ids)"
+
+    def add(self, transaction_id: str, recorded_at: int) -> bool:
+        if transaction_id in self._entries:
+            return False
+        self._entries[transaction_id] = recorded_at
+        return True
+
+    def recorded_times(self) -> List[int]:
+        return list(self._entries.values())
+
+    def apply_recorded_times(self, times: List[int], default: int) -> None:
+        if len(times) != len(self._entries):
+            times = [default] * len(self._entries)
+        for txn_id, recorded_at in zip(list(self._entries), times):
+            self._entries[txn_id] = recorded_at or default
+
+    def prune(self, max_entries: Optional[int], oldest_allowed: Optional[int]) -> List[str]:
+        """Evict from the oldest end until both bounds hold; returns evicted IDs."""
+        evicted: List[str] = []
+        entries = self._entries
+        while entries:
+            txn_id, recorded_at = next(iter(entries.items()))
+            over_size = max_entries is not None and len(entries) > max_entries
+            too_old = oldest_allowed is not None and recorded_at < oldest_allowed
+            if not (over_size or too_old):
+                break
+            entries.popitem(last=False)
+            evicted.append(txn_id)
+        return evicted
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, source: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        from_list = core_schema.no_info_after_validator_function(
+            cls, core_schema.list_schema(core_schema.str_schema())
+        )
+        return core_schema.json_or_python_schema(
+            json_schema=from_list,
+            python_schema=core_schema.union_schema(
+                [core_schema.is_instance_schema(cls), from_list]
+            ),
+            serialization=core_schema.plain_serializer_function_ser_schema(list),
+        )
+
+
+class BloomFilter:
+    """Compact probabilistic set of IDs evicted from :class:`ProcessedIndex`."""
+
+    __slots__ = ("size", "hashes", "_bits")
+
+    def __init__(self, size: int, hashes: int, bits: Optional[bytearray] = None):
+        self.size = size
+        self.hashes = hashes
+        self._bits = bits if bits is not None else bytearray((size + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float) -> "BloomFilter":
+        size = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        hashes = max(1, int(round(size / capacity * math.log(2))))
+        return cls(size, hashes)
+
+    def _positions(self, key: str) -> Iterator[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for index in range(self.hashes):
+            yield (first + index * second) % self.size
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    def dumps(self) -> str:
+        encoded = base64.b64encode(bytes(self._bits)).decode("ascii")
+        return f"{self.size}:{self.hashes}:{encoded}"
+
+    @classmethod
+    def loads(cls, value: str) -> "BloomFilter":
+        size, hashes, encoded = value.split(":", 2)
+        return cls(int(size), int(hashes), bytearray(base64.b64decode(encoded)))
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+class ExpiryIndex:
+    """Min-heap of ``(expiry, username)`` over a master's active users.
+
+    Entries are never removed in place: a re-granted, revoked or removed user leaves
+    a stale entry behind that :meth:`MasterData.pop_expired` discards when it
+    surfaces, so pushes and pops stay O(log n).
+    """
+
+    __slots__ = ("_heap", "_counter")
+
+    def __init__(self, items: Iterable[Tuple[datetime, str]] = ()):
+        self._counter = itertools.count()
+        self._heap: List[Tuple[datetime, int, str]] = [
+            (_as_utc(expiry), next(self._counter), username) for expiry, username in items
+        ]
+        heapq.heapify(self._heap)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, username: str, expiry: datetime) -> None:
+        heapq.heappush(self._heap, (_as_utc(expiry), next(self._counter), username))
+
+    def peek(self) -> Tuple[datetime, str]:
+        expiry, _, username = self._heap[0]
+        return expiry, username
+
+    def pop(self) -> Tuple[datetime, str]:
+        expiry, _, username = heapq.heappop(self._heap)
+        return expiry, username
+
+
 class GrantHistoryEntry(BaseModel):
     transaction_id: str
     action: str
@@ -27,16 +199,6 @@ class GrantHistoryEntry(BaseModel):
     model_config = {"json_encoders": {datetime: lambda dt: dt.isoformat()}}
 
 
-class RetryEntry(BaseModel):
-    transaction_id: str
-    payload: Dict
-    error_message: str
-    attempts: int = 0
-    next_attempt_at: datetime = Field(default_factory=_utcnow)
-
-    model_config = {"json_encoders": {datetime: lambda dt: dt.isoformat()}}
-
-
 class ManualReviewEntry(BaseModel):
     transaction_id: str
     reason: str
@@ -61,64 +223,657 @@ class AccessRecord(BaseModel):
     model_config = {"json_encoders": {datetime: lambda dt: dt.isoformat()}}
 
 
+class RetryEntry(BaseModel):
+    transaction_id: str
+    payload: Dict
+    error_message: str
+    attempts: int = 0
+    next_attempt_at: datetime = Field(default_factory=_utcnow)
+    # Every transaction folded into the failed grant, and the access record to store
+    # once a retry lands. Older entries carry only the payload.
+    transaction_ids: List[str] = Field(default_factory=list)
+    record: Optional[AccessRecord] = None
+    # Where the failed grant's access starts counting: the expiry it stacked on, or
+    # the first transaction's created_at. A retry adds ``record.expiry - access_from``
+    # to whatever access the user has by then.
+    access_from: Optional[datetime] = None
+
+    model_config = {"json_encoders": {datetime: lambda dt: dt.isoformat()}}
+
+
 class MasterData(BaseModel):
     script_id: str
     last_synced_at: Optional[datetime] = None
     last_processed_at: Optional[datetime] = None
-    processed_transactions: List[str] = Field(default_factory=list)
+    processed_transactions: ProcessedIndex = Field(default_factory=ProcessedIndex)
+    # Epoch seconds each processed ID was recorded, aligned with processed_transactions.
+    processed_recorded_at: List[int] = Field(default_factory=list)
+    # Optional BloomFilter.dumps() of IDs evicted from processed_transactions.
+    processed_bloom: Optional[str] = None
     users: Dict[str, AccessRecord] = Field(default_factory=dict)
     retry_queue: List[RetryEntry] = Field(default_factory=list)
     manual_review: List[ManualReviewEntry] = Field(default_factory=list)
 
+    # Backend-private snapshot of what was last loaded/saved, used for row-level writes.
+    _store_baseline: Any = PrivateAttr(default=None)
+    # Changes since the last load/save; saves skip clean masters and persist only these.
+    _dirty_users: Set[str] = PrivateAttr(default_factory=set)
+    _removed_users: Set[str] = PrivateAttr(default_factory=set)
+    _dirty_fields: Set[str] = PrivateAttr(default_factory=set)
+    # Appends since the last save, so journal deltas carry only the new entries:
+    # processed IDs with their recorded time, how many were evicted from the
+    # front, and how many manual-review entries were appended.
+    _processed_added: List[Tuple[str, int]] = PrivateAttr(default_factory=list)
+    _processed_evicted: int = PrivateAttr(default=0)
+    _review_added: int = PrivateAttr(default=0)
+    _dedupe: DedupeConfig = PrivateAttr(default_factory=DedupeConfig)
+    _bloom: Optional[BloomFilter] = PrivateAttr(default=None)
+    # Transaction IDs named by users, retries and manual review; built on a bloom hit.
+    _recorded_ids: Optional[Set[str]] = PrivateAttr(default=None)
+    _expiry_index: ExpiryIndex = PrivateAttr(default_factory=ExpiryIndex)
+
     model_config = {"json_encoders": {datetime: lambda dt: dt.isoformat()}}
 
+    def model_post_init(self, __context: Any) -> None:
+        self.processed_transactions.apply_recorded_times(
+            self.processed_recorded_at, int(time.time())
+        )
+        if self.processed_bloom:
+            self._bloom = BloomFilter.loads(self.processed_bloom)
+        self._expiry_index = ExpiryIndex(
+            (record.expiry, username)
+            for username, record in self.users.items()
+            if record.status == "active"
+        )
+
+    @field_serializer("processed_recorded_at")
+    def _serialize_recorded_at(self, value: List[int]) -> List[int]:
+        return self.processed_transactions.recorded_times()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name in _MASTER_TRACKED_FIELDS:
+            self._dirty_fields.add(name)
+        if name in ("users", "retry_queue", "manual_review"):
+            self._recorded_ids = None
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(
+            self._dirty_users
+            or self._removed_users
+            or self._dirty_fields
+            or self._processed_added
+            or self._processed_evicted
+            or self._review_added
+        )
+
+    def dirty_state(self) -> Tuple[Set[str], Set[str], Set[str]]:
+        return set(self._dirty_users), set(self._removed_users), set(self._dirty_fields)
+
+    def appended_state(self) -> Tuple[List[Tuple[str, int]], int, List[ManualReviewEntry]]:
+        """Processed IDs added, processed IDs evicted and review entries added since the last save."""
+        added_reviews = self.manual_review[-self._review_added:] if self._review_added else []
+        return list(self._processed_added), self._processed_evicted, added_reviews
+
+    def clear_dirty(self) -> None:
+        self._dirty_users.clear()
+        self._removed_users.clear()
+        self._dirty_fields.clear()
+        self._processed_added.clear()
+        self._processed_evicted = 0
+        self._review_added = 0
+
+    def mark_user_dirty(self, username: str) -> None:
+        """Flag an in-place change to ``users[username]`` for the next save."""
+        self._dirty_users.add(username)
+        self._removed_users.discard(username)
+        record = self.users.get(username)
+        if record is not None and record.status == "active":
+            self._expiry_index.push(username, record.expiry)
+
+    def pop_expired(self, now: datetime) -> List[Tuple[str, AccessRecord]]:
+        """Remove and return active users whose expiry is at or before ``now``.
+
+        Costs O(k log n) for k due entries; stale heap entries are dropped on the way.
+        Popped users leave the index, so callers that fail to act on one should
+        :meth:`mark_user_dirty` it or reload the master to see it again.
+        """
+        due: List[Tuple[str, AccessRecord]] = []
+        seen: Set[str] = set()
+        index = self._expiry_index
+        now = _as_utc(now)
+        while index:
+            expiry, username = index.peek()
+            if expiry > now:
+                break
+            index.pop()
+            record = self.users.get(username)
+            if (
+                record is None
+                or record.status != "active"
+                or _as_utc(record.expiry) != expiry
+                or username in seen
+            ):
+                continue
+            seen.add(username)
+            due.append((username, record))
+        return due
+
+    def configure_dedupe(self, config: DedupeConfig) -> None:
+        """Apply retention/bloom settings; called by :func:`load_master`."""
+        self._dedupe = config
+        if config.bloom_filter and self._bloom is None:
+            self._bloom = BloomFilter.for_capacity(config.bloom_capacity, config.bloom_error_rate)
+        self._prune_processed()
+
+    def is_processed(self, transaction_id: str) -> bool:
+        """Exact for retained IDs; evicted ones need the bloom filter and a record.
+
+        The bloom filter only rules IDs out. A hit counts only if the ID also appears
+        in a user's grant history, the retry queue or manual review, so a false
+        positive can never skip a transaction that was not handled.
+        """
+        if transaction_id in self.processed_transactions:
+            return True
+        if self._bloom is None or transaction_id not in self._bloom:
+            return False
+        return transaction_id in self._recorded_transaction_ids()
+
+    def _recorded_transaction_ids(self) -> Set[str]:
+        if self._recorded_ids is None:
+            ids: Set[str] = set()
+            for record in self.users.values():
+                ids.add(record.last_transaction_id)
+                ids.update(item.transaction_id for item in record.history)
+            for entry in self.retry_queue:
+                ids.add(entry.transaction_id)
+                ids.update(entry.transaction_ids)
+            ids.update(entry.transaction_id for entry in self.manual_review)
+            self._recorded_ids = ids
+        return self._recorded_ids
+
     def register_processed(self, transaction_id: str) -> None:
-        if transaction_id not in self.processed_transactions:
-            self.processed_transactions.append(transaction_id)
-            if len(self.processed_transactions) > 500:
-                self.processed_transactions = self.processed_transactions[-500:]
+        now = int(time.time())
+        if self.processed_transactions.add(transaction_id, now):
+            self._processed_added.append((transaction_id, now))
+            self._prune_processed(now)
+
+    def _prune_processed(self, now: Optional[int] = None) -> None:
+        config = self._dedupe
+        oldest_allowed = None
+        if config.retention_days is not None:
+            now = now if now is not None else int(time.time())
+            oldest_allowed = now - config.retention_days * 86400
+        evicted = self.processed_transactions.prune(config.max_entries, oldest_allowed)
+        if not evicted:
+            return
+        self._processed_evicted += len(evicted)
+        if self._bloom is not None:
+            for txn_id in evicted:
+                self._bloom.add(txn_id)
+            self.processed_bloom = self._bloom.dumps()
 
     def record_user(self, username: str, record: AccessRecord) -> None:
         if record.wp_username is None:
             record.wp_username = record.username
         self.users[username] = record
+        if self._recorded_ids is not None:
+            self._recorded_ids.add(record.last_transaction_id)
+            self._recorded_ids.update(item.transaction_id for item in record.history)
+        self.mark_user_dirty(username)
+
+    def remove_user(self, username: str) -> Optional[AccessRecord]:
+        record = self.users.pop(username, None)
+        if record is not None:
+            self._dirty_users.discard(username)
+            self._removed_users.add(username)
+        return record
 
     def record_retry(self, entry: RetryEntry) -> None:
-        self.retry_queue.append(entry)
+        """Queue ``entry``, replacing any queued retry for the same transaction."""
+        self.retry_queue = [
+            item for item in self.retry_queue if item.transaction_id != entry.transaction_id
+        ] + [entry]
+
+    def remove_retry(self, entry: RetryEntry) -> None:
+        self.retry_queue = [item for item in self.retry_queue if item is not entry]
+
+    def reschedule_retry(
+        self, entry: RetryEntry, next_attempt_at: datetime, error_message: str
+    ) -> None:
+        entry.attempts += 1
+        entry.next_attempt_at = next_attempt_at
+        entry.error_message = error_message
+        self._dirty_fields.add("retry_queue")
 
     def record_manual_review(self, entry: ManualReviewEntry) -> None:
         self.manual_review.append(entry)
+        self._review_added += 1
+        if self._recorded_ids is not None:
+            self._recorded_ids.add(entry.transaction_id)
 
 
-def _master_path(settings: Settings, script_id: str) -> pathlib.Path:
-    return settings.masterdata_path / f"{script_id}.json"
+_MASTER_TRACKED_FIELDS = frozenset(
+    name for name in MasterData.model_fields if name not in ("script_id", "users")
+)
 
 
-def load_master(settings: Settings, script_id: str) -> MasterData:
-    path = _master_path(settings, script_id)
-    if not path.exists():
-        logger.info(
-            "masterdata.init",
-            extra={"extra_data": {"scriptId": script_id, "path": str(path)}},
+class MasterStore(abc.ABC):
+    """Persistence backend for :class:`MasterData`, one instance per storage location."""
+
+    @abc.abstractmethod
+    def load(self, script_id: str) -> MasterData:
+        """Load ``script_id``, or an empty master when it has never been saved."""
+
+    @abc.abstractmethod
+    def save(self, master: MasterData) -> None:
+        """Persist ``master``; backends may skip masters with no unsaved changes."""
+
+    def save_many(self, masters: Iterable[MasterData]) -> None:
+        for master in masters:
+            self.save(master)
+
+    def close(self) -> None:
+        pass
+
+
+class JsonMasterStore(MasterStore):
+    """One ``<script_id>.json`` snapshot per script plus an append-only delta journal.
+
+    Saves of a master loaded from this store append only its dirty users, queues and
+    watermarks, plus the processed IDs and manual-review entries added since the last
+    save, to ``<script_id>.journal.jsonl``; the journal is folded back into the
+    snapshot once it holds ``compact_after`` entries. Loads replay snapshot + journal.
+    """
+
+    def __init__(self, directory: pathlib.Path, compact_after: int = 50):
+        self._directory = directory
+        self._compact_after = compact_after
+
+    def _path(self, script_id: str) -> pathlib.Path:
+        return self._directory / f"{script_id}.json"
+
+    def _journal_path(self, script_id: str) -> pathlib.Path:
+        return self._directory / f"{script_id}.journal.jsonl"
+
+    def load(self, script_id: str) -> MasterData:
+        path = self._path(script_id)
+        journal_path = self._journal_path(script_id)
+        if not path.exists() and not journal_path.exists():
+            logger.info(
+                "masterdata.init",
+                extra={"extra_data": {"scriptId": script_id, "path": str(path)}},
+            )
+            master = MasterData(script_id=script_id)
+            master._store_baseline = 0
+            return master
+
+        data: Dict[str, Any] = {"script_id": script_id}
+        if path.exists():
+            with path.open("r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        entries = self._replay_journal(journal_path, data)
+        master = MasterData.model_validate(data)
+        master._store_baseline = entries
+        return master
+
+    def _replay_journal(self, journal_path: pathlib.Path, data: Dict[str, Any]) -> int:
+        if not journal_path.exists():
+            return 0
+        entries = 0
+        users = data.setdefault("users", {})
+        with journal_path.open("r", encoding="utf-8") as handle:
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    delta = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-append; earlier deltas still apply.
+                    logger.warning(
+                        "masterdata.journal_corrupt_line",
+                        extra={"extra_data": {"path": str(journal_path), "line": line_number}},
+                    )
+                    continue
+                users.update(delta.get("users", {}))
+                for username in delta.get("removed_users", []):
+                    users.pop(username, None)
+                data.update(delta.get("fields", {}))
+                self._replay_appends(delta, data)
+                entries += 1
+        return entries
+
+    @staticmethod
+    def _replay_appends(delta: Dict[str, Any], data: Dict[str, Any]) -> None:
+        added = delta.get("processed_added", [])
+        evicted = delta.get("processed_evicted", 0)
+        if added or evicted:
+            ids = list(data.get("processed_transactions") or [])
+            times = list(data.get("processed_recorded_at") or [])
+            if len(times) != len(ids):
+                times = [0] * len(ids)  # 0 falls back to the load time
+            # IDs only ever append at the back and get evicted from the front.
+            ids.extend(txn_id for txn_id, _ in added)
+            times.extend(recorded_at for _, recorded_at in added)
+            data["processed_transactions"] = ids[evicted:]
+            data["processed_recorded_at"] = times[evicted:]
+        reviews = delta.get("manual_review_added")
+        if reviews:
+            data["manual_review"] = list(data.get("manual_review") or []) + reviews
+
+    def save(self, master: MasterData) -> None:
+        path = self._path(master.script_id)
+        entries = master._store_baseline if isinstance(master._store_baseline, int) else None
+        if entries is not None and not master.is_dirty:
+            logger.debug(
+                "masterdata.save_skipped",
+                extra={"extra_data": {"scriptId": master.script_id, "reason": "unchanged"}},
+            )
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if entries is None or not path.exists() or entries + 1 >= self._compact_after:
+            self._write_snapshot(master)
+            master._store_baseline = 0
+        else:
+            self._append_delta(master)
+            master._store_baseline = entries + 1
+        master.clear_dirty()
+        logger.debug(
+            "masterdata.saved",
+            extra={"extra_data": {"scriptId": master.script_id, "path": str(path)}},
+        )
+
+    def _write_snapshot(self, master: MasterData) -> None:
+        path = self._path(master.script_id)
+        payload = master.model_dump(mode="json")
+        tmp_path = path.with_suffix(".json.tmp")
+        with tmp_path.open("w", encoding="utf-8") as handle:
+            json.dump(payload, handle, indent=2)
+        os.replace(tmp_path, path)
+        # Journal entries are idempotent, so a crash before this unlink is harmless.
+        self._journal_path(master.script_id).unlink(missing_ok=True)
+
+    def _append_delta(self, master: MasterData) -> None:
+        dirty_users, removed_users, dirty_fields = master.dirty_state()
+        delta: Dict[str, Any] = {}
+        if dirty_users:
+            delta["users"] = {
+                username: master.users[username].model_dump(mode="json")
+                for username in dirty_users
+                if username in master.users
+            }
+        if removed_users:
+            delta["removed_users"] = sorted(removed_users)
+        if "processed_transactions" in dirty_fields:
+            dirty_fields.add("processed_recorded_at")
+        if dirty_fields:
+            delta["fields"] = master.model_dump(mode="json", include=dirty_fields)
+        # A field replaced wholesale is already in "fields" with its appends included.
+        processed_added, processed_evicted, reviews_added = master.appended_state()
+        if "processed_transactions" not in dirty_fields:
+            if processed_added:
+                delta["processed_added"] = [list(item) for item in processed_added]
+            if processed_evicted:
+                delta["processed_evicted"] = processed_evicted
+        if reviews_added and "manual_review" not in dirty_fields:
+            delta["manual_review_added"] = [
+                entry.model_dump(mode="json") for entry in reviews_added
+            ]
+        with self._journal_path(master.script_id).open("a", encoding="utf-8") as handle:
+            handle.write(json.dumps(delta, separators=(",", ":")) + "\n")
+
+
+class GrantIntent(BaseModel):
+    """A TradingView grant about to be sent, and the local state it will produce."""
+
+    id: str
+    script_id: str
+    username: str
+    # Other usernames in the coalesced group; they are folded into ``username``.
+    replaced_usernames: List[str] = Field(default_factory=list)
+    transaction_ids: List[str]
+    payload: Dict
+    # History holds only the entries this grant adds.
+    record: AccessRecord
+
+
+def apply_grant(master: MasterData, intent: GrantIntent, processed_at: datetime) -> None:
+    """Store a confirmed grant on ``master`` exactly as the sync loop would."""
+    existing = master.users.get(intent.username)
+    if existing is None:
+        existing = next(
+            (master.users[name] for name in intent.replaced_usernames if name in master.users),
+            None,
+        )
+    history = list(existing.history) if existing else []
+    history.extend(
+        item.model_copy(update={"processed_at": processed_at}) for item in intent.record.history
+    )
+    for username in intent.replaced_usernames:
+        if username != intent.username:
+            master.remove_user(username)
+    master.record_user(intent.username, intent.record.model_copy(update={"history": history}))
+    for transaction_id in intent.transaction_ids:
+        master.register_processed(transaction_id)
+
+
+class GrantLog:
+    """Append-only write-ahead log of TradingView grants (``grants.wal.jsonl``).
+
+    The sync loop appends ``intent`` before each grant and ``done`` (or ``abort``)
+    after it. Each line is a small JSON object, so durability costs one append and,
+    for intents, one fsync shared with every intent written in the meantime (group
+    commit). Once the masters are saved the log is truncated at a checkpoint; after
+    a crash, :meth:`replay` restores confirmed grants and hands back the ones whose
+    outcome is unknown.
+
+    Every process using a masterdata_dir shares the one file, so with ``lock_path``
+    set, appends, replays and checkpoints raise unless the caller holds that
+    :class:`app.locks.MasterDataLock`. Otherwise one process could truncate another's
+    in-flight intents, or replay and re-send grants that are still running.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        fsync: bool = True,
+        lock_path: Optional[pathlib.Path] = None,
+    ):
+        self._path = path
+        self._fsync = fsync
+        self._lock_path = lock_path
+        self._handle = None
+        self._counter = itertools.count(1)
+        self._written = 0
+        self._synced = 0
+        self._sync_lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def path(self) -> pathlib.Path:
+        return self._path
+
+    def _require_lock(self) -> None:
+        if self._lock_path is not None and not lock_held(self._lock_path):
+            raise RuntimeError(f"{self._path} used without holding {self._lock_path}")
+
+    def _append(self, entry: Dict[str, Any]) -> int:
+        self._require_lock()
+        if self._handle is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._handle = self._path.open("a", encoding="utf-8")
+        self._handle.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._handle.flush()
+        self._written += 1
+        return self._written
+
+    async def intent(self, intent: GrantIntent) -> None:
+        """Append ``intent`` and return once it is on disk."""
+        position = self._append({"op": "intent", **intent.model_dump(mode="json")})
+        if not self._fsync:
+            return
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            # The log outlives event loops (one per one-off sync); locks cannot.
+            self._sync_lock = asyncio.Lock()
+            self._lock_loop = loop
+        async with self._sync_lock:
+            # Whoever fsyncs first covers every line appended before it started.
+            if self._synced >= position:
+                return
+            target = self._written
+            await asyncio.to_thread(os.fsync, self._handle.fileno())
+            self._synced = target
+
+    def new_intent_id(self) -> str:
+        return f"{time.time_ns():x}-{next(self._counter)}"
+
+    def done(self, intent_id: str) -> None:
+        # Not fsynced: losing it only means the idempotent grant is re-sent on recovery.
+        self._append({"op": "done", "id": intent_id, "at": _utcnow().isoformat()})
+
+    def abort(self, intent_id: str) -> None:
+        """The grant failed and was handed to the retry queue; replay ignores it."""
+        self._append({"op": "abort", "id": intent_id})
+
+    def replay(self, masters: Dict[str, MasterData]) -> Tuple[int, List[GrantIntent]]:
+        """Apply confirmed grants missing from ``masters``.
+
+        Returns how many were applied and the intents whose outcome is unknown.
+
+        Intents whose transactions are all recorded as processed already reached the
+        saved masters and are skipped, so replaying twice is harmless.
+        """
+        self._require_lock()
+        if not self._path.exists():
+            return 0, []
+        intents: "OrderedDict[str, GrantIntent]" = OrderedDict()
+        outcomes: Dict[str, Dict[str, Any]] = {}
+        with self._path.open("r", encoding="utf-8") as handle:
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                    if entry["op"] == "intent":
+                        entry.pop("op")
+                        intent = GrantIntent.model_validate(entry)
+                        intents[intent.id] = intent
+                    else:
+                        outcomes[entry["id"]] = entry
+                except (ValueError, KeyError):
+                    # A torn final line from a crash mid-append.
+                    logger.warning(
+                        "grant_log.corrupt_line",
+                        extra={"extra_data": {"path": str(self._path), "line": line_number}},
+                    )
+
+        unconfirmed: List[GrantIntent] = []
+        recovered = 0
+        for intent in intents.values():
+            master = masters.get(intent.script_id)
+            if master is None:
+                logger.warning(
+                    "grant_log.unknown_script",
+                    extra={"extra_data": {"scriptId": intent.script_id, "intentId": intent.id}},
+                )
+                continue
+            if all(master.is_processed(txn_id) for txn_id in intent.transaction_ids):
+                continue
+            outcome = outcomes.get(intent.id)
+            if outcome is None:
+                unconfirmed.append(intent)
+            elif outcome["op"] == "done":
+                apply_grant(master, intent, datetime.fromisoformat(outcome["at"]))
+                recovered += 1
+        if recovered or unconfirmed:
+            logger.warning(
+                "grant_log.replayed",
+                extra={"extra_data": {"recovered": recovered, "unconfirmed": len(unconfirmed)}},
+            )
+        return recovered, unconfirmed
+
+    def checkpoint(self) -> None:
+        """Drop every entry; call only after the masters they describe are saved."""
+        self._require_lock()
+        if self._handle is None:
+            if not self._path.exists():
+                return
+            self._handle = self._path.open("a", encoding="utf-8")
+        self._handle.truncate(0)
+        self._handle.flush()
+        if self._fsync:
+            os.fsync(self._handle.fileno())
+        self._written = self._synced = 0
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+_GRANT_LOGS: Dict[str, GrantLog] = {}
+
+
+def get_grant_log(settings: Settings) -> Optional[GrantLog]:
+    if not settings.storage.grant_log:
+        return None
+    path = (settings.masterdata_path / "grants.wal.jsonl").resolve()
+    grant_log = _GRANT_LOGS.get(str(path))
+    if grant_log is None:
+        grant_log = GrantLog(
+            path, settings.storage.grant_log_fsync, masterdata_lock_path(settings)
         )
-        return MasterData(script_id=script_id)
+        _GRANT_LOGS[str(path)] = grant_log
+    return grant_log
+
+
+_STORES: Dict[Tuple[str, str], MasterStore] = {}
 
-    with path.open("r", encoding="utf-8") as handle:
-        data = json.load(handle)
-    master = MasterData.model_validate(data)
+
+def get_master_store(settings: Settings) -> MasterStore:
+    backend = settings.storage.backend
+    if backend == "sqlite":
+        location = settings.sqlite_path
+    else:
+        location = settings.masterdata_path
+    key = (backend, str(location.resolve()))
+    store = _STORES.get(key)
+    if store is None:
+        if backend == "sqlite":
+            from .sqlite_store import SqliteMasterStore
+
+            store = SqliteMasterStore(location)
+        else:
+            store = JsonMasterStore(location, settings.storage.journal_compact_entries)
+        _STORES[key] = store
+    return store
+
+
+def load_master(settings: Settings, script_id: str) -> MasterData:
+    started = time.perf_counter()
+    master = get_master_store(settings).load(script_id)
+    master.configure_dedupe(settings.dedupe)
+    metrics.LOCAL_LATENCY.observe(time.perf_counter() - started, metrics.LOAD_MASTER)
+    metrics.record_queue_depths((master,))
     return master
 
 
 def save_master(settings: Settings, master: MasterData) -> None:
-    path = _master_path(settings, master.script_id)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    payload = master.model_dump(mode="json")
-    with path.open("w", encoding="utf-8") as handle:
-        json.dump(payload, handle, indent=2)
-    logger.debug(
-        "masterdata.saved",
-        extra={"extra_data": {"scriptId": master.script_id, "path": str(path)}},
-    )
+    started = time.perf_counter()
+    get_master_store(settings).save(master)
+    metrics.LOCAL_LATENCY.observe(time.perf_counter() - started, metrics.SAVE_MASTER)
+    metrics.record_queue_depths((master,))
+
+
+def save_masters(settings: Settings, masters: Iterable[MasterData]) -> None:
+    """Persist several masters; SQLite writes them in a single transaction."""
+    masters = list(masters)
+    started = time.perf_counter()
+    get_master_store(settings).save_many(masters)
+    metrics.LOCAL_LATENCY.observe(time.perf_counter() - started, metrics.SAVE_MASTER)
+    metrics.record_queue_depths(masters)
 
 
 def bootstrap_from_tradingview(
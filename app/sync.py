@@ -1,24 +1,40 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import pathlib
+from collections import defaultdict
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 
+from . import metrics
 from .config import Settings, get_settings
-from .io import ApiError, TradingViewClient, WordPressClient
-from .logic import NormalizedTransaction, derive_action, normalize_transactions
+from .io import ApiError, CircuitOpenError, TradingViewClient, WordPressClient
+from .locks import masterdata_lock
+from .logic import (
+    Action,
+    NormalizedTransaction,
+    _parse_datetime,
+    derive_action,
+    normalize_transactions,
+)
+from .retry import retry_delay
 from .storage import (
     AccessRecord,
     GrantHistoryEntry,
+    GrantIntent,
+    GrantLog,
     ManualReviewEntry,
     MasterData,
     RetryEntry,
+    apply_grant,
     bootstrap_from_tradingview,
+    get_grant_log,
     load_master,
-    save_master,
+    save_masters,
 )
-from .email import send_email
+from .email import get_outbox, send_email
+from .fuzzy import UsernameIndex, tv_export_usernames
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +79,29 @@ def _render_invalid_username_email(
     return _INVALID_TEMPLATE_CACHE.format(username=username, suggestions=suggestion_block)
 
 
+def _username_index(settings: Settings, masters: Iterable[MasterData]) -> UsernameIndex:
+    """Known TradingView usernames: every masterData user plus the optional export."""
+    index = UsernameIndex()
+    for master in masters:
+        index.add_all(record.username for record in master.users.values())
+    if settings.paths.tv_users_csv:
+        index.add_all(tv_export_usernames(pathlib.Path(settings.paths.tv_users_csv)))
+    return index
+
+
+def _merge_suggestions(
+    local: List[Dict[str, Any]], remote: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    merged: List[Dict[str, Any]] = []
+    seen = set()
+    for suggestion in [*local, *remote]:
+        username = str(suggestion.get("username") or "")
+        if username and username.lower() not in seen:
+            seen.add(username.lower())
+            merged.append(suggestion)
+    return merged
+
+
 async def _send_invalid_username_email(
     settings: Settings,
     txn: NormalizedTransaction,
@@ -82,10 +121,16 @@ async def _send_invalid_username_email(
         return
 
     html = _render_invalid_username_email(txn.username, suggestions)
+    subject = "Action needed: update your TradingView username"
+    outbox = get_outbox(settings)
+    if outbox is not None:
+        # Written to disk here and sent by the outbox worker, so SMTP never stalls the sync.
+        outbox.enqueue(txn.email, subject, html, bcc=settings.email.bcc or [])
+        return
     try:
         await send_email(
             to_email=txn.email,
-            subject="Action needed: update your TradingView username",
+            subject=subject,
             html_body=html,
             from_email=settings.email.from_email,
             smtp_server=settings.email.smtp_server,
@@ -107,6 +152,60 @@ async def _send_invalid_username_email(
         )
 
 
+def _access_record(
+    txn: NormalizedTransaction,
+    action: Action,
+    username: str,
+    history: List[GrantHistoryEntry],
+) -> AccessRecord:
+    return AccessRecord(
+        wp_user_id=txn.wp_user_id,
+        username=username,
+        wp_username=txn.wp_username,
+        email=txn.email,
+        product_id=txn.product_id,
+        script_id=txn.script_id,
+        expiry=action.expires_at,
+        last_transaction_id=txn.transaction_id,
+        last_transaction_at=txn.created_at,
+        status="active",
+        history=history,
+    )
+
+
+def _pending_history(
+    pending: List[Tuple[NormalizedTransaction, Action]], processed_at: datetime
+) -> List[GrantHistoryEntry]:
+    txn = pending[-1][0]
+    note = f"coalesced_grant:{txn.transaction_id}" if len(pending) > 1 else None
+    return [
+        GrantHistoryEntry(
+            transaction_id=item.transaction_id,
+            action=item_action.type,
+            expires_at=item_action.expires_at,
+            processed_at=processed_at,
+            note=note,
+        )
+        for item, item_action in pending
+    ]
+
+
+def _derive_group(
+    pending: List[Tuple[NormalizedTransaction, Action]],
+    existing: Optional[AccessRecord],
+    username: str,
+) -> List[Tuple[NormalizedTransaction, Action]]:
+    """Derive each transaction's action again, in order, starting from ``existing``."""
+    derived: List[Tuple[NormalizedTransaction, Action]] = []
+    simulated = existing
+    for txn, _ in pending:
+        action = derive_action(txn, simulated)
+        derived.append((txn, action))
+        if action.type not in ("skip", "manual_review") and action.expires_at:
+            simulated = _access_record(txn, action, username, [])
+    return derived
+
+
 def _grant_payload(
     txn: NormalizedTransaction, expiry: datetime, username: str
 ) -> Dict:
@@ -122,11 +221,395 @@ def _grant_payload(
     return payload
 
 
-async def run_sync(settings: Optional[Settings] = None) -> Dict:
+def _lane_key(txn: NormalizedTransaction) -> Tuple[str, str]:
+    return txn.script_id, txn.username.lower()
+
+
+_PlannedGroup = List[Tuple[int, NormalizedTransaction]]
+
+
+def _plan_lanes(
+    transactions: List[NormalizedTransaction], coalesce: bool, start: int = 1
+) -> List[List[_PlannedGroup]]:
+    """Group transactions into per-(script_id, username) lanes of grant groups.
+
+    With ``coalesce`` each lane is a single group ordered by ``created_at`` so the
+    whole burst folds into one TradingView grant; otherwise every transaction is
+    its own group and keeps its fetch order.
+    """
+    lanes: Dict[Tuple[str, str], _PlannedGroup] = {}
+    for index, txn in enumerate(transactions, start=start):
+        lanes.setdefault(_lane_key(txn), []).append((index, txn))
+    planned: List[List[_PlannedGroup]] = []
+    for items in lanes.values():
+        if coalesce:
+            planned.append([sorted(items, key=lambda item: item[1].created_at)])
+        else:
+            planned.append([[item] for item in items])
+    return planned
+
+
+async def _process_in_lanes(
+    lanes: List[List[_PlannedGroup]],
+    concurrency: int,
+    handler: Callable[[_PlannedGroup], Awaitable[None]],
+) -> None:
+    """Run ``handler`` over planned groups with at most ``concurrency`` lanes in flight.
+
+    Groups within a lane run strictly in order so stacking in ``derive_action`` sees
+    the previous grant; distinct lanes proceed in parallel.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for lane in lanes:
+        queue.put_nowait(lane)
+
+    async def worker() -> None:
+        while True:
+            try:
+                lane = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            for group in lane:
+                await handler(group)
+
+    workers = [
+        asyncio.ensure_future(worker()) for _ in range(min(concurrency, len(lanes)))
+    ]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        raise
+
+
+_FetchGroup = Tuple[Optional[datetime], List[str]]
+
+
+def _plan_fetches(settings: Settings, masters: Dict[str, MasterData]) -> List[_FetchGroup]:
+    """Group products by their script's watermark, one WordPress fetch per group.
+
+    Without ``wordpress.product_param`` the server cannot filter by product, so a
+    single fetch from the oldest watermark is planned. Scripts with no watermark yet
+    use that same oldest watermark, as before.
+    """
+    known = [master.last_processed_at for master in masters.values() if master.last_processed_at]
+    fallback = min(known) if known else None
+    if not settings.wordpress.product_param:
+        return [(fallback, [])]
+    groups: Dict[Optional[datetime], List[str]] = defaultdict(list)
+    for product_id, product in settings.products.items():
+        master = masters.get(product.script_id)
+        watermark = master.last_processed_at if master else None
+        groups[watermark or fallback].append(str(product_id))
+    return sorted(groups.items(), key=lambda item: (item[0] is not None, item[0]))
+
+
+def _product_watermarks(
+    settings: Settings, masters: Dict[str, MasterData]
+) -> Dict[str, datetime]:
+    watermarks: Dict[str, datetime] = {}
+    for product_id, product in settings.products.items():
+        master = masters.get(product.script_id)
+        if master is not None and master.last_processed_at is not None:
+            watermarks[str(product_id)] = master.last_processed_at
+    return watermarks
+
+
+def _drop_stale(
+    rows: List[Dict], watermarks: Dict[str, datetime]
+) -> Tuple[List[Dict], int]:
+    """Drop rows created before their own script's watermark.
+
+    A shared fetch starts at the oldest watermark, so scripts that are further
+    ahead would otherwise re-normalize rows they have already seen. Rows without
+    a parseable ``created_at`` are kept for normalization to reject and log.
+    """
+    if not watermarks:
+        return rows, 0
+    kept: List[Dict] = []
+    for row in rows:
+        watermark = watermarks.get(str(row.get("product_id")))
+        created = row.get("created_at")
+        if watermark is not None and isinstance(created, str):
+            try:
+                if _parse_datetime(created) < watermark:
+                    continue
+            except ValueError:
+                pass
+        kept.append(row)
+    return kept, len(rows) - len(kept)
+
+
+async def _only_products(
+    items: AsyncIterator[Dict], product_ids: List[str]
+) -> AsyncIterator[Dict]:
+    """Pass through rows for ``product_ids`` in case the server ignored the filter."""
+    wanted = set(product_ids)
+    async for item in items:
+        if not wanted or str(item.get("product_id")) in wanted:
+            yield item
+
+
+async def _merge_batches(sources: List[AsyncIterator[List[Dict]]]) -> AsyncIterator[List[Dict]]:
+    """Yield batches from several iterators as soon as any of them produces one."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=len(sources))
+    finished = object()
+
+    async def pump(source: AsyncIterator[List[Dict]]) -> None:
+        try:
+            async for batch in source:
+                await queue.put(batch)
+            await queue.put(finished)
+        except Exception as exc:
+            await queue.put(exc)
+        finally:
+            await source.aclose()  # type: ignore[attr-defined]
+
+    pumps = [asyncio.ensure_future(pump(source)) for source in sources]
+    remaining = len(pumps)
+    try:
+        while remaining:
+            batch = await queue.get()
+            if batch is finished:
+                remaining -= 1
+                continue
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+    finally:
+        for task in pumps:
+            task.cancel()
+        await asyncio.gather(*pumps, return_exceptions=True)
+
+
+async def _prefetch_batches(
+    items: AsyncIterator[Dict], size: int, depth: int = 2
+) -> AsyncIterator[List[Dict]]:
+    """Re-chunk ``items`` into lists of ``size``, reading up to ``depth`` batches ahead."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=depth)
+    finished = object()
+
+    async def produce() -> None:
+        try:
+            batch: List[Dict] = []
+            async for item in items:
+                batch.append(item)
+                if len(batch) >= size:
+                    await queue.put(batch)
+                    batch = []
+            if batch:
+                await queue.put(batch)
+            await queue.put(finished)
+        except Exception as exc:
+            await queue.put(exc)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            batch = await queue.get()
+            if batch is finished:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+
+class SyncProgress:
+    """Live view of a running sync for callers that poll it (see ``app.jobs``).
+
+    ``summary`` is the run's summary dict itself, so it fills in as the run goes.
+    ``total`` grows as WordPress batches arrive; ``processed`` counts transactions
+    whose handling has finished.
+    """
+
+    def __init__(self) -> None:
+        self.stage = "pending"
+        self.total = 0
+        self.processed = 0
+        self.summary: Dict[str, Any] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "processed": self.processed,
+            "total": self.total,
+            "summary": dict(self.summary),
+        }
+
+
+async def _recover_grants(
+    settings: Settings,
+    tv_client: TradingViewClient,
+    grant_log: GrantLog,
+    masters: Dict[str, MasterData],
+    summary: Dict,
+) -> bool:
+    """Replay the grant log from an interrupted run into ``masters``.
+
+    Confirmed grants are applied directly. Grants whose outcome is unknown are sent
+    again (the payload carries an absolute expiry, so a repeat is harmless); if that
+    fails they go to the retry queue with their transactions marked processed, so
+    this run does not stack them a second time. Returns ``True`` when the log must
+    be kept because a dry run left unconfirmed grants unresolved.
+    """
+    recovered, unconfirmed = grant_log.replay(masters)
+    summary["grants_recovered"] = recovered
+    summary["grants_resent"] = 0
+    summary["grants_requeued"] = 0
+    if not unconfirmed:
+        return False
+    if settings.scheduler.dry_run:
+        logger.info(
+            "dry_run.grant_recovery",
+            extra={"extra_data": {"unconfirmed": [intent.id for intent in unconfirmed]}},
+        )
+        return True
+
+    for intent in unconfirmed:
+        master = masters[intent.script_id]
+        if all(master.is_processed(txn_id) for txn_id in intent.transaction_ids):
+            continue
+        try:
+            await tv_client.grant_access(intent.payload)
+        except ApiError as exc:
+            failed_at = _utcnow()
+            master.record_retry(
+                RetryEntry(
+                    transaction_id=intent.transaction_ids[-1],
+                    payload=intent.payload,
+                    error_message=f"unconfirmed grant: {exc}",
+                    attempts=0,
+                    next_attempt_at=failed_at + retry_delay(settings.retry, 0),
+                    transaction_ids=intent.transaction_ids,
+                    record=intent.record,
+                )
+            )
+            for txn_id in intent.transaction_ids:
+                master.register_processed(txn_id)
+            summary["grants_requeued"] += 1
+            continue
+        grant_log.done(intent.id)
+        apply_grant(master, intent, _utcnow())
+        summary["grants_resent"] += 1
+        logger.info(
+            "grant_log.resent",
+            extra={
+                "extra_data": {
+                    "scriptId": intent.script_id,
+                    "username": intent.username,
+                    "transactionIds": intent.transaction_ids,
+                }
+            },
+        )
+    return False
+
+
+async def run_sync(
+    settings: Optional[Settings] = None,
+    wp_client: Optional[WordPressClient] = None,
+    tv_client: Optional[TradingViewClient] = None,
+    progress: Optional[SyncProgress] = None,
+) -> Dict:
+    """Run one sync pass.
+
+    Callers that sync repeatedly (the scheduler, batch tools) should pass long-lived
+    clients so pooled connections survive between runs; otherwise clients are created
+    here and closed when the run finishes. ``progress`` is updated in place as the
+    run moves through its stages. The whole pass holds the cross-process masterData
+    lock, so it never overlaps another process's sync, retry drain or revocation.
+    """
     settings = settings or get_settings()
-    wp_client = WordPressClient(settings)
-    tv_client = TradingViewClient(settings)
+    owned_clients = []
+    if wp_client is None:
+        wp_client = WordPressClient(settings)
+        owned_clients.append(wp_client)
+    if tv_client is None:
+        tv_client = TradingViewClient(settings)
+        owned_clients.append(tv_client)
+    try:
+        async with masterdata_lock(settings):
+            summary = await _run_sync(settings, wp_client, tv_client, progress or SyncProgress())
+    except Exception:
+        metrics.SYNC_RUNS.inc(1, ("failed",))
+        raise
+    finally:
+        for client in owned_clients:
+            await client.aclose()
+    metrics.SYNC_RUNS.inc(1, ("succeeded",))
+    metrics.record_sync_summary(summary)
+    await _send_queued_email(settings, summary)
+    return summary
+
+
+async def _send_queued_email(settings: Settings, summary: Dict) -> None:
+    """Send due outbox mail for runs without a background outbox worker.
+
+    The API and the scheduler run a worker, so their syncs only enqueue. One-off runs
+    (CLI scripts) send here, after the masterData lock is released, so SMTP latency
+    never holds up another process's sync.
+    """
+    outbox = get_outbox(settings)
+    if outbox is None or outbox.worker_running:
+        return
+    sent = await outbox.send_due()
+    summary["emails_sent"] = sent["sent"]
+    summary["emails_queued"] = outbox.pending_count()
+
+
+async def process_transactions(
+    settings: Settings,
+    raw_transactions: List[Dict],
+    tv_client: Optional[TradingViewClient] = None,
+) -> Dict:
+    """Run already-received WordPress rows (e.g. from a webhook) through the sync path.
+
+    Rows are normalized and granted exactly as a poll would; transactions already
+    recorded as processed are skipped, so a later poll that sees them again is a no-op.
+    """
+    owned_client = tv_client is None
+    if tv_client is None:
+        tv_client = TradingViewClient(settings)
+    try:
+        async with masterdata_lock(settings):
+            summary = await _run_sync(
+                settings, None, tv_client, SyncProgress(), transactions=raw_transactions
+            )
+    finally:
+        if owned_client:
+            await tv_client.aclose()
+    await _send_queued_email(settings, summary)
+    return summary
+
+
+async def _run_sync(
+    settings: Settings,
+    wp_client: Optional[WordPressClient],
+    tv_client: TradingViewClient,
+    progress: SyncProgress,
+    transactions: Optional[List[Dict]] = None,
+) -> Dict:
+    """Shared body of :func:`run_sync` and :func:`process_transactions`.
+
+    With ``transactions`` the rows are processed as given instead of polling
+    WordPress, and the polling watermarks are left alone.
+    """
+    progress.stage = "loading_masters"
     dry_run = settings.scheduler.dry_run
+    retry_config = settings.retry
+    # None keeps TradingViewClient's in-line backoff; 0 sends once and queues failures.
+    grant_retries = 0 if retry_config.defer_in_sync else None
+    cache = tv_client.validation_cache
+    cache_hits_before = cache.hits if cache else 0
+    cache_misses_before = cache.misses if cache else 0
+    limiter = tv_client.rate_limiter
+    throttled_before = limiter.throttled if limiter else 0
+    if limiter is not None:
+        limiter.reset_peak()
 
     async def load_or_bootstrap(script_id: str) -> MasterData:
         master = load_master(settings, script_id)
@@ -159,10 +642,10 @@ async def run_sync(settings: Optional[Settings] = None) -> Dict:
     for script_id in script_ids:
         master_cache[script_id] = await load_or_bootstrap(script_id)
 
-    since_candidates = [
-        master.last_processed_at for master in master_cache.values() if master.last_processed_at
-    ]
+    fetch_plan = _plan_fetches(settings, master_cache)
+    since_candidates = [since for since, _ in fetch_plan if since is not None]
     since_timestamp = min(since_candidates) if since_candidates else None
+    stale_watermarks = _product_watermarks(settings, master_cache) if transactions is None else {}
 
     async def execute_tv_action(action_type: str, payload: Dict, summary: Dict) -> None:
         if dry_run:
@@ -174,14 +657,11 @@ async def run_sync(settings: Optional[Settings] = None) -> Dict:
             return
         # Use grant_access for all actions since the API only has a grant endpoint
         # The grant endpoint can handle both new grants and updates/extensions
-        await tv_client.grant_access(payload)
-
-    raw_transactions = await wp_client.fetch_transactions(since=since_timestamp)
-    normalized = normalize_transactions(raw_transactions, settings)
+        await tv_client.grant_access(payload, retries=grant_retries)
 
     summary = {
-        "transactions_fetched": len(raw_transactions),
-        "transactions_considered": len(normalized),
+        "transactions_fetched": 0,
+        "transactions_considered": 0,
         "processed": 0,
         "stacked": 0,
         "skipped": 0,
@@ -189,9 +669,25 @@ async def run_sync(settings: Optional[Settings] = None) -> Dict:
         "failed": 0,
         "dry_run_skipped": 0,
         "since": since_timestamp.isoformat() if since_timestamp else None,
+        "fetch_groups": len(fetch_plan) if transactions is None else 0,
+        "stale_skipped": 0,
         "dry_run_calls": 0,
         "validation_failed": 0,
+        "grants_coalesced": 0,
+        "retries_queued": 0,
+        "circuit_deferred": 0,
+        "local_suggestions": 0,
     }
+    progress.summary = summary
+
+    grant_log = get_grant_log(settings)
+    # Unconfirmed grants from an interrupted run stay in the log until they are resolved.
+    keep_grant_log = False
+    if grant_log is not None:
+        progress.stage = "recovering"
+        keep_grant_log = await _recover_grants(
+            settings, tv_client, grant_log, master_cache, summary
+        )
 
     latest_seen: Dict[str, datetime] = {}
 
@@ -204,208 +700,414 @@ async def run_sync(settings: Optional[Settings] = None) -> Dict:
         master_cache[script_id] = master
         return master
 
-    total_transactions = len(normalized)
+    user_locks: Dict[Tuple[str, str], asyncio.Lock] = defaultdict(asyncio.Lock)
+    # Built on the first invalid username; most runs never need it.
+    username_index: Optional[UsernameIndex] = None
 
-    for index, txn in enumerate(normalized, start=1):
-        logger.info(separator_line)
-        logger.info(
-            f"Processing user {txn.wp_user_id} ({index}/{total_transactions})"
-        )
-        logger.info(
-            "TV username=%s email=%s product_id=%s script_id=%s ",
-            txn.username,
-            txn.email,
-            txn.product_id,
-            txn.script_id,
+    def local_suggestions(username: str) -> List[Dict[str, Any]]:
+        nonlocal username_index
+        if not settings.sync.local_suggestions:
+            return []
+        if username_index is None:
+            username_index = _username_index(settings, master_cache.values())
+        matches = username_index.nearest(
+            username,
+            limit=settings.sync.suggestion_limit,
+            max_distance=settings.sync.suggestion_max_distance,
         )
+        if matches:
+            summary["local_suggestions"] += 1
+        return [{"username": match.username, "distance": match.distance} for match in matches]
 
-        master = await get_master(txn.script_id)
+    async def process_group(group: _PlannedGroup) -> None:
+        master = await get_master(group[0][1].script_id)
 
-        current_seen = latest_seen.get(txn.script_id)
-        if current_seen is None or txn.created_at > current_seen:
-            latest_seen[txn.script_id] = txn.created_at
-
-        if txn.transaction_id in master.processed_transactions:
-            summary["skipped"] += 1
+        # Fold the group through derive_action against a simulated record so every
+        # transaction stacks on the previous one before a single grant is sent.
+        pending: List[Tuple[NormalizedTransaction, Action]] = []
+        simulated: Optional[AccessRecord] = None
+        for index, txn in group:
+            logger.info(separator_line)
             logger.info(
-                "Skipping transaction %s (already processed)",
-                txn.transaction_id,
+                f"Processing user {txn.wp_user_id} ({index}/{summary['transactions_considered']})"
             )
-            continue
-
-        existing = master.users.get(txn.username)
-        action = derive_action(txn, existing)
-
-        if action.type == "skip":
-            summary["skipped"] += 1
-            master.register_processed(txn.transaction_id)
             logger.info(
-                "Transaction %s skipped (%s)",
-                txn.transaction_id,
-                action.reason or "reason not specified",
+                "TV username=%s email=%s product_id=%s script_id=%s ",
+                txn.username,
+                txn.email,
+                txn.product_id,
+                txn.script_id,
             )
-            continue
 
-        if action.type == "manual_review":
-            summary["manual_review"] += 1
-            master.record_manual_review(
-                ManualReviewEntry(
-                    transaction_id=txn.transaction_id,
-                    reason=action.reason or "manual_review_required",
+            current_seen = latest_seen.get(txn.script_id)
+            if current_seen is None or txn.created_at > current_seen:
+                latest_seen[txn.script_id] = txn.created_at
+
+            if master.is_processed(txn.transaction_id):
+                summary["skipped"] += 1
+                logger.info(
+                    "Skipping transaction %s (already processed)",
+                    txn.transaction_id,
                 )
-            )
-            master.register_processed(txn.transaction_id)
-            logger.warning(
-                "Transaction %s moved to manual review (%s)",
-                txn.transaction_id,
-                action.reason or "manual review",
-            )
-            continue
+                continue
 
-        if not action.expires_at:
-            summary["failed"] += 1
-            logger.error(
-                "Transaction %s has no expiry; skipping", txn.transaction_id
+            # Planned against the name on the transaction; grant_pending derives the
+            # group again for the name TradingView confirms before granting.
+            existing = simulated if pending else master.users.get(txn.username)
+            action = derive_action(txn, existing)
+
+            if action.type == "skip":
+                summary["skipped"] += 1
+                master.register_processed(txn.transaction_id)
+                logger.info(
+                    "Transaction %s skipped (%s)",
+                    txn.transaction_id,
+                    action.reason or "reason not specified",
+                )
+                continue
+
+            if action.type == "manual_review":
+                summary["manual_review"] += 1
+                master.record_manual_review(
+                    ManualReviewEntry(
+                        transaction_id=txn.transaction_id,
+                        reason=action.reason or "manual_review_required",
+                    )
+                )
+                master.register_processed(txn.transaction_id)
+                logger.warning(
+                    "Transaction %s moved to manual review (%s)",
+                    txn.transaction_id,
+                    action.reason or "manual review",
+                )
+                continue
+
+            if not action.expires_at:
+                summary["failed"] += 1
+                logger.error(
+                    "Transaction %s has no expiry; skipping", txn.transaction_id
+                )
+                continue
+
+            pending.append((txn, action))
+            simulated = _access_record(txn, action, txn.username, [])
+
+        if pending:
+            await grant_pending(master, pending)
+
+    def queue_retry(
+        master: MasterData,
+        pending: List[Tuple[NormalizedTransaction, Action]],
+        username: str,
+        error_message: str,
+    ) -> None:
+        txn, action = pending[-1]
+        first_txn, first_action = pending[0]
+        base = master.users.get(username)
+        if (
+            first_action.type == "stack_existing"
+            and base is not None
+            and base.expiry > first_txn.created_at
+        ):
+            access_from = base.expiry
+        else:
+            access_from = first_txn.created_at
+        failed_at = _utcnow()
+        master.record_retry(
+            RetryEntry(
+                transaction_id=txn.transaction_id,
+                payload=_grant_payload(txn, action.expires_at, username),
+                error_message=error_message,
+                attempts=0,
+                next_attempt_at=failed_at + retry_delay(retry_config, 0),
+                transaction_ids=[item.transaction_id for item, _ in pending],
+                record=_access_record(
+                    txn, action, username, _pending_history(pending, failed_at)
+                ),
+                access_from=access_from,
             )
-            continue
+        )
+        summary["retries_queued"] += 1
+
+    def defer_open_circuit(
+        master: MasterData,
+        pending: List[Tuple[NormalizedTransaction, Action]],
+        username: str,
+        error_message: str,
+    ) -> None:
+        """Queue the group for the retry worker without calling TradingView."""
+        txn = pending[-1][0]
+        if dry_run:
+            summary["dry_run_skipped"] += len(pending)
+            return
+        summary["circuit_deferred"] += len(pending)
+        queue_retry(master, pending, username, error_message)
+        logger.warning(
+            "TradingView circuit open; queued %s (%s) for retry",
+            username,
+            txn.transaction_id,
+        )
+
+    async def grant_pending(
+        master: MasterData, pending: List[Tuple[NormalizedTransaction, Action]]
+    ) -> None:
+        txn, action = pending[-1]
+
+        if tv_client.circuit_open("grant"):
+            defer_open_circuit(master, pending, txn.username, "grant circuit open")
+            return
 
         try:
             validation_result = await tv_client.validate_username(txn.username)
+        except CircuitOpenError as exc:
+            defer_open_circuit(master, pending, txn.username, str(exc))
+            return
         except ApiError as exc:
-            summary["validation_failed"] += 1
+            summary["validation_failed"] += len(pending)
             logger.error(
                 "Validation error for %s (%s)", txn.username, txn.transaction_id
             )
-            continue
+            return
 
         if not validation_result.get("validUser"):
-            if not any(
-                entry.transaction_id == txn.transaction_id for entry in master.manual_review
-            ):
-                await _send_invalid_username_email(
-                    settings,
-                    txn,
-                    validation_result.get("allUserSuggestions", []),
+            reviewed = {entry.transaction_id for entry in master.manual_review}
+            unreviewed = [item for item, _ in pending if item.transaction_id not in reviewed]
+            if unreviewed:
+                suggestions = _merge_suggestions(
+                    local_suggestions(txn.username),
+                    validation_result.get("allUserSuggestions") or [],
                 )
-                master.record_manual_review(
-                    ManualReviewEntry(
-                        transaction_id=txn.transaction_id,
-                        reason="invalid_username",
+                await _send_invalid_username_email(settings, unreviewed[-1], suggestions)
+                for item in unreviewed:
+                    master.record_manual_review(
+                        ManualReviewEntry(
+                            transaction_id=item.transaction_id,
+                            reason="invalid_username",
+                        )
                     )
-                )
-            summary["manual_review"] += 1
-            master.register_processed(txn.transaction_id)
+            summary["manual_review"] += len(pending)
+            for item, _ in pending:
+                master.register_processed(item.transaction_id)
             logger.warning(
                 "TradingView returned invalid user for %s (%s)",
                 txn.username,
                 txn.transaction_id,
             )
-            continue
+            return
 
         effective_username = (
             validation_result.get("verifiedUserName") or txn.username
         )
 
-        if effective_username != txn.username:
-            existing = master.users.get(effective_username) or existing
+        async with user_locks[(txn.script_id, effective_username.lower())]:
+            # Stack on the confirmed name's record as it is now: another lane whose
+            # transaction named the same user differently may have granted since the
+            # group was planned. apply_grant falls back to the same record.
+            base = master.users.get(effective_username) or next(
+                (
+                    master.users[item.username]
+                    for item, _ in pending
+                    if item.username in master.users
+                ),
+                None,
+            )
+            ready: List[Tuple[NormalizedTransaction, Action]] = []
+            for item, item_action in _derive_group(pending, base, effective_username):
+                if item_action.type == "skip":
+                    summary["skipped"] += 1
+                    master.register_processed(item.transaction_id)
+                elif item_action.type == "manual_review":
+                    summary["manual_review"] += 1
+                    master.record_manual_review(
+                        ManualReviewEntry(
+                            transaction_id=item.transaction_id,
+                            reason=item_action.reason or "manual_review_required",
+                        )
+                    )
+                    master.register_processed(item.transaction_id)
+                else:
+                    ready.append((item, item_action))
+            if not ready:
+                return
+            pending = ready
+            txn, action = pending[-1]
+            payload = _grant_payload(txn, action.expires_at, effective_username)
 
-        payload = _grant_payload(txn, action.expires_at, effective_username)
+            if dry_run:
+                logger.info(
+                    "Dry run: would call TradingView %s for %s",
+                    action.type,
+                    effective_username,
+                )
+                summary["dry_run_skipped"] += len(pending)
+                return
 
-        if dry_run:
-            logger.info(
-                "Dry run: would call TradingView %s for %s",
-                action.type,
-                effective_username,
+            intent = GrantIntent(
+                id=grant_log.new_intent_id() if grant_log is not None else "",
+                script_id=txn.script_id,
+                username=effective_username,
+                replaced_usernames=sorted(
+                    {item.username for item, _ in pending} - {effective_username}
+                ),
+                transaction_ids=[item.transaction_id for item, _ in pending],
+                payload=payload,
+                record=_access_record(
+                    txn, action, effective_username, _pending_history(pending, _utcnow())
+                ),
             )
-            summary["dry_run_skipped"] += 1
-            continue
-        else:
+            if grant_log is not None:
+                await grant_log.intent(intent)
+
             try:
                 await execute_tv_action(action.type, payload, summary)
+            except CircuitOpenError as exc:
+                if grant_log is not None:
+                    grant_log.abort(intent.id)
+                defer_open_circuit(master, pending, effective_username, str(exc))
+                return
             except ApiError as exc:
-                summary["failed"] += 1
-                master.record_retry(
-                    RetryEntry(
-                        transaction_id=txn.transaction_id,
-                        payload=payload,
-                        error_message=str(exc),
-                        attempts=0,
-                    )
-                )
+                if grant_log is not None:
+                    grant_log.abort(intent.id)
+                summary["failed"] += len(pending)
+                queue_retry(master, pending, effective_username, str(exc))
                 logger.error(
                     "TradingView call failed for %s (%s)",
                     effective_username,
                     txn.transaction_id,
                 )
-                continue
+                return
+
+            if grant_log is not None:
+                grant_log.done(intent.id)
+            processed_at = _utcnow()
+            # Still under the user lock the group was derived under, and every other
+            # writer of masterData waits on masterdata_lock, so the record it stacked
+            # on has not changed.
+            apply_grant(master, intent, processed_at)
+            for item, item_action in pending:
+                if item_action.type == "grant_new":
+                    summary["processed"] += 1
+                else:
+                    summary["stacked"] += 1
+            master.last_synced_at = processed_at
+            summary["grants_coalesced"] += len(pending) - 1
 
-        if dry_run:
             logger.info(
-                "Dry run: skipping state update for %s", effective_username
+                "Processed transaction %s action=%s expiry=%s",
+                txn.transaction_id,
+                action.type,
+                action.expires_at.isoformat(),
             )
-            summary["skipped"] += 1
-            continue
+            if len(pending) > 1:
+                logger.info(
+                    "Coalesced %d transactions into one grant for %s",
+                    len(pending),
+                    effective_username,
+                )
 
-        processed_at = _utcnow()
+    concurrency = settings.sync.concurrency
+    coalesce = settings.sync.coalesce_grants
 
-        history = list(existing.history) if existing else []
-        history.append(
-            GrantHistoryEntry(
-                transaction_id=txn.transaction_id,
-                action=action.type,
-                expires_at=action.expires_at,
-                processed_at=processed_at,
+    async def process_batch(raw_batch: List[Dict]) -> None:
+        summary["transactions_fetched"] += len(raw_batch)
+        raw_batch, stale = _drop_stale(raw_batch, stale_watermarks)
+        summary["stale_skipped"] += stale
+        normalized = normalize_transactions(raw_batch, settings)
+        start = summary["transactions_considered"] + 1
+        summary["transactions_considered"] += len(normalized)
+        progress.total += len(normalized)
+        progress.stage = "processing"
+        if concurrency <= 1 and not coalesce:
+            for index, txn in enumerate(normalized, start=start):
+                await tracked_group([(index, txn)])
+        else:
+            await _process_in_lanes(
+                _plan_lanes(normalized, coalesce, start), concurrency, tracked_group
             )
-        )
 
-        record = AccessRecord(
-            wp_user_id=txn.wp_user_id,
-            username=effective_username,
-            wp_username=txn.wp_username,
-            email=txn.email,
-            product_id=txn.product_id,
-            script_id=txn.script_id,
-            expiry=action.expires_at,
-            last_transaction_id=txn.transaction_id,
-            last_transaction_at=txn.created_at,
-            status="active",
-            history=history,
-        )
-        if effective_username != txn.username:
-            master.users.pop(txn.username, None)
-        master.record_user(effective_username, record)
-        master.register_processed(txn.transaction_id)
-        master.last_synced_at = processed_at
-
-        if action.type == "grant_new":
-            summary["processed"] += 1
-        else:
-            summary["stacked"] += 1
+    async def tracked_group(group: _PlannedGroup) -> None:
+        await process_group(group)
+        progress.processed += len(group)
 
-        logger.info(
-            "Processed transaction %s action=%s expiry=%s",
-            txn.transaction_id,
-            action.type,
-            action.expires_at.isoformat(),
+    progress.stage = "fetching"
+    if transactions is not None:
+        summary["since"] = None
+        await process_batch(transactions)
+    elif settings.wordpress.stream:
+        # Later pages keep downloading while earlier batches are being granted, and
+        # every fetch group streams at once. Groups never share a script, so their
+        # batches can interleave.
+        async for raw_batch in _merge_batches(
+            [
+                _prefetch_batches(
+                    _only_products(
+                        wp_client.iter_transactions(since=since, product_ids=product_ids),
+                        product_ids,
+                    ),
+                    settings.wordpress.stream_batch_size,
+                )
+                for since, product_ids in fetch_plan
+            ]
+        ):
+            await process_batch(raw_batch)
+    else:
+        fetched = await asyncio.gather(
+            *(
+                wp_client.fetch_transactions(since=since, product_ids=product_ids)
+                for since, product_ids in fetch_plan
+            )
+        )
+        await process_batch(
+            [
+                row
+                for rows, (_, product_ids) in zip(fetched, fetch_plan)
+                for row in rows
+                if not product_ids or str(row.get("product_id")) in product_ids
+            ]
         )
 
-    # Update last_processed_at for each script
-    for script_id, master in master_cache.items():
-        candidate = latest_seen.get(script_id)
-        if candidate and (
-            master.last_processed_at is None or candidate > master.last_processed_at
-        ):
-            master.last_processed_at = candidate
-    
-    # Update last_synced_at for all masters to indicate sync ran successfully
-    # This is important even when no transactions are processed, so health check knows sync is active
-    sync_completed_at = _utcnow()
-    for master in master_cache.values():
-        master.last_synced_at = sync_completed_at
+    polled = transactions is None
+    if polled:
+        # Pushed rows can arrive out of order, so only a poll may move the watermark;
+        # otherwise a missed earlier transaction would fall behind ``since``.
+        for script_id, master in master_cache.items():
+            candidate = latest_seen.get(script_id)
+            if candidate and (
+                master.last_processed_at is None or candidate > master.last_processed_at
+            ):
+                master.last_processed_at = candidate
+
+        # Update last_synced_at for all masters to indicate sync ran successfully
+        # This is important even when no transactions are processed, so health check knows sync is active
+        sync_completed_at = _utcnow()
+        for master in master_cache.values():
+            master.last_synced_at = sync_completed_at
+
+    progress.stage = "saving"
+    save_masters(settings, master_cache.values())
+    if grant_log is not None and not keep_grant_log:
+        grant_log.checkpoint()
+    if polled:
+        for script_id in master_cache:
+            metrics.LAST_SUCCESS.set(sync_completed_at.timestamp(), (script_id,))
+
+    if cache is not None:
+        summary["validation_cache_hits"] = cache.hits - cache_hits_before
+        summary["validation_cache_misses"] = cache.misses - cache_misses_before
+        tv_client.persist_validation_cache()
+
+    if limiter is not None:
+        stats = limiter.stats()
+        summary["tv_rate_per_second"] = stats["rate"]
+        summary["tv_queue_depth"] = stats["queue_depth"]
+        summary["tv_peak_queue_depth"] = stats["peak_queue_depth"]
+        summary["tv_throttled"] = limiter.throttled - throttled_before
 
-    for master in master_cache.values():
-        save_master(settings, master)
+    outbox = get_outbox(settings)
+    if outbox is not None:
+        summary["emails_queued"] = outbox.pending_count()
 
+    progress.stage = "completed"
     logger.info("sync.completed", extra={"extra_data": summary})
     return summary
 
@@ -0,0 +1,276 @@
+"""Latest-expiry WordPress transaction per username, shared by the offline tools.
+
+``compare_access.py`` and ``batch_grant.py`` both reduce the WordPress export to
+one transaction per user: the one with the latest expiry, or failing that the
+first one that has an email. :class:`TransactionIndex` does that reduction once,
+in a single pass, keyed by lowercase ``tradingview_username``. Secondary maps
+cover ``user_login`` and ``user_id``. Expiries are stored as proleptic ordinals
+(``date.toordinal()``, 0 for none), so picking the winner is an int comparison.
+
+Built indexes can be written to a compact binary snapshot next to the export.
+:meth:`TransactionIndex.load_or_build` reuses the snapshot while the export's
+size and mtime are unchanged, so repeated runs skip re-parsing the JSON.
+"""
+
+from __future__ import annotations
+
+import marshal
+import os
+from datetime import date, datetime, time, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .io import JsonArrayParser
+
+_SNAPSHOT_MAGIC = b"WPTXIDX"
+_SNAPSHOT_VERSION = 1
+
+MATCHED_VIA_USERNAME = "tradingview_username"
+MATCHED_VIA_LOGIN = "user_login"
+
+
+class WpTransaction(NamedTuple):
+    tv_username: str
+    user_login: str
+    user_id: str
+    email: str
+    expiry: int  # date ordinal, 0 when the transaction has no usable expiry
+    transaction_id: str
+    created_at: str
+    product_id: str
+
+    @property
+    def expiry_date(self) -> Optional[date]:
+        return date.fromordinal(self.expiry) if self.expiry else None
+
+    @property
+    def expiry_iso(self) -> Optional[str]:
+        return date.fromordinal(self.expiry).isoformat() if self.expiry else None
+
+    @property
+    def expiry_datetime(self) -> Optional[datetime]:
+        """Midnight UTC on the expiry date."""
+        if not self.expiry:
+            return None
+        return datetime.combine(date.fromordinal(self.expiry), time(), tzinfo=timezone.utc)
+
+    @property
+    def has_mismatch(self) -> bool:
+        """``user_login`` is set and differs from ``tradingview_username``."""
+        return bool(
+            self.user_login
+            and self.tv_username
+            and self.user_login.lower() != self.tv_username.lower()
+        )
+
+
+@lru_cache(maxsize=8192)
+def expiry_ordinal(expires_at: str) -> int:
+    """Date ordinal of a WordPress ``expires_at`` value, or 0 if it does not parse."""
+    if not expires_at:
+        return 0
+    try:
+        if "T" in expires_at or " " in expires_at:
+            return datetime.fromisoformat(expires_at.replace("Z", "+00:00")).toordinal()
+        return datetime.strptime(expires_at, "%Y-%m-%d").toordinal()
+    except ValueError:
+        return 0
+
+
+def _text(value: Any) -> str:
+    return value.strip() if isinstance(value, str) else ""
+
+
+def _source_stamp(path: Path) -> Tuple[int, int]:
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def iter_json_transactions(path: Path, chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """Stream transaction objects out of a JSON export without loading it whole."""
+    parser = JsonArrayParser()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+class TransactionIndex:
+    """One winning transaction per username, with ``user_login``/``user_id`` lookups."""
+
+    def __init__(self) -> None:
+        self._entries: List[tuple] = []
+        self._by_username: Dict[str, int] = {}
+        self._by_login: Dict[str, int] = {}
+        self._by_user_id: Dict[str, int] = {}
+        self.transactions_seen = 0
+
+    def __len__(self) -> int:
+        return len(self._by_username)
+
+    def __contains__(self, username: str) -> bool:
+        return username.lower() in self._by_username
+
+    @classmethod
+    def build(cls, transactions: Iterable[Dict[str, Any]]) -> "TransactionIndex":
+        index = cls()
+        for txn in transactions:
+            index.add(txn)
+        return index
+
+    def add(self, txn: Dict[str, Any]) -> None:
+        self.transactions_seen += 1
+        user_meta = txn.get("user_meta") or {}
+        tv_username = _text(user_meta.get("tradingview_username")) if isinstance(user_meta, dict) else ""
+        user_login = _text(txn.get("user_login"))
+        user_id = txn.get("user_id") or ""
+        if not user_id and isinstance(txn.get("user"), dict):
+            user_id = txn["user"].get("id") or ""
+        user_id = str(user_id) if user_id else ""
+        if not (tv_username or user_login or user_id):
+            return
+
+        email = _text(txn.get("user_email"))
+        expiry = expiry_ordinal(_text(txn.get("expires_at")))
+
+        slot = -1  # appended lazily, only once the transaction wins a key
+        for mapping, key in (
+            (self._by_username, tv_username.lower()),
+            (self._by_login, user_login.lower()),
+            (self._by_user_id, user_id),
+        ):
+            if not key:
+                continue
+            current = mapping.get(key)
+            if current is not None and not self._wins(expiry, email, self._entries[current]):
+                continue
+            if slot < 0:
+                slot = len(self._entries)
+                self._entries.append(
+                    (
+                        tv_username,
+                        user_login,
+                        user_id,
+                        email,
+                        expiry,
+                        str(txn.get("transaction_id") or ""),
+                        str(txn.get("created_at") or ""),
+                        str(txn.get("product_id") or ""),
+                    )
+                )
+            mapping[key] = slot
+
+    @staticmethod
+    def _wins(expiry: int, email: str, current: tuple) -> bool:
+        current_expiry = current[4]
+        if expiry:
+            return not current_expiry or expiry > current_expiry
+        # Neither date helps: prefer a transaction that at least has an email.
+        return not current[3] and bool(email)
+
+    def _entry(self, position: Optional[int]) -> Optional[WpTransaction]:
+        return WpTransaction._make(self._entries[position]) if position is not None else None
+
+    def get(self, username: str) -> Optional[WpTransaction]:
+        """Winning transaction for a ``tradingview_username``."""
+        return self._entry(self._by_username.get(username.lower()))
+
+    def by_login(self, user_login: str) -> Optional[WpTransaction]:
+        return self._entry(self._by_login.get(user_login.lower()))
+
+    def by_user_id(self, user_id: str) -> Optional[WpTransaction]:
+        return self._entry(self._by_user_id.get(str(user_id)))
+
+    def usernames(self) -> Iterator[str]:
+        """Every lowercase ``tradingview_username`` and ``user_login`` key."""
+        yield from self._by_username
+        yield from self._by_login
+
+    def match(self, username: str) -> Optional[Tuple[WpTransaction, str]]:
+        """Look ``username`` up as a TradingView name, then as a WordPress login.
+
+        Returns the transaction and which field matched (``MATCHED_VIA_*``).
+        """
+        key = username.lower()
+        position = self._by_username.get(key)
+        if position is not None:
+            return self._entry(position), MATCHED_VIA_USERNAME
+        position = self._by_login.get(key)
+        if position is not None:
+            return self._entry(position), MATCHED_VIA_LOGIN
+        return None
+
+    def save(self, path: Path, source_stamp: Tuple[int, int] = (0, 0)) -> None:
+        """Write a snapshot, dropping entries no key points at any more."""
+        remap: Dict[int, int] = {}
+        entries: List[tuple] = []
+
+        def compact(mapping: Dict[str, int]) -> Dict[str, int]:
+            result: Dict[str, int] = {}
+            for key, position in mapping.items():
+                if position not in remap:
+                    remap[position] = len(entries)
+                    entries.append(self._entries[position])
+                result[key] = remap[position]
+            return result
+
+        maps = (compact(self._by_username), compact(self._by_login), compact(self._by_user_id))
+        payload = marshal.dumps(
+            (tuple(source_stamp), self.transactions_seen, entries) + maps
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("wb") as handle:
+            handle.write(_SNAPSHOT_MAGIC + bytes([_SNAPSHOT_VERSION]))
+            handle.write(payload)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(
+        cls, path: Path, source_stamp: Optional[Tuple[int, int]] = None
+    ) -> Optional["TransactionIndex"]:
+        """Read a snapshot; None if it is missing, unreadable, or for another source."""
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        header = _SNAPSHOT_MAGIC + bytes([_SNAPSHOT_VERSION])
+        if not data.startswith(header):
+            return None
+        try:
+            stamp, seen, entries, by_username, by_login, by_user_id = marshal.loads(
+                data[len(header):]
+            )
+        except (EOFError, ValueError, TypeError):
+            return None
+        if source_stamp is not None and tuple(stamp) != tuple(source_stamp):
+            return None
+        index = cls()
+        index.transactions_seen = seen
+        index._entries = entries
+        index._by_username = by_username
+        index._by_login = by_login
+        index._by_user_id = by_user_id
+        return index
+
+    @classmethod
+    def load_or_build(
+        cls, json_path: Path, snapshot_path: Optional[Path] = None
+    ) -> Tuple["TransactionIndex", bool]:
+        """Index a JSON export, reusing its snapshot when it is current.
+
+        Returns ``(index, from_snapshot)``. The snapshot defaults to
+        ``<export>.idx`` and is rewritten whenever the index had to be rebuilt.
+        """
+        snapshot_path = snapshot_path or json_path.with_name(json_path.name + ".idx")
+        stamp = _source_stamp(json_path)
+        index = cls.load(snapshot_path, stamp)
+        if index is not None:
+            return index, True
+        index = cls.build(iter_json_transactions(json_path))
+        try:
+            index.save(snapshot_path, stamp)
+        except OSError:
+            pass  # a read-only export directory only costs the next run a rebuild
+        return index, False
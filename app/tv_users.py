@@ -0,0 +1,138 @@
+"""Streaming reader for TradingView user exports such as ``tv_users_full.csv``.
+
+Each export row carries an inline SVG data-URI in ``userpic`` that makes up most of
+the file, while callers only need a few short columns. Rows are read as bytes and
+only the projected columns are decoded; when the single wide column is the only
+quoted one, a row is cut around it with one ``split`` and one ``rsplit`` instead of
+running the csv parser over the whole data-URI. Rows that do not fit that shape
+(quotes elsewhere, embedded newlines) fall back to :mod:`csv`.
+"""
+
+from __future__ import annotations
+
+import csv
+import mmap
+from pathlib import Path
+from typing import IO, Iterator, List, NamedTuple, Optional, Sequence
+
+_BOM = b"\xef\xbb\xbf"
+_QUOTE = ord('"')
+
+# The data-URI column every export carries and no caller reads.
+SKIPPED_COLUMN = "userpic"
+
+
+class TvUser(NamedTuple):
+    id: str
+    username: str
+    created: str
+    expiration: str
+
+
+def _lines(handle: IO[bytes], use_mmap: bool) -> Iterator[bytes]:
+    if use_mmap:
+        try:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return
+        with mapped:
+            yield from iter(mapped.readline, b"")
+    else:
+        yield from handle
+
+
+def _records(lines: Iterator[bytes]) -> Iterator[bytes]:
+    """Join physical lines into CSV records so quoted newlines stay inside one record."""
+    for line in lines:
+        while line.count(_QUOTE) % 2:
+            continuation = next(lines, b"")
+            if not continuation:
+                break
+            line += continuation
+        yield line.rstrip(b"\r\n")
+
+
+def _parse_header(line: bytes) -> List[str]:
+    if line.startswith(_BOM):
+        line = line[len(_BOM):]
+    return next(csv.reader([line.decode("utf-8")]))
+
+
+def iter_tv_users(path: Path, use_mmap: bool = False) -> Iterator[TvUser]:
+    """Yield one :class:`TvUser` per row with a non-empty ``username``, lazily.
+
+    Values are stripped; columns missing from the header come back as ``""``. With
+    ``use_mmap`` the file is read through a read-only memory map instead of a
+    buffered handle, which saves a copy per line on large exports.
+    """
+    with path.open("rb") as handle:
+        records = _records(_lines(handle, use_mmap))
+        header_line = next(records, None)
+        if header_line is None:
+            return
+        header = _parse_header(header_line)
+        positions = [header.index(name) if name in header else None for name in TvUser._fields]
+        yield from _project(records, header, positions)
+
+
+def _project(
+    records: Iterator[bytes], header: Sequence[str], positions: Sequence[Optional[int]]
+) -> Iterator[TvUser]:
+    width = len(header)
+    skipped = header.index(SKIPPED_COLUMN) if SKIPPED_COLUMN in header else None
+    after = width - skipped - 1 if skipped is not None else 0
+    username_at = positions[TvUser._fields.index("username")]
+    if username_at is None:
+        return
+
+    for record in records:
+        if not record:
+            continue
+        fields = _fast_split(record, width, skipped, after)
+        if fields is None:
+            fields = [value.encode("utf-8") for value in next(csv.reader([record.decode("utf-8")]))]
+        if len(fields) <= username_at:
+            continue
+        username = fields[username_at].strip()
+        if not username:
+            continue
+        yield TvUser._make(
+            (
+                fields[index].decode("utf-8").strip()
+                if index is not None and index < len(fields)
+                else ""
+            )
+            for index in positions
+        )
+
+
+def _fast_split(
+    record: bytes, width: int, skipped: Optional[int], after: int
+) -> Optional[List[bytes]]:
+    """Split ``record`` without the csv module, or return None if it needs one."""
+    if _QUOTE not in record:
+        return record.split(b",")
+    if skipped is None:
+        return None
+    head = record.split(b",", skipped)
+    if len(head) <= skipped:
+        return None
+    tail = head[skipped].rsplit(b",", after) if after else [head[skipped]]
+    if len(tail) != after + 1:
+        return None
+    fields = head[:skipped] + tail
+    # Only the skipped column may be quoted; anything else goes through csv.
+    if any(_QUOTE in field for index, field in enumerate(fields) if index != skipped):
+        return None
+    if len(fields) != width:
+        return None
+    # Extra columns in a row end up inside the skipped one as ``"...",x``: it must be
+    # a single quoted value whose inner quotes are all doubled.
+    wide = fields[skipped]
+    if not wide or wide[0] != _QUOTE or wide[-1] != _QUOTE:
+        return None
+    if wide.find(b'"', 1, -1) != -1 and (
+        wide.count(b'"', 1, -1) != 2 * wide.count(b'""', 1, -1)
+    ):
+        return None
+    return fields
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import metrics
+from .config import Settings
+from .io import TradingViewClient
+from .jobs import master_lock
+from .locks import masterdata_lock
+from .sync import process_transactions
+
+logger = logging.getLogger(__name__)
+
+_ACCEPTED = ("accepted",)
+_DROPPED = ("dropped",)
+_PROCESSED = ("processed",)
+_FAILED = ("failed",)
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """Check a hex HMAC-SHA256 of ``body``; a ``sha256=`` prefix is accepted."""
+    if not signature:
+        return False
+    candidate = signature.strip()
+    if candidate.lower().startswith("sha256="):
+        candidate = candidate[len("sha256="):]
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    # compare_digest rejects non-ASCII str; header values can carry any latin-1 byte.
+    return hmac.compare_digest(
+        expected.encode("ascii"), candidate.lower().encode("utf-8", "replace")
+    )
+
+
+def _object_id(value: Any) -> Optional[str]:
+    if isinstance(value, dict):
+        value = value.get("id")
+    if value in (None, "", 0, "0"):
+        return None
+    return str(value)
+
+
+def _from_memberpress(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a MemberPress webhook ``data`` object onto the WordPress export row shape."""
+    member = data.get("member") if isinstance(data.get("member"), dict) else {}
+    user_meta: Dict[str, Any] = dict(member.get("profile") or {})
+    if "tradingview_username" not in user_meta and "mepr_tradingview_username" in user_meta:
+        user_meta["tradingview_username"] = user_meta["mepr_tradingview_username"]
+    for key in ("first_name", "last_name"):
+        if key in member and key not in user_meta:
+            user_meta[key] = member[key]
+
+    row: Dict[str, Any] = {
+        "transaction_id": _object_id(data.get("id")),
+        "product_id": _object_id(data.get("membership")) or _object_id(data.get("product_id")),
+        "created_at": data.get("created_at"),
+        "expires_at": data.get("expires_at"),
+        "status": data.get("status"),
+        "txn_type": data.get("txn_type"),
+        "amount": data.get("amount"),
+        "total": data.get("total"),
+        "gateway": _object_id(data.get("gateway")),
+        "trans_num": data.get("trans_num"),
+        "subscription_id": _object_id(data.get("subscription")),
+        "user_id": _object_id(member) or _object_id(data.get("user_id")),
+        "user_email": member.get("email"),
+        "user_login": member.get("username"),
+        "display_name": member.get("display_name"),
+        "user_meta": user_meta,
+    }
+    return {key: value for key, value in row.items() if value is not None}
+
+
+def transactions_from_payload(payload: Any) -> List[Dict[str, Any]]:
+    """Extract WordPress-style transaction rows from a webhook body.
+
+    Accepts a MemberPress event (``{"event": "...", "data": {...}}``), a single row
+    in the WordPress export shape, or a list of such rows. Non-transaction
+    MemberPress events yield an empty list.
+    """
+    if isinstance(payload, list):
+        return [row for row in payload if isinstance(row, dict)]
+    if not isinstance(payload, dict):
+        return []
+    if "transaction_id" in payload:
+        return [payload]
+    data = payload.get("data")
+    if not isinstance(data, dict):
+        return []
+    event = str(payload.get("event") or "")
+    if payload.get("type") not in (None, "transaction") or (event and "transaction" not in event):
+        return []
+    if "transaction_id" in data:
+        return [data]
+    return [_from_memberpress(data)]
+
+
+class WebhookQueue:
+    """In-memory queue of pushed transactions, granted in small batches.
+
+    A single worker waits for the first row, collects whatever else arrives within
+    ``webhook.batch_window_seconds`` (up to ``max_batch``), and runs the batch through
+    :func:`app.sync.process_transactions`. Each batch holds the in-process master
+    lock and the cross-process masterData lock, so it never interleaves with a
+    scheduler sync, retry drain or expiry sweep running in another process. Rows
+    still queued at shutdown are lost; the next poll picks them up.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self._settings = settings
+        self._config = settings.webhook
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self._config.queue_size)
+        self._tv_client: Optional[TradingViewClient] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """Queue ``rows``; returns ``(accepted, dropped)``."""
+        self._ensure_worker()
+        received_at = time.perf_counter()
+        accepted = 0
+        for row in rows:
+            try:
+                self._queue.put_nowait((received_at, row))
+            except asyncio.QueueFull:
+                break
+            accepted += 1
+        dropped = len(rows) - accepted
+        metrics.WEBHOOK_TRANSACTIONS.inc(accepted, _ACCEPTED)
+        if dropped:
+            metrics.WEBHOOK_TRANSACTIONS.inc(dropped, _DROPPED)
+            logger.warning(
+                "webhook.queue_full",
+                extra={"extra_data": {"dropped": dropped, "depth": self.depth}},
+            )
+        return accepted, dropped
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _next_batch(self) -> List[Tuple[float, Dict[str, Any]]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self._config.batch_window_seconds
+        while len(batch) < self._config.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        if self._tv_client is None:
+            self._tv_client = TradingViewClient(self._settings)
+        while True:
+            batch = await self._next_batch()
+            rows = [row for _, row in batch]
+            try:
+                async with master_lock, masterdata_lock(self._settings):
+                    summary = await process_transactions(
+                        self._settings, rows, tv_client=self._tv_client
+                    )
+            except Exception as exc:  # keep the worker alive; polling reconciles later
+                metrics.WEBHOOK_TRANSACTIONS.inc(len(rows), _FAILED)
+                logger.exception(
+                    "webhook.batch_failed",
+                    extra={"extra_data": {"count": len(rows), "error": str(exc)}},
+                )
+                continue
+            finished = time.perf_counter()
+            for received_at, _ in batch:
+                metrics.WEBHOOK_LATENCY.observe(finished - received_at)
+            metrics.WEBHOOK_TRANSACTIONS.inc(len(rows), _PROCESSED)
+            logger.info(
+                "webhook.batch_processed",
+                extra={"extra_data": {"count": len(rows), "summary": summary}},
+            )
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        if self._tv_client is not None:
+            await self._tv_client.aclose()
+            self._tv_client = None
+
+
+_QUEUE: Optional[WebhookQueue] = None
+
+
+def get_webhook_queue(settings: Settings) -> WebhookQueue:
+    global _QUEUE
+    if _QUEUE is None:
+        _QUEUE = WebhookQueue(settings)
+    return _QUEUE
+
+
+async def stop_webhook_queue() -> None:
+    global _QUEUE
+    if _QUEUE is not None:
+        await _QUEUE.stop()
+        _QUEUE = None
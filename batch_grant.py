@@ -5,41 +5,29 @@ import asyncio
 import csv
 import json
 import logging
-from datetime import datetime, timezone
+import os
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Set, Union
 
 import httpx
 
 from app import load_settings
-from app.io import ApiError, TradingViewClient
+from app.io import ApiError, JsonArrayParser, TradingViewClient
+from app.locks import masterdata_lock
 from app.storage import AccessRecord, MasterData, load_master, save_master
+from app.transaction_index import TransactionIndex, WpTransaction
+from app.tv_users import TvUser, iter_tv_users
 
 BATCH_SIZE = 500
+CONCURRENCY = 8
 LOGGER = logging.getLogger("batch_grant")
 
 
-def _chunked(seq: list, size: int):
-    """Split sequence into chunks of specified size"""
-    for start in range(0, len(seq), size):
-        yield seq[start : start + size]
-
-
-def parse_expiry(expiry_str: str) -> Optional[str]:
-    """Parse expiry date string and return ISO format date string"""
-    if not expiry_str:
-        return None
-    try:
-        # Handle various date formats
-        if "T" in expiry_str or " " in expiry_str:
-            dt = datetime.fromisoformat(expiry_str.replace("Z", "+00:00"))
-            return dt.date().isoformat()
-        dt = datetime.strptime(expiry_str, "%Y-%m-%d")
-        return dt.date().isoformat()
-    except:
-        return None
-
-
 def _parse_expiry_to_datetime(expiry_str: str) -> Optional[datetime]:
     """Parse expiry string to datetime object"""
     if not expiry_str:
@@ -56,100 +44,38 @@ def _parse_expiry_to_datetime(expiry_str: str) -> Optional[datetime]:
         return None
 
 
-async def _fetch_transactions_source(
+async def _build_transaction_index(
     source: Union[Path, str],
     settings,
-) -> List[Dict[str, Any]]:
-    """Fetch raw transactions from API or file"""
+) -> TransactionIndex:
+    """Index transactions from a JSON file (via its snapshot) or stream them from the API"""
     if isinstance(source, Path):
-        raw_text = source.read_text(encoding="utf-8")
-        raw = json.loads(raw_text)
-    else:
-        params = {}
-        if settings.wordpress.api_token_param and settings.wordpress.api_token:
-            params[settings.wordpress.api_token_param] = settings.wordpress.api_token
-        async with httpx.AsyncClient(timeout=settings.wordpress.timeout_seconds) as client:
-            response = await client.get(source, params=params)
-            response.raise_for_status()
-            raw = response.json()
-    
-    if not isinstance(raw, list):
-        raise RuntimeError(
-            f"Expected a list of transactions, got {type(raw).__name__} from {source}"
-        )
-    return raw
-
+        index, from_snapshot = TransactionIndex.load_or_build(source)
+        if from_snapshot:
+            LOGGER.info(f"Loaded transaction index snapshot for {source}")
+        return index
 
-def _build_transaction_lookup(raw_transactions: List[Dict]) -> Dict[str, Dict]:
-    """Build lookup from raw transactions (like compare_access.py) - no status filtering"""
-    lookup: Dict[str, Dict] = {}
-    
-    for txn in raw_transactions:
-        # Get email and expiry
-        email = txn.get("user_email", "").strip()
-        expires_at = txn.get("expires_at", "").strip()
-        
-        # Parse expiry to date string
-        expiry_date = parse_expiry(expires_at) if expires_at else None
-        
-        # Get possible usernames to match against
-        user_meta = txn.get("user_meta", {})
-        tv_username_meta = user_meta.get("tradingview_username", "").strip() if user_meta else ""
-        user_login = txn.get("user_login", "").strip()
-        user_id = txn.get("user_id", "") or (txn.get("user", {}).get("id", "") if txn.get("user") else "")
-        transaction_id = txn.get("transaction_id", "")
-        created_at = txn.get("created_at", "")
-        product_id = txn.get("product_id", "")
-        
-        # Transaction data to store
-        txn_data = {
-            'email': email,
-            'expiry': expiry_date,
-            'transaction_id': transaction_id,
-            'created_at': created_at,
-            'product_id': product_id,
-            'user_id': str(user_id) if user_id else "",
-            'user_login': user_login,
-        }
-        
-        # Add to lookup by tradingview_username (if exists)
-        if tv_username_meta:
-            username_lower = tv_username_meta.lower()
-            existing = lookup.get(username_lower)
-            
-            if not existing:
-                lookup[username_lower] = txn_data.copy()
-            else:
-                # Update if this transaction has a later expiry
-                if expiry_date and existing['expiry']:
-                    try:
-                        existing_date = datetime.fromisoformat(existing['expiry']).date()
-                        new_date = datetime.fromisoformat(expiry_date).date()
-                        if new_date > existing_date:
-                            lookup[username_lower] = txn_data.copy()
-                    except:
-                        pass
-                elif expiry_date and not existing['expiry']:
-                    lookup[username_lower] = txn_data.copy()
-                elif not existing['email'] and email:
-                    lookup[username_lower] = txn_data.copy()
-    
-    return lookup
+    index = TransactionIndex()
+    parser = JsonArrayParser()
+    params = {}
+    if settings.wordpress.api_token_param and settings.wordpress.api_token:
+        params[settings.wordpress.api_token_param] = settings.wordpress.api_token
+    async with httpx.AsyncClient(timeout=settings.wordpress.timeout_seconds) as client:
+        async with client.stream("GET", source, params=params) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                for txn in parser.feed(chunk):
+                    index.add(txn)
+    for txn in parser.close():
+        index.add(txn)
+    return index
 
 
-def _load_csv_users(csv_path: Path) -> List[Dict[str, str]]:
-    """Load CSV users and return list of user dicts"""
-    users = []
+def _load_csv_users(csv_path: Path) -> List[TvUser]:
+    """Load CSV users, reading only the id/username/created/expiration columns"""
     if not csv_path.exists():
-        return users
-    
-    with csv_path.open("r", encoding="utf-8", newline="") as handle:
-        reader = csv.DictReader(handle)
-        for row in reader:
-            username = row.get("username", "").strip()
-            if username:
-                users.append({"username": username})
-    return users
+        return []
+    return list(iter_tv_users(csv_path))
 
 
 def _load_grant_csv(grant_csv_path: Path) -> set[str]:
@@ -167,25 +93,104 @@ def _load_grant_csv(grant_csv_path: Path) -> set[str]:
     return usernames
 
 
-def _append_grant_csv(
-    grant_csv_path: Path,
-    username: str,
-    email: str,
-    expiry: str,
-    transaction_id: str,
-    last_payment: str,
-    user_login: str,
-) -> None:
-    """Append user to grant CSV"""
-    file_exists = grant_csv_path.exists()
-    header = ["TV_username", "email", "expiry", "transaction_id", "last_payment", "user_login"]
-    row = [username, email, expiry, transaction_id, last_payment, user_login]
-    
-    with grant_csv_path.open("a", encoding="utf-8", newline="") as handle:
-        writer = csv.writer(handle)
-        if not file_exists:
-            writer.writerow(header)
-        writer.writerow(row)
+GRANT_CSV_HEADER = ["TV_username", "email", "expiry", "transaction_id", "last_payment", "user_login"]
+GRANT_CSV_FLUSH_ROWS = 200
+GRANT_CSV_FLUSH_SECONDS = 2.0
+
+
+class GrantCsvWriter:
+    """Grant CSV kept open for the whole run, written by a single background task.
+
+    Workers hand rows to :meth:`write`, which only enqueues them. The writer task
+    appends them to one buffered handle and flushes after ``flush_rows`` rows or
+    ``flush_seconds`` since the last flush. :meth:`checkpoint` waits until every
+    queued row is written, then flushes and optionally fsyncs; call it at batch
+    boundaries. :meth:`close` does the same and releases the file.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        flush_rows: int = GRANT_CSV_FLUSH_ROWS,
+        flush_seconds: float = GRANT_CSV_FLUSH_SECONDS,
+    ):
+        self.path = path
+        self.flush_rows = max(1, flush_rows)
+        self.flush_seconds = flush_seconds
+        self.rows_written = 0
+        self._handle = None
+        self._writer = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    async def __aenter__(self) -> "GrantCsvWriter":
+        self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    def open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        needs_header = not self.path.exists() or self.path.stat().st_size == 0
+        self._handle = self.path.open("a", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._handle)
+        if needs_header:
+            self._writer.writerow(GRANT_CSV_HEADER)
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def write(self, row: List[str]) -> None:
+        if self._queue is None:
+            raise RuntimeError("GrantCsvWriter is not open")
+        self._queue.put_nowait(row)
+
+    async def _run(self) -> None:
+        while True:
+            timeout = None
+            if self._unflushed:
+                timeout = max(0.0, self.flush_seconds - (time.monotonic() - self._last_flush))
+            try:
+                row = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                self._flush()
+                continue
+            self._writer.writerow(row)
+            self.rows_written += 1
+            self._unflushed += 1
+            if (
+                self._unflushed >= self.flush_rows
+                or time.monotonic() - self._last_flush >= self.flush_seconds
+            ):
+                self._flush()
+            self._queue.task_done()
+
+    def _flush(self, fsync: bool = False) -> None:
+        self._handle.flush()
+        if fsync:
+            os.fsync(self._handle.fileno())
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    async def checkpoint(self, fsync: bool = True) -> None:
+        """Write out every queued row, flush, and fsync when ``fsync`` is set."""
+        if self._queue is None:
+            return
+        await self._queue.join()
+        self._flush(fsync)
+
+    async def close(self) -> None:
+        if self._queue is None:
+            return
+        try:
+            await self.checkpoint()
+        finally:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._handle.close()
+            self._handle = self._writer = self._queue = self._task = None
 
 
 def _get_default_script_id(settings) -> str:
@@ -197,202 +202,347 @@ def _get_default_script_id(settings) -> str:
     raise RuntimeError("No products configured in settings")
 
 
-async def process_user_batch(
-    batch: List[Dict[str, str]],
-    transaction_lookup: Dict[str, Dict],
+@dataclass
+class PlannedUser:
+    """One CSV user whose latest transaction has a parseable expiry."""
+
+    index: int
+    username: str
+    txn: WpTransaction
+    expiry: datetime
+
+
+@dataclass
+class GrantPlan:
+    """Result of classifying every CSV user once, in CSV order."""
+
+    active: List[PlannedUser] = field(default_factory=list)
+    expired: List[PlannedUser] = field(default_factory=list)
+    # Skip reasons for users inside the --max-batches window.
+    counts: Dict[str, int] = field(
+        default_factory=lambda: {
+            "already_processed": 0,
+            "no_transaction_match": 0,
+            "no_expiry": 0,
+            "invalid_expiry": 0,
+        }
+    )
+    expired_in_csv: int = 0
+    active_in_csv: int = 0
+    total_active_users: int = 0
+
+
+def build_plan(
+    csv_users: List[TvUser],
+    transaction_index: TransactionIndex,
+    done_usernames: Set[str],
+    master_users: Dict[str, AccessRecord],
+    now: datetime,
+    limit: Optional[int] = None,
+) -> GrantPlan:
+    """Classify CSV users in a single pass, parsing each expiry once.
+
+    Users at CSV positions ``>= limit`` still count towards the whole-file totals
+    but are not planned for this run.
+    """
+    plan = GrantPlan()
+    seen: Set[str] = set()
+    for index, csv_user in enumerate(csv_users):
+        tv_username = csv_user.username
+        username_key = tv_username.lower()
+        in_scope = limit is None or index < limit
+
+        txn = transaction_index.get(username_key)
+        expiry_dt = txn.expiry_datetime if txn else None
+        if expiry_dt is not None:
+            if expiry_dt < now:
+                plan.expired_in_csv += 1
+            else:
+                plan.active_in_csv += 1
+
+        done = username_key in done_usernames or username_key in master_users or username_key in seen
+        seen.add(username_key)
+        if expiry_dt is not None and expiry_dt >= now and not done:
+            plan.total_active_users += 1
+        if not in_scope:
+            continue
+
+        if done:
+            plan.counts["already_processed"] += 1
+        elif txn is None:
+            plan.counts["no_transaction_match"] += 1
+        elif expiry_dt is None:
+            # The index keeps unparseable expiries as "none", so invalid_expiry stays 0.
+            plan.counts["no_expiry"] += 1
+        elif expiry_dt < now:
+            plan.expired.append(PlannedUser(index, tv_username, txn, expiry_dt))
+        else:
+            plan.active.append(PlannedUser(index, tv_username, txn, expiry_dt))
+    return plan
+
+
+class ResumeJournal:
+    """Append-only record of per-user outcomes, so a killed run resumes where it stopped.
+
+    One JSON line per user with an outcome. Granted and expired users are
+    finished and skipped on restart; granted lines also carry the access record
+    and grant CSV row, which lets a restart restore anything the run did not get
+    to save. Invalid usernames are recorded for reporting only and validated again
+    by the next run, since the user may have fixed their name in the meantime. The
+    journal is removed once a run gets through the whole CSV.
+    """
+
+    FINAL_OUTCOMES = ("granted", "expired")
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._handle = None
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        entries: Dict[str, Dict[str, Any]] = {}
+        if not self.path.exists():
+            return entries
+        with self.path.open("r", encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # line torn by a kill mid-write
+                entries[entry["username"].lower()] = entry
+        return entries
+
+    def record(self, username: str, outcome: str, **fields: Any) -> None:
+        if self._handle is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            torn = self._ends_mid_line()
+            self._handle = self.path.open("a", encoding="utf-8")
+            if torn:
+                # Don't glue the first entry onto a line cut short by a kill.
+                self._handle.write("\n")
+        entry = {"username": username, "outcome": outcome, **fields}
+        self._handle.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._handle.flush()
+
+    def _ends_mid_line(self) -> bool:
+        try:
+            with self.path.open("rb") as handle:
+                handle.seek(0, os.SEEK_END)
+                if handle.tell() == 0:
+                    return False
+                handle.seek(-1, os.SEEK_END)
+                return handle.read(1) != b"\n"
+        except FileNotFoundError:
+            return False
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def remove(self) -> None:
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+
+def _restore_from_journal(
+    entries: Dict[str, Dict[str, Any]],
+    master_data: MasterData,
+    grant_writer: GrantCsvWriter,
+    grant_csv_usernames: Set[str],
+) -> int:
+    """Re-apply granted users whose masterData save or CSV row was lost; returns restored."""
+    restored = 0
+    for username_key, entry in entries.items():
+        if entry.get("outcome") != "granted":
+            continue
+        record = AccessRecord.model_validate(entry["record"])
+        changed = False
+        if record.username.lower() not in master_data.users:
+            master_data.record_user(record.username.lower(), record)
+            changed = True
+        if username_key not in grant_csv_usernames:
+            grant_writer.write(entry["csv_row"])
+            grant_csv_usernames.add(username_key)
+            changed = True
+        restored += changed
+    return restored
+
+
+def _finished_usernames(
+    entries: Dict[str, Dict[str, Any]], grant_csv_usernames: Set[str]
+) -> Set[str]:
+    """Users a resumed run skips: rows in the grant CSV plus finished journal entries."""
+    finished = set(grant_csv_usernames)
+    finished.update(
+        key
+        for key, entry in entries.items()
+        if entry.get("outcome") in ResumeJournal.FINAL_OUTCOMES
+    )
+    return finished
+
+
+class ProgressReporter:
+    """Logs completed/total, throughput and ETA at most every ``interval`` seconds."""
+
+    def __init__(self, total: int, interval: float = 5.0):
+        self.total = total
+        self.completed = 0
+        self._interval = interval
+        self._started = time.monotonic()
+        self._last_report = self._started
+
+    def advance(self) -> None:
+        self.completed += 1
+        now = time.monotonic()
+        if now - self._last_report >= self._interval or self.completed == self.total:
+            self._last_report = now
+            self.report(now)
+
+    def rate(self, now: Optional[float] = None) -> float:
+        elapsed = (now or time.monotonic()) - self._started
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    def report(self, now: Optional[float] = None) -> None:
+        rate = self.rate(now)
+        remaining = self.total - self.completed
+        eta = timedelta(seconds=round(remaining / rate)) if rate > 0 else None
+        LOGGER.info(
+            "Progress %d/%d (%.1f%%) %.2f users/s ETA %s",
+            self.completed,
+            self.total,
+            100.0 * self.completed / self.total if self.total else 100.0,
+            rate,
+            eta if eta is not None else "unknown",
+        )
+
+
+async def grant_planned_user(
+    planned: PlannedUser,
     tv_client: TradingViewClient,
     settings,
     master_data: MasterData,
-    grant_csv_path: Path,
-    grant_csv_usernames: set[str],
+    grant_writer: GrantCsvWriter,
+    grant_csv_usernames: Set[str],
+    journal: Optional[ResumeJournal],
     summary: dict,
     dry_run: bool,
 ) -> None:
-    """Process a batch of CSV users"""
-    now = datetime.now(tz=timezone.utc)
-    default_script_id = _get_default_script_id(settings)
-    separator_line = "*" * 100
-    
-    # First pass: collect active users and track skipped ones
-    active_users_in_batch = []
-    for csv_user in batch:
-        tv_username = csv_user["username"]
-        username_key = tv_username.lower()
-        
-        # Check if already processed
-        if username_key in grant_csv_usernames or username_key in master_data.users:
-            summary["already_processed"] += 1
-            continue
-        
-        # Match to transaction lookup
-        txn_info = transaction_lookup.get(username_key)
-        if not txn_info:
-            summary["no_transaction_match"] += 1
-            continue
-        
-        # Get expiry from transaction
-        expiry_date_str = txn_info.get('expiry')
-        if not expiry_date_str:
-            summary["no_expiry"] += 1
-            continue
-        
-        # Parse expiry and check if expired
-        expiry_dt = _parse_expiry_to_datetime(expiry_date_str)
-        if not expiry_dt:
-            summary["invalid_expiry"] += 1
-            continue
-        
-        if expiry_dt < now:
-            # Expired - add to CSV but skip grant
-            email = txn_info.get('email', '')
-            transaction_id = txn_info.get('transaction_id', '')
-            created_at = txn_info.get('created_at', '')
-            user_login = txn_info.get('user_login', '')
-            
-            # Append expired user to grant CSV
-            _append_grant_csv(
-                grant_csv_path,
-                tv_username,
-                email,
-                expiry_date_str,
-                transaction_id,
-                created_at,
-                user_login,
-            )
-            summary["expired_skipped"] += 1
-            grant_csv_usernames.add(username_key)  # Mark as processed to avoid duplicates
-            continue
-        
-        # Active user - will be processed
-        active_users_in_batch.append((csv_user, txn_info, expiry_dt))
-    
-    # Second pass: process active users with detailed logging
-    total_in_batch = len(active_users_in_batch)
-    for index, (csv_user, txn_info, expiry_dt) in enumerate(active_users_in_batch, start=1):
-        tv_username = csv_user["username"]
-        username_key = tv_username.lower()
-        
-        LOGGER.info(separator_line)
-        LOGGER.info(f"Processing user {tv_username} ({index}/{total_in_batch})")
-        
-        # Get user details
-        email = txn_info.get('email', '')
-        transaction_id = txn_info.get('transaction_id', '')
-        created_at = txn_info.get('created_at', '')
-        user_login = txn_info.get('user_login', '')
-        user_id = txn_info.get('user_id', '')
-        product_id = txn_info.get('product_id', '')
-        expiry_date_str = txn_info.get('expiry', '')
-        
-        # Get script_id and subscription_type
-        product = settings.product_for(product_id) if product_id else None
-        script_id = product.script_id if product else default_script_id
-        subscription_type = product.subscription_type if product else ""
-        
-        LOGGER.info(
-            "TV username=%s email=%s expiry=%s product_id=%s script_id=%s",
-            tv_username,
-            email,
-            expiry_date_str,
-            product_id or "unknown",
-            script_id,
-        )
-        
-        # Validate username (skip in dry-run)
-        effective_username = tv_username
-        if not dry_run:
-            try:
-                validation = await tv_client.validate_username(tv_username)
-            except Exception as exc:
-                LOGGER.exception(
-                    "Validation request failed",
-                    extra={"username": tv_username, "transactionId": transaction_id},
-                )
-                summary["validation_failed"] += 1
-                continue
-            
-            if not validation.get("validUser"):
-                LOGGER.warning(
-                    "Username invalid",
-                    extra={"username": tv_username, "transactionId": transaction_id},
-                )
-                summary["invalid_usernames"] += 1
-                continue
-            
-            effective_username = validation.get("verifiedUserName") or tv_username
-        
-        # Build grant payload
-        payload = {
-            "scriptId": script_id,
-            "username": effective_username,
-            "email": email,
-            "expiry": expiry_date_str,  # Already in YYYY-MM-DD format
-            "subscription_type": subscription_type,
-            "wp_username": user_login,
-            "remarks": "OP-M",
-        }
-        
-        if dry_run:
-            # Dry-run: log what would be granted
-            action_type = "grant_new" if username_key not in master_data.users else "update_existing"
-            LOGGER.info(f"Dry run: would call TradingView {action_type} for {effective_username}")
-            summary["dry_run_skipped"] += 1
-            continue
-        
-        # Grant access
+    """Validate and grant one active user, then record the result everywhere."""
+    tv_username = planned.username
+    username_key = tv_username.lower()
+    txn = planned.txn
+
+    email = txn.email
+    transaction_id = txn.transaction_id
+    created_at = txn.created_at
+    user_login = txn.user_login
+    user_id = txn.user_id
+    product_id = txn.product_id
+    expiry_date_str = txn.expiry_iso or ""
+
+    product = settings.product_for(product_id) if product_id else None
+    script_id = product.script_id if product else _get_default_script_id(settings)
+    subscription_type = product.subscription_type if product else ""
+
+    LOGGER.info(
+        "TV username=%s email=%s expiry=%s product_id=%s script_id=%s",
+        tv_username,
+        email,
+        expiry_date_str,
+        product_id or "unknown",
+        script_id,
+    )
+
+    # Validate username (skip in dry-run)
+    effective_username = tv_username
+    if not dry_run:
         try:
-            await tv_client.grant_access(payload)
-            action_type = "grant_new" if username_key not in master_data.users else "update_existing"
-            LOGGER.info(f"Successfully called TradingView {action_type} for {effective_username}")
-        except ApiError as exc:
-            LOGGER.error(
-                "Grant access failed for %s (status: %s)",
-                effective_username,
-                exc.status_code,
+            validation = await tv_client.validate_username(tv_username)
+        except Exception:
+            LOGGER.exception(
+                "Validation request failed",
+                extra={"username": tv_username, "transactionId": transaction_id},
             )
-            summary["grant_failed"] += 1
-            continue
-        
-        # Check if this is a refresh or new grant
-        is_refresh = username_key in master_data.users
-        
-        # Update masterData
-        expiry_datetime = expiry_dt
-        created_at_dt = _parse_expiry_to_datetime(created_at) or now
-        
-        access_record = AccessRecord(
-            wp_user_id=user_id or effective_username,
-            username=effective_username,
-            wp_username=user_login or effective_username,
-            email=email,
-            product_id=product_id or "unknown",
-            script_id=script_id,
-            expiry=expiry_datetime,
-            last_transaction_id=transaction_id,
-            last_transaction_at=created_at_dt,
-            status="active",
-        )
-        master_data.record_user(effective_username.lower(), access_record)
-        
-        # Append to grant CSV
-        _append_grant_csv(
-            grant_csv_path,
+            summary["validation_failed"] += 1
+            return
+
+        if not validation.get("validUser"):
+            LOGGER.warning(
+                "Username invalid",
+                extra={"username": tv_username, "transactionId": transaction_id},
+            )
+            summary["invalid_usernames"] += 1
+            if journal is not None:
+                journal.record(tv_username, "invalid_username")
+            return
+
+        effective_username = validation.get("verifiedUserName") or tv_username
+
+    is_refresh = username_key in master_data.users
+    action_type = "update_existing" if is_refresh else "grant_new"
+    if dry_run:
+        LOGGER.info(f"Dry run: would call TradingView {action_type} for {effective_username}")
+        summary["dry_run_skipped"] += 1
+        return
+
+    payload = {
+        "scriptId": script_id,
+        "username": effective_username,
+        "email": email,
+        "expiry": expiry_date_str,  # Already in YYYY-MM-DD format
+        "subscription_type": subscription_type,
+        "wp_username": user_login,
+        "remarks": "OP-M",
+    }
+    try:
+        await tv_client.grant_access(payload)
+    except ApiError as exc:
+        LOGGER.error(
+            "Grant access failed for %s (status: %s)",
             effective_username,
-            email,
-            expiry_date_str,
-            transaction_id,
-            created_at,
-            user_login or user_id,
+            exc.status_code,
         )
-        
-        # Update summary
-        if is_refresh:
-            summary["refreshed"] += 1
-        else:
-            summary["new_grants"] += 1
-        
-        summary["active_granted"] += 1
-        grant_csv_usernames.add(username_key)  # Mark as processed
+        summary["grant_failed"] += 1
+        return
+    LOGGER.info(f"Successfully called TradingView {action_type} for {effective_username}")
+
+    access_record = AccessRecord(
+        wp_user_id=user_id or effective_username,
+        username=effective_username,
+        wp_username=user_login or effective_username,
+        email=email,
+        product_id=product_id or "unknown",
+        script_id=script_id,
+        expiry=planned.expiry,
+        last_transaction_id=transaction_id,
+        last_transaction_at=_parse_expiry_to_datetime(created_at) or datetime.now(tz=timezone.utc),
+        status="active",
+    )
+    master_data.record_user(effective_username.lower(), access_record)
+    csv_row = [
+        effective_username,
+        email,
+        expiry_date_str,
+        transaction_id,
+        created_at,
+        user_login or user_id,
+    ]
+    if journal is not None:
+        # Journal first: if the run dies before the CSV row, the restart writes it.
+        journal.record(
+            tv_username,
+            "granted",
+            record=access_record.model_dump(mode="json"),
+            csv_row=csv_row,
+        )
+    grant_writer.write(csv_row)
+
+    if is_refresh:
+        summary["refreshed"] += 1
+    else:
+        summary["new_grants"] += 1
+    summary["active_granted"] += 1
+    grant_csv_usernames.add(username_key)
 
 
 async def main(
@@ -402,18 +552,46 @@ async def main(
     max_batches: Optional[int] = None,
     dry_run: bool = False,
     grant_csv_path: Optional[Path] = None,
+    concurrency: int = CONCURRENCY,
+    csv_flush_rows: int = GRANT_CSV_FLUSH_ROWS,
+    csv_flush_seconds: float = GRANT_CSV_FLUSH_SECONDS,
 ) -> None:
     settings = load_settings()
+    # masterData is loaded once and saved after every batch, so the scheduler and API
+    # must not write it in between; they wait on the same lock until this run ends.
+    async with nullcontext() if dry_run else masterdata_lock(settings):
+        await _run_batches(
+            settings,
+            transactions_source,
+            csv_path,
+            batch_size,
+            max_batches,
+            dry_run,
+            grant_csv_path,
+            concurrency,
+            csv_flush_rows,
+            csv_flush_seconds,
+        )
+
+
+async def _run_batches(
+    settings,
+    transactions_source: Union[Path, str],
+    csv_path: Path,
+    batch_size: int,
+    max_batches: Optional[int],
+    dry_run: bool,
+    grant_csv_path: Optional[Path],
+    concurrency: int,
+    csv_flush_rows: int,
+    csv_flush_seconds: float,
+) -> None:
     
-    # Fetch raw transactions
-    LOGGER.info("Fetching transactions from source...")
-    raw_transactions = await _fetch_transactions_source(transactions_source, settings)
-    LOGGER.info(f"Fetched {len(raw_transactions)} transactions")
-    
-    # Build transaction lookup (like compare_access.py)
-    LOGGER.info("Building transaction lookup...")
-    transaction_lookup = _build_transaction_lookup(raw_transactions)
-    LOGGER.info(f"Created lookup for {len(transaction_lookup)} unique usernames")
+    # Same latest-expiry-per-username index as compare_access.py
+    LOGGER.info("Fetching transactions from source and building lookup...")
+    transaction_index = await _build_transaction_index(transactions_source, settings)
+    LOGGER.info(f"Fetched {transaction_index.transactions_seen} transactions")
+    LOGGER.info(f"Created lookup for {len(transaction_index)} unique usernames")
     
     # Load CSV users
     LOGGER.info(f"Loading CSV users from {csv_path}...")
@@ -432,89 +610,133 @@ async def main(
     default_script_id = _get_default_script_id(settings)
     master_data = load_master(settings, default_script_id)
     LOGGER.info(f"Loaded masterData with {len(master_data.users)} existing users")
-    
-    # Initialize summary
-    summary = {
-        "total_csv_users": len(csv_users),
-        "processed_batches": 0,
-        "already_processed": 0,
-        "no_transaction_match": 0,
-        "no_expiry": 0,
-        "invalid_expiry": 0,
-        "expired_skipped": 0,
-        "validation_failed": 0,
-        "invalid_usernames": 0,
-        "grant_failed": 0,
-        "dry_run_skipped": 0,
-        "active_granted": 0,
-        "new_grants": 0,
-        "refreshed": 0,
-    }
-    
-    # Count expired users in CSV (for summary)
-    now = datetime.now(tz=timezone.utc)
-    expired_in_csv = 0
-    active_in_csv = 0
-    
-    for csv_user in csv_users:
-        username_key = csv_user["username"].lower()
-        txn_info = transaction_lookup.get(username_key)
-        
-        if txn_info:
-            expiry_str = txn_info.get('expiry')
-            if expiry_str:
-                expiry_dt = _parse_expiry_to_datetime(expiry_str)
-                if expiry_dt:
-                    if expiry_dt < now:
-                        expired_in_csv += 1
-                    else:
-                        active_in_csv += 1
-    
-    summary["expired_in_csv"] = expired_in_csv
-    summary["active_in_csv"] = active_in_csv
-    
-    # Count total active users for progress tracking
-    total_active_users = 0
-    for csv_user in csv_users:
-        username_key = csv_user["username"].lower()
-        if username_key in grant_csv_usernames or username_key in master_data.users:
-            continue
-        txn_info = transaction_lookup.get(username_key)
-        if txn_info:
-            expiry_str = txn_info.get('expiry')
-            if expiry_str:
-                expiry_dt = _parse_expiry_to_datetime(expiry_str)
-                if expiry_dt and expiry_dt >= now:
-                    total_active_users += 1
-    
-    summary["total_active_users"] = total_active_users
-    LOGGER.info(f"Total active users to process: {total_active_users}")
-    
-    # Process users in batches
-    for batch_index, batch in enumerate(_chunked(csv_users, batch_size), start=1):
-        LOGGER.info(f"Processing batch {batch_index} ({len(batch)} users)...")
-        
-        await process_user_batch(
-            batch,
-            transaction_lookup,
-            TradingViewClient(settings),
-            settings,
-            master_data,
-            grant_csv_path,
-            grant_csv_usernames,
-            summary,
-            dry_run,
-        )
-        
-        # Save masterData after each batch
-        if not dry_run:
-            save_master(settings, master_data)
-            LOGGER.info(f"Saved masterData after batch {batch_index}")
-        
-        summary["processed_batches"] += 1
-        
-        if max_batches is not None and batch_index >= max_batches:
-            break
+
+    # One open handle for the whole run; rows are written by the writer's own task.
+    grant_writer = GrantCsvWriter(grant_csv_path, csv_flush_rows, csv_flush_seconds)
+    grant_writer.open()
+    journal: Optional[ResumeJournal] = None
+    try:
+        # Resume: users finished by an earlier, interrupted run are not attempted again.
+        journal = None if dry_run else ResumeJournal(grant_csv_path.with_suffix(".journal.jsonl"))
+        journal_entries = journal.load() if journal is not None else {}
+        if journal_entries:
+            restored = _restore_from_journal(
+                journal_entries, master_data, grant_writer, grant_csv_usernames
+            )
+            if restored:
+                save_master(settings, master_data)
+                await grant_writer.checkpoint()
+            LOGGER.info(
+                f"Resuming from {journal.path}: {len(journal_entries)} users journaled, "
+                f"{restored} restored"
+            )
+        finished = _finished_usernames(journal_entries, grant_csv_usernames)
+
+        now = datetime.now(tz=timezone.utc)
+        limit = batch_size * max_batches if max_batches is not None else None
+        plan = build_plan(csv_users, transaction_index, finished, master_data.users, now, limit)
+
+        summary = {
+            "total_csv_users": len(csv_users),
+            "processed_batches": 0,
+            **plan.counts,
+            "expired_skipped": 0,
+            "validation_failed": 0,
+            "invalid_usernames": 0,
+            "grant_failed": 0,
+            "dry_run_skipped": 0,
+            "active_granted": 0,
+            "new_grants": 0,
+            "refreshed": 0,
+            "expired_in_csv": plan.expired_in_csv,
+            "active_in_csv": plan.active_in_csv,
+            "total_active_users": plan.total_active_users,
+        }
+        LOGGER.info(f"Total active users to process: {plan.total_active_users}")
+
+        batches: Dict[int, List[PlannedUser]] = defaultdict(list)
+        for planned in plan.active:
+            batches[planned.index // batch_size].append(planned)
+        expired_by_batch: Dict[int, List[PlannedUser]] = defaultdict(list)
+        for planned in plan.expired:
+            expired_by_batch[planned.index // batch_size].append(planned)
+        batch_count = (min(len(csv_users), limit) if limit is not None else len(csv_users))
+        batch_count = (batch_count + batch_size - 1) // batch_size
+
+        progress = ProgressReporter(len(plan.active))
+        started = time.monotonic()
+
+        # One pooled client and a bounded worker pool for the whole run.
+        async with TradingViewClient(settings) as tv_client:
+            for batch_index in range(batch_count):
+                active = batches.get(batch_index, [])
+                LOGGER.info(
+                    f"Processing batch {batch_index + 1}/{batch_count} ({len(active)} active users)..."
+                )
+
+                for planned in expired_by_batch.get(batch_index, []):
+                    # Expired - add to CSV but skip grant
+                    txn = planned.txn
+                    grant_writer.write(
+                        [
+                            planned.username,
+                            txn.email,
+                            txn.expiry_iso or "",
+                            txn.transaction_id,
+                            txn.created_at,
+                            txn.user_login,
+                        ]
+                    )
+                    if journal is not None:
+                        journal.record(planned.username, "expired")
+                    grant_csv_usernames.add(planned.username.lower())
+                    summary["expired_skipped"] += 1
+
+                queue: asyncio.Queue = asyncio.Queue()
+                for planned in active:
+                    queue.put_nowait(planned)
+
+                async def worker() -> None:
+                    while True:
+                        try:
+                            planned = queue.get_nowait()
+                        except asyncio.QueueEmpty:
+                            return
+                        await grant_planned_user(
+                            planned,
+                            tv_client,
+                            settings,
+                            master_data,
+                            grant_writer,
+                            grant_csv_usernames,
+                            journal,
+                            summary,
+                            dry_run,
+                        )
+                        progress.advance()
+
+                await asyncio.gather(*(worker() for _ in range(min(concurrency, len(active)))))
+
+                # Save masterData and make the batch's CSV rows durable after each batch
+                if not dry_run:
+                    save_master(settings, master_data)
+                    LOGGER.info(f"Saved masterData after batch {batch_index + 1}")
+                await grant_writer.checkpoint(fsync=not dry_run)
+
+                summary["processed_batches"] += 1
+
+            tv_client.persist_validation_cache()
+    finally:
+        await grant_writer.close()
+        if journal is not None:
+            journal.close()
+
+    elapsed = time.monotonic() - started
+    summary["elapsed_seconds"] = round(elapsed, 2)
+    summary["users_per_second"] = round(progress.completed / elapsed, 2) if elapsed > 0 else 0.0
+    if journal is not None and (limit is None or limit >= len(csv_users)):
+        # Whole CSV covered; the grant CSV and masterData now hold everything.
+        journal.remove()
     
     # Print summary
     LOGGER.info("Batch processing completed", extra={"extra_data": summary})
@@ -541,6 +763,7 @@ async def main(
     print(f"  - Active users granted: {summary['active_granted']}")
     print(f"  - New grants: {summary['new_grants']}")
     print(f"  - Refreshed: {summary['refreshed']}")
+    print(f"\nThroughput: {summary['users_per_second']} users/s over {summary['elapsed_seconds']}s")
     print("=" * 80 + "\n")
     
     # Also print JSON for programmatic use
@@ -571,7 +794,11 @@ if __name__ == "__main__":
         "--max-batches",
         type=int,
         default=None,
-        help="Maximum number of batches to process this run (default: all)",
+        help=(
+            "Maximum number of batches to process this run (default: all). Finished users "
+            "are journaled so the next run resumes after them; invalid usernames are "
+            "validated again"
+        ),
     )
     parser.add_argument(
         "--dry-run",
@@ -584,6 +811,24 @@ if __name__ == "__main__":
         default=None,
         help="Path to CSV file for granted users (default: granted_users.csv in same directory as --csv)",
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=CONCURRENCY,
+        help="Users validated and granted in parallel (default: 8)",
+    )
+    parser.add_argument(
+        "--csv-flush-rows",
+        type=int,
+        default=GRANT_CSV_FLUSH_ROWS,
+        help="Flush the grant CSV after this many buffered rows (default: 200)",
+    )
+    parser.add_argument(
+        "--csv-flush-seconds",
+        type=float,
+        default=GRANT_CSV_FLUSH_SECONDS,
+        help="Flush the grant CSV at least this often while rows are buffered (default: 2.0)",
+    )
 
     args = parser.parse_args()
     logging.basicConfig(level=logging.INFO)
@@ -604,5 +849,8 @@ if __name__ == "__main__":
             args.max_batches,
             args.dry_run,
             args.grant_csv,
+            args.concurrency,
+            args.csv_flush_rows,
+            args.csv_flush_seconds,
         )
     )
@@ -0,0 +1,128 @@
+"""Compare ``normalize_transactions`` against the original normalizer.
+
+The oracle is ``reference_normalize.normalize_transactions_reference``, the
+pre-fast-path normalizer kept next to this script. Run from the repository root:
+``python benchmarks/bench_normalize.py --rows 100000``. The script exits non-zero if
+the current normalizer disagrees with the oracle on any row.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.config import Settings  # noqa: E402
+from app.logic import normalize_transactions  # noqa: E402
+from reference_normalize import normalize_transactions_reference  # noqa: E402
+
+PRODUCTS = {
+    "101": {"script_id": "SCRIPT_A", "duration_days": 30, "subscription_type": "monthly"},
+    "102": {"script_id": "SCRIPT_A", "duration_days": 365, "subscription_type": "yearly"},
+    "201": {"script_id": "SCRIPT_B", "duration_days": 90},
+}
+
+
+def build_settings() -> Settings:
+    return Settings.model_validate(
+        {
+            "wordpress": {"base_url": "http://wp.invalid"},
+            "tradingview": {"base_url": "http://tv.invalid", "api_key": "benchmark"},
+            "products": PRODUCTS,
+        }
+    )
+
+
+def build_transactions(count: int, seed: int) -> List[Dict]:
+    """Synthetic WordPress rows, including the odd shapes that force the slow path."""
+    rng = random.Random(seed)
+    product_ids = list(PRODUCTS) + ["999"]
+    rows: List[Dict] = []
+    for index in range(count):
+        user_no = rng.randrange(count // 3 + 1)
+        created = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+        row: Dict = {
+            "transaction_id": str(100000 + index),
+            "product_id": rng.choice(product_ids),
+            "created_at": created,
+            "status": rng.choice(["complete", "complete", "complete", "pending", "refunded"]),
+            "amount": rng.choice([49.0, 99, "49.00"]),
+            "gateway": "stripe",
+            "trans_num": f"ch_{index}",
+            "user_id": str(5000 + user_no),
+            "user_email": f"user{user_no}@example.com",
+            "user_login": f"user{user_no}",
+            "user_meta": {
+                "tradingview_username": rng.choice([f"TV_User{user_no}", f" tv_user{user_no} ", ""]),
+                "first_name": "First",
+                "last_name": rng.choice(["Last", None]),
+            },
+        }
+        if index % 7 == 0:
+            row["expires_at"] = rng.choice(["2026-01-01T00:00:00Z", "0000-00-00 00:00:00", ""])
+        if index % 11 == 0:
+            row["user"] = {"id": str(5000 + user_no), "email": f"nested{user_no}@example.com"}
+        if index % 13 == 0:
+            row["user_id"] = 5000 + user_no  # numeric ids are rejected by validation
+        if index % 17 == 0:
+            row["created_at"] = "not-a-date"
+        rows.append(row)
+    return rows
+
+
+def time_call(func: Callable[[], List], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def check_matches(name: str, expected: List[Dict], actual: List) -> None:
+    actual_dump = [txn.model_dump() for txn in actual]
+    if expected != actual_dump:
+        mismatch = next(
+            (i for i, (a, b) in enumerate(zip(expected, actual_dump)) if a != b),
+            min(len(expected), len(actual_dump)),
+        )
+        raise SystemExit(
+            f"{name} output mismatch at index {mismatch}: "
+            f"{len(expected)} reference rows vs {len(actual_dump)} {name} rows"
+        )
+
+
+def main(count: int, repeat: int, seed: int) -> None:
+    settings = build_settings()
+    rows = build_transactions(count, seed)
+
+    reference = [txn.model_dump() for txn in normalize_transactions_reference(rows, settings)]
+    check_matches("fast path", reference, normalize_transactions(rows, settings))
+
+    reference_seconds = time_call(lambda: normalize_transactions_reference(rows, settings), repeat)
+    fast_seconds = time_call(lambda: normalize_transactions(rows, settings), repeat)
+
+    print(f"rows:               {count} ({len(reference)} normalized, outputs identical)")
+    print(f"reference:          {reference_seconds * 1000:.1f} ms  ({count / reference_seconds:,.0f} rows/s)")
+    print(f"fast path:          {fast_seconds * 1000:.1f} ms  ({count / fast_seconds:,.0f} rows/s)")
+    print(f"speedup:            {reference_seconds / fast_seconds:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark transaction normalization")
+    parser.add_argument("--rows", type=int, default=50000, help="Number of synthetic transactions")
+    parser.add_argument("--repeat", type=int, default=5, help="Best-of-N timing runs")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed for the synthetic data")
+
+    args = parser.parse_args()
+    # Skipped rows log a warning each; keep them out of the timings.
+    logging.disable(logging.WARNING)
+
+    main(args.rows, args.repeat, args.seed)
@@ -0,0 +1,126 @@
+"""Compare the streaming TradingView user reader against ``csv.DictReader``.
+
+Run from the repository root: ``python benchmarks/bench_tv_users.py --rows 100000``.
+The synthetic file mirrors ``tv_users_full.csv``, including the inline SVG userpic.
+The script exits non-zero if the readers disagree on any row.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import gc
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.tv_users import iter_tv_users  # noqa: E402
+
+HEADER = ["id", "username", "userpic", "created", "expiration", "fetched_at"]
+USERPIC = (
+    "data:image/svg+xml,%3Csvg%20xmlns=%22http://www.w3.org/2000/svg%22%20viewBox=%220,0,20,20%22"
+    "%20width=%2239%22%20height=%2239%22%3E%3Crect%20height=%2220%22%20width=%2220%22%20fill=%22"
+    "hsl%28{hue},25%25,50%25%29%22/%3E%3Ctext%20fill=%22white%22%20x=%2210%22%20y=%2214.8%22"
+    "%20font-size=%2214%22%20font-family=%22-apple-system,BlinkMacSystemFont,Trebuchet%20MS,"
+    "Roboto,Ubuntu,sans-serif%22%20text-anchor=%22middle%22%3E{letter}%3C/text%3E%3C/svg%3E"
+)
+
+
+def build_csv(path: Path, count: int, seed: int) -> None:
+    rng = random.Random(seed)
+    with path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(HEADER)
+        for index in range(count):
+            username = f"trader_{index}_{rng.randrange(10**6)}"
+            expiration = rng.choice(["", f"2026-{rng.randint(1, 12):02d}-01T00:00:00+00:00"])
+            writer.writerow(
+                [
+                    str(10_000_000 + index),
+                    username,
+                    USERPIC.format(hue=rng.randrange(360), letter=username[0].upper()),
+                    f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00.000000+00:00",
+                    expiration,
+                    "2025-12-30T06:32:20.698019+00:00",
+                ]
+            )
+
+
+def read_dictreader(path: Path) -> List[Tuple[str, ...]]:
+    """What the scripts did before: full dict rows, then keep the short columns."""
+    with path.open("r", encoding="utf-8", newline="") as handle:
+        rows = list(csv.DictReader(handle))
+    return [
+        (row["id"].strip(), row["username"].strip(), row["created"].strip(), row["expiration"].strip())
+        for row in rows
+        if row["username"].strip()
+    ]
+
+
+def read_streaming(path: Path) -> List[Tuple[str, ...]]:
+    return list(iter_tv_users(path))
+
+
+def read_streaming_mmap(path: Path) -> List[Tuple[str, ...]]:
+    return list(iter_tv_users(path, use_mmap=True))
+
+
+def measure(func: Callable[[], List], repeat: int) -> Tuple[float, int]:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main(count: int, repeat: int, seed: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "tv_users_full.csv"
+        build_csv(path, count, seed)
+        size_mb = path.stat().st_size / 1e6
+
+        reference = read_dictreader(path)
+        for name, reader in (("streaming", read_streaming), ("streaming+mmap", read_streaming_mmap)):
+            rows = [tuple(user) for user in reader(path)]
+            if rows != reference:
+                mismatch = next(
+                    (i for i, (a, b) in enumerate(zip(reference, rows)) if a != b),
+                    min(len(reference), len(rows)),
+                )
+                raise SystemExit(f"{name} output differs from csv.DictReader at row {mismatch}")
+
+        print(f"rows:               {count} ({size_mb:.1f} MB, outputs identical)")
+        baseline_seconds, baseline_peak = measure(lambda: read_dictreader(path), repeat)
+        print(
+            f"csv.DictReader:     {baseline_seconds * 1000:.1f} ms  "
+            f"peak {baseline_peak / 1e6:.1f} MB"
+        )
+        for name, reader in (("streaming", read_streaming), ("streaming+mmap", read_streaming_mmap)):
+            seconds, peak = measure(lambda: reader(path), repeat)
+            print(
+                f"{name + ':':<20}{seconds * 1000:.1f} ms  peak {peak / 1e6:.1f} MB  "
+                f"({baseline_seconds / seconds:.2f}x faster, {baseline_peak / peak:.1f}x less memory)"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark TradingView user CSV ingest")
+    parser.add_argument("--rows", type=int, default=100000, help="Number of synthetic users")
+    parser.add_argument("--repeat", type=int, default=3, help="Best-of-N timing runs")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed for the synthetic data")
+
+    args = parser.parse_args()
+    main(args.rows, args.repeat, args.seed)
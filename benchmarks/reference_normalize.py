@@ -0,0 +1,213 @@
+"""The transaction normalizer as it was before the fast path.
+
+``bench_normalize.py`` checks the output of ``app.logic.normalize_transactions``
+against this copy and compares their timings. It only borrows the pydantic models
+from ``app.logic``; the datetime parsing and every field rule are the original
+ones, so changes to the app cannot leak into the oracle.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from pydantic import ValidationError
+
+from app.config import Settings
+from app.logic import NormalizedTransaction, WordPressTransaction, compute_expiry
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_datetime(value: str) -> datetime:
+    if not value:
+        raise ValueError("Empty datetime value")
+
+    candidate = value.strip()
+    attempts = [
+        lambda v: datetime.fromisoformat(v.replace("Z", "+00:00")),
+        lambda v: datetime.strptime(v, "%Y-%m-%d %H:%M:%S"),
+        lambda v: datetime.strptime(v, "%Y-%m-%d %H:%M:%S.%f"),
+    ]
+
+    for attempt in attempts:
+        try:
+            dt = attempt(candidate)
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            return dt
+        except ValueError:
+            continue
+
+    raise ValueError(f"Invalid datetime format: {value}")
+
+
+def _expires_at(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return _parse_datetime(value)
+    except ValueError:
+        return None
+
+
+def normalize_transactions_reference(
+    raw_transactions: Iterable[Dict],
+    settings: Settings,
+) -> List[NormalizedTransaction]:
+    """``app.logic.normalize_transactions`` before the fast path, row for row."""
+    normalized: List[NormalizedTransaction] = []
+    allowed_statuses = {status.lower() for status in settings.wordpress.status_filter}
+
+    for raw in raw_transactions:
+        try:
+            transaction = WordPressTransaction.model_validate(raw)
+        except ValidationError as exc:
+            logger.warning(
+                "transaction.validation_failed",
+                extra={
+                    "extra_data": {
+                        "errors": exc.errors(),
+                        "transaction": raw.get("transaction_id"),
+                    }
+                },
+            )
+            continue
+
+        status_value = (
+            transaction.status
+            or transaction.txn_status
+            or raw.get("status")
+            or raw.get("txn_status")
+            or ""
+        ).strip()
+        if allowed_statuses and status_value.lower() not in allowed_statuses:
+            continue
+
+        product = settings.product_for(transaction.product_id)
+        if not product:
+            logger.warning(
+                "transaction.unknown_product",
+                extra={
+                    "extra_data": {
+                        "transactionId": transaction.transaction_id,
+                        "productId": transaction.product_id,
+                    }
+                },
+            )
+            continue
+
+        try:
+            created_at = _parse_datetime(transaction.created_at)
+        except ValueError:
+            logger.warning(
+                "transaction.invalid_created_at",
+                extra={
+                    "extra_data": {
+                        "transactionId": transaction.transaction_id,
+                        "created_at": transaction.created_at,
+                    }
+                },
+            )
+            continue
+
+        computed_expiry = compute_expiry(
+            created_at,
+            product.duration_days,
+            _expires_at(transaction.expires_at),
+        )
+
+        meta_username = None
+        if transaction.user_meta:
+            candidate = transaction.user_meta.get("tradingview_username")
+            if isinstance(candidate, str):
+                candidate = candidate.strip()
+                if candidate:
+                    meta_username = candidate
+
+        if not meta_username:
+            logger.warning(
+                "transaction.missing_tradingview_username",
+                extra={
+                    "extra_data": {
+                        "transactionId": transaction.transaction_id,
+                        "productId": transaction.product_id,
+                    }
+                },
+            )
+            continue
+
+        username = meta_username
+
+        email = (
+            transaction.user.email if transaction.user and transaction.user.email else None
+        ) or transaction.user_email or raw.get("user_email")
+        if not email:
+            logger.warning(
+                "transaction.missing_email",
+                extra={
+                    "extra_data": {
+                        "transactionId": transaction.transaction_id,
+                        "productId": transaction.product_id,
+                    }
+                },
+            )
+            continue
+
+        wp_user_id = (
+            transaction.user.id if transaction.user and transaction.user.id else None
+        ) or transaction.user_id or raw.get("user_id")
+        if not wp_user_id:
+            logger.warning(
+                "transaction.missing_user_id",
+                extra={
+                    "extra_data": {
+                        "transactionId": transaction.transaction_id,
+                        "productId": transaction.product_id,
+                    }
+                },
+            )
+            continue
+
+        display_name = (
+            transaction.user.display_name if transaction.user and transaction.user.display_name else None
+        ) or transaction.display_name or raw.get("display_name")
+        if not display_name and transaction.user_meta:
+            first = transaction.user_meta.get("first_name")
+            last = transaction.user_meta.get("last_name")
+            parts = [part for part in [first, last] if part]
+            if parts:
+                display_name = " ".join(parts)
+
+        remarks = raw.get("remarks") or raw.get("note")
+        if not remarks:
+            remarks = "paid" if status_value.lower() == "complete" else status_value or "paid"
+
+        wp_username = (
+            transaction.user_login
+            or raw.get("user_login")
+            or (transaction.user.username if transaction.user and transaction.user.username else None)
+            or username
+        )
+
+        normalized.append(
+            NormalizedTransaction(
+                transaction_id=transaction.transaction_id,
+                product_id=transaction.product_id,
+                script_id=product.script_id,
+                username=username,
+                email=email,
+                wp_username=wp_username,
+                wp_user_id=str(wp_user_id),
+                display_name=display_name,
+                created_at=created_at,
+                computed_expiry=computed_expiry,
+                duration_days=product.duration_days,
+                subscription_type=product.subscription_type,
+                stacking_allowed=product.stacking_allowed,
+                remarks=remarks,
+                raw=raw,
+            )
+        )
+    return normalized
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+from app import load_settings
+from app.config import Settings
+from app.locks import masterdata_lock
+from app.sqlite_store import SqliteMasterStore, import_json_masters
+
+LOGGER = logging.getLogger("migrate_masterdata")
+
+
+async def _import_locked(
+    settings: Settings, source_dir: Path, store: SqliteMasterStore
+) -> Dict[str, int]:
+    # Keeps a running sync from appending journal deltas halfway through the import.
+    async with masterdata_lock(settings):
+        return import_json_masters(source_dir, store)
+
+
+def main(
+    config_path: Optional[str] = None,
+    source_dir: Optional[Path] = None,
+    sqlite_path: Optional[Path] = None,
+) -> None:
+    settings = load_settings(config_path)
+    source_dir = source_dir or settings.masterdata_path
+    sqlite_path = sqlite_path or settings.sqlite_path
+
+    LOGGER.info(f"Importing JSON masterData from {source_dir} into {sqlite_path}...")
+    store = SqliteMasterStore(sqlite_path)
+    try:
+        imported = asyncio.run(_import_locked(settings, source_dir, store))
+    finally:
+        store.close()
+
+    LOGGER.info("Migration completed", extra={"extra_data": imported})
+    print(json.dumps({"sqlite_path": str(sqlite_path), "users_per_script": imported}, indent=2))
+    if settings.storage.backend != "sqlite":
+        print('Set "storage": {"backend": "sqlite"} in config.json to use the imported data.')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import masterData/*.json files into SQLite")
+    parser.add_argument(
+        "--config",
+        type=str,
+        default=None,
+        help="Path to config.json (defaults to ./config.json)",
+    )
+    parser.add_argument(
+        "--source-dir",
+        type=Path,
+        default=None,
+        help="Directory containing <script_id>.json files (default: paths.masterdata_dir)",
+    )
+    parser.add_argument(
+        "--sqlite-path",
+        type=Path,
+        default=None,
+        help="Target SQLite database (default: storage.sqlite_path or masterData/masterdata.sqlite3)",
+    )
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    main(args.config, args.source_dir, args.sqlite_path)
@@ -0,0 +1,137 @@
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app import io  # noqa: E402
+from app.config import Settings  # noqa: E402
+from app.storage import (  # noqa: E402
+    AccessRecord,
+    GrantHistoryEntry,
+    ManualReviewEntry,
+    MasterData,
+    RetryEntry,
+)
+
+SCRIPT_ID = "SCRIPT_A"
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+_real_sleep = asyncio.sleep
+
+
+class FakeClock:
+    """Stands in for ``time`` in ``app.io``; ``sleep`` advances it instead of waiting."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.sleeps: List[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    time = perf_counter = monotonic
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+    async def sleep(self, delay: float) -> None:
+        self.sleeps.append(delay)
+        self.now += delay
+        await _real_sleep(0)
+
+
+def make_record(
+    username: str,
+    expiry: datetime,
+    transaction_id: str,
+    history: Optional[List[GrantHistoryEntry]] = None,
+    action: str = "grant_new",
+) -> AccessRecord:
+    if history is None:
+        history = [
+            GrantHistoryEntry(
+                transaction_id=transaction_id,
+                action=action,
+                expires_at=expiry,
+                processed_at=T0,
+            )
+        ]
+    return AccessRecord(
+        wp_user_id=f"wp-{username}",
+        username=username,
+        wp_username=username,
+        email=f"{username}@example.com",
+        product_id="101",
+        script_id=SCRIPT_ID,
+        expiry=expiry,
+        last_transaction_id=transaction_id,
+        last_transaction_at=expiry - timedelta(days=30),
+        history=history,
+    )
+
+
+def dump(master: MasterData) -> dict:
+    return master.model_dump(mode="json")
+
+
+def seed(master: MasterData, users: int = 3) -> None:
+    for index in range(users):
+        username = f"user{index}"
+        master.record_user(username, make_record(username, T0 + timedelta(days=30), f"t{index}"))
+        master.register_processed(f"t{index}")
+    master.last_synced_at = T0
+
+
+def mutate(master: MasterData) -> None:
+    """One sync's worth of changes: a stack, a removal, new IDs and queue entries."""
+    record = master.users["user0"]
+    stacked = record.expiry + timedelta(days=30)
+    history = list(record.history) + [
+        GrantHistoryEntry(
+            transaction_id="n1", action="stack_existing", expires_at=stacked, processed_at=T0
+        )
+    ]
+    master.record_user(
+        "user0", record.model_copy(update={"expiry": stacked, "history": history})
+    )
+    master.remove_user("user1")
+    master.register_processed("n1")
+    master.record_manual_review(ManualReviewEntry(transaction_id="n2", reason="stacking_disabled"))
+    master.record_retry(
+        RetryEntry(
+            transaction_id="n3",
+            payload={"username": "user2"},
+            error_message="HTTP 503",
+            transaction_ids=["n3"],
+            record=make_record("user2", T0 + timedelta(days=60), "n3"),
+            access_from=T0,
+        )
+    )
+    master.last_processed_at = T0 + timedelta(hours=1)
+
+
+@pytest.fixture
+def settings(tmp_path: Path) -> Settings:
+    return Settings.model_validate(
+        {
+            "wordpress": {"base_url": "http://wp.invalid"},
+            "tradingview": {"base_url": "http://tv.invalid", "api_key": "test"},
+            "products": {
+                "101": {"script_id": SCRIPT_ID, "duration_days": 30},
+            },
+            "paths": {"masterdata_dir": str(tmp_path / "masterData")},
+        }
+    )
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(io, "time", clock)
+    monkeypatch.setattr(asyncio, "sleep", clock.sleep)
+    return clock
@@ -0,0 +1,178 @@
+import asyncio
+import csv
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from app.storage import MasterData
+from app.transaction_index import TransactionIndex
+from app.tv_users import TvUser
+from batch_grant import (
+    GRANT_CSV_HEADER,
+    GrantCsvWriter,
+    ResumeJournal,
+    _finished_usernames,
+    _load_grant_csv,
+    _restore_from_journal,
+    build_plan,
+)
+
+from conftest import SCRIPT_ID, T0, make_record
+
+ACTIVE = "2026-06-01"
+EXPIRED = "2025-06-01"
+
+
+def transaction(username: str, expires_at: Optional[str], transaction_id: str) -> Dict:
+    return {
+        "transaction_id": transaction_id,
+        "user_meta": {"tradingview_username": username},
+        "user_email": f"{username}@example.com",
+        "expires_at": expires_at,
+        "created_at": "2025-01-01 00:00:00",
+        "product_id": "101",
+    }
+
+
+def tv_users(*usernames: str) -> List[TvUser]:
+    return [TvUser(str(index), name, "", "") for index, name in enumerate(usernames)]
+
+
+def test_build_plan_classifies_window_and_counts_whole_csv():
+    index = TransactionIndex.build(
+        [
+            transaction("done", ACTIVE, "t0"),
+            transaction("noexpiry", None, "t2"),
+            transaction("lapsed", EXPIRED, "t3"),
+            transaction("alice", ACTIVE, "t4"),
+            transaction("bob", ACTIVE, "t5"),
+            transaction("carol", EXPIRED, "t6"),
+        ]
+    )
+    users = tv_users("Done", "nomatch", "noexpiry", "lapsed", "Alice", "bob", "carol", "ALICE")
+
+    plan = build_plan(users, index, {"done"}, {}, T0, limit=5)
+
+    assert [p.username for p in plan.active] == ["Alice"]
+    assert [(p.index, p.username) for p in plan.expired] == [(3, "lapsed")]
+    assert plan.counts == {
+        "already_processed": 1,
+        "no_transaction_match": 1,
+        "no_expiry": 1,
+        "invalid_expiry": 0,
+    }
+    # Totals cover the whole CSV; the repeated ALICE counts once towards the active total.
+    assert (plan.expired_in_csv, plan.active_in_csv) == (2, 4)
+    assert plan.total_active_users == 2
+
+    whole = build_plan(users, index, {"done"}, {}, T0)
+    assert [p.username for p in whole.active] == ["Alice", "bob"]
+    assert [p.username for p in whole.expired] == ["lapsed", "carol"]
+    assert whole.counts["already_processed"] == 2
+    assert whole.total_active_users == plan.total_active_users
+
+
+def test_build_plan_skips_users_already_in_master_data():
+    index = TransactionIndex.build([transaction("alice", ACTIVE, "t1")])
+    master_users = {"alice": make_record("alice", T0 + timedelta(days=30), "t1")}
+    plan = build_plan(tv_users("Alice"), index, set(), master_users, T0)
+    assert plan.active == []
+    assert plan.counts["already_processed"] == 1
+    assert plan.total_active_users == 0
+
+
+def write_journal(path: Path) -> None:
+    journal = ResumeJournal(path)
+    record = make_record("Alice", T0 + timedelta(days=30), "t1")
+    journal.record(
+        "Alice",
+        "granted",
+        record=record.model_dump(mode="json"),
+        csv_row=["Alice", "alice@example.com", "2026-01-31", "t1", "2025-12-01", "alice_wp"],
+    )
+    journal.record("bob", "expired")
+    journal.record("carol", "invalid_username")
+    journal.close()
+
+
+def restore(
+    entries: Dict, master: MasterData, grant_csv: Path, usernames: Set[str]
+) -> int:
+    async def run() -> int:
+        async with GrantCsvWriter(grant_csv) as writer:
+            return _restore_from_journal(entries, master, writer, usernames)
+
+    return asyncio.run(run())
+
+
+def test_kill_between_journal_and_csv_write_is_restored(tmp_path):
+    journal_path = tmp_path / "granted_users.journal.jsonl"
+    grant_csv = tmp_path / "granted_users.csv"
+    write_journal(journal_path)
+    # The run died after journaling Alice but before her CSV row or masterData save.
+    master = MasterData(script_id=SCRIPT_ID)
+    usernames = _load_grant_csv(grant_csv)
+
+    entries = ResumeJournal(journal_path).load()
+    assert restore(entries, master, grant_csv, usernames) == 1
+
+    assert list(master.users) == ["alice"]
+    assert master.users["alice"].last_transaction_id == "t1"
+    with grant_csv.open(encoding="utf-8", newline="") as handle:
+        rows = list(csv.reader(handle))
+    assert rows[0] == GRANT_CSV_HEADER
+    assert [row[0] for row in rows[1:]] == ["Alice"]
+
+    # Restoring again, as a second restart would, changes nothing.
+    usernames = _load_grant_csv(grant_csv)
+    assert restore(entries, master, grant_csv, usernames) == 0
+    assert len(grant_csv.read_text(encoding="utf-8").splitlines()) == 2
+
+
+def test_invalid_usernames_are_validated_again_on_resume(tmp_path):
+    journal_path = tmp_path / "granted_users.journal.jsonl"
+    write_journal(journal_path)
+    entries = ResumeJournal(journal_path).load()
+    assert _finished_usernames(entries, {"dave"}) == {"alice", "bob", "dave"}
+
+
+def test_torn_final_journal_line_is_ignored(tmp_path):
+    journal_path = tmp_path / "granted_users.journal.jsonl"
+    write_journal(journal_path)
+    with journal_path.open("a", encoding="utf-8") as handle:
+        handle.write('{"username":"erin","outcome":"gran')
+
+    journal = ResumeJournal(journal_path)
+    assert list(journal.load()) == ["alice", "bob", "carol"]
+
+    # The next run appends after the torn line and still reads its own entries.
+    journal.record("frank", "expired")
+    journal.close()
+    assert list(ResumeJournal(journal_path).load()) == ["alice", "bob", "carol", "frank"]
+
+
+def read_rows(path: Path) -> List[List[str]]:
+    with path.open(encoding="utf-8", newline="") as handle:
+        return list(csv.reader(handle))
+
+
+def test_checkpoint_flushes_every_queued_row(tmp_path):
+    grant_csv = tmp_path / "granted_users.csv"
+    rows = [[f"user{n}", "", "2026-01-31", f"t{n}", "", ""] for n in range(3)]
+
+    async def run() -> None:
+        writer = GrantCsvWriter(grant_csv, flush_rows=1000, flush_seconds=3600)
+        writer.open()
+        for row in rows:
+            writer.write(row)
+        # Queued only: the writer task has not run and nothing reached the file.
+        assert grant_csv.stat().st_size == 0
+        await writer.checkpoint(fsync=False)
+        assert read_rows(grant_csv) == [GRANT_CSV_HEADER] + rows
+        assert writer.rows_written == 3
+
+        writer.write(rows[0])
+        await writer.close()
+        assert read_rows(grant_csv) == [GRANT_CSV_HEADER] + rows + rows[:1]
+
+    asyncio.run(run())
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import httpx
+import pytest
+
+from app import io
+from app.config import CircuitBreakerConfig, Settings
+from app.io import CircuitBreaker, CircuitOpenError, TradingViewClient
+from app.retry import drain_retry_queue
+from app.storage import MasterData, RetryEntry, load_master, save_master
+
+from conftest import SCRIPT_ID, T0, make_record
+
+
+@pytest.fixture(autouse=True)
+def fresh_registries():
+    io._CIRCUIT_BREAKERS.clear()
+    io._RATE_LIMITERS.clear()
+    yield
+    io._CIRCUIT_BREAKERS.clear()
+    io._RATE_LIMITERS.clear()
+
+
+def make_breaker(settings: Settings, half_open_max_calls: int = 1) -> CircuitBreaker:
+    config = CircuitBreakerConfig(
+        failure_threshold=3, recovery_seconds=60, half_open_max_calls=half_open_max_calls
+    )
+    return CircuitBreaker("tradingview.grant", config, settings)
+
+
+def trip(breaker: CircuitBreaker) -> None:
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_consecutive_failures_open_the_circuit(settings, clock, caplog):
+    breaker = make_breaker(settings)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.before_call() is None
+
+    with caplog.at_level(logging.WARNING, logger="app.io"):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert [r.getMessage() for r in caplog.records] == ["circuit.state_changed"]
+
+
+def test_open_circuit_fails_fast_until_recovery(settings, clock):
+    breaker = make_breaker(settings)
+    trip(breaker)
+    clock.advance(59)
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_admits_a_capped_number_of_trials(settings, clock):
+    breaker = make_breaker(settings, half_open_max_calls=2)
+    trip(breaker)
+    clock.advance(60)
+    assert not breaker.is_open
+
+    first, second = breaker.before_call(), breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert first == second is not None
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.release(first)
+    assert breaker.before_call() == first
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.before_call() is None
+
+
+def test_failed_trial_reopens_the_circuit(settings, clock):
+    breaker = make_breaker(settings)
+    trip(breaker)
+    clock.advance(60)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.is_open
+
+
+def test_stale_trial_token_does_not_free_a_slot(settings, clock):
+    breaker = make_breaker(settings)
+    trip(breaker)
+    clock.advance(60)
+    stale = breaker.before_call()
+    breaker.record_failure()
+
+    clock.advance(60)
+    current = breaker.before_call()
+    assert current != stale
+    # The first trial's finally block runs late, after the next window opened.
+    breaker.release(stale)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.release(current)
+    assert breaker.before_call() == current
+
+
+def mock_client(settings: Settings, statuses: List[int]) -> TradingViewClient:
+    responses = iter(statuses)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(next(responses), headers={"Retry-After": "1"})
+
+    client = TradingViewClient(settings)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_throttled_response_is_neither_success_nor_failure(settings, clock):
+    settings.circuit_breaker.failure_threshold = 2
+    client = mock_client(settings, [500, 429, 500])
+
+    async def send_all() -> List[int]:
+        statuses = []
+        for _ in range(3):
+            response = await client._request("POST", "http://tv.invalid/grant", circuit="grant")
+            statuses.append(response.status_code)
+        return statuses
+
+    # A success would reset the count and a failure would open the circuit early.
+    assert asyncio.run(send_all()) == [500, 429, 500]
+    assert client.circuit_open("grant")
+    assert client.rate_limiter.throttled == 1
+
+
+def test_open_circuit_defers_retry_without_spending_an_attempt(settings, clock):
+    requests: List[httpx.Request] = []
+    client = TradingViewClient(settings)
+    client._client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: requests.append(request))
+    )
+    for _ in range(settings.circuit_breaker.failure_threshold):
+        client._breaker("grant").record_failure()
+
+    expiry = T0 + timedelta(days=30)
+    master = MasterData(script_id=SCRIPT_ID)
+    master.record_retry(
+        RetryEntry(
+            transaction_id="t1",
+            payload={"username": "alice", "expiry": expiry.date().isoformat()},
+            error_message="HTTP 503",
+            attempts=1,
+            next_attempt_at=T0,
+            transaction_ids=["t1"],
+            record=make_record("alice", expiry, "t1"),
+            access_from=T0,
+        )
+    )
+    save_master(settings, master)
+
+    now = datetime.now(tz=timezone.utc)
+    summary = asyncio.run(drain_retry_queue(settings, tv_client=client, now=now))
+
+    assert summary["deferred_circuit_open"] == 1
+    assert requests == []
+    (entry,) = load_master(settings, SCRIPT_ID).retry_queue
+    assert (entry.attempts, entry.next_attempt_at) == (1, T0)
@@ -0,0 +1,95 @@
+import random
+from typing import Dict, List
+
+import pytest
+
+from app.fuzzy import FuzzyMatch, UsernameIndex, levenshtein
+
+
+def full_levenshtein(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            )
+        previous = current
+    return previous[-1]
+
+
+def random_names(
+    rng: random.Random, count: int, alphabet: str = "abc", shortest: int = 0
+) -> List[str]:
+    return ["".join(rng.choices(alphabet, k=rng.randint(shortest, 12))) for _ in range(count)]
+
+
+def test_banded_distance_matches_the_full_table():
+    rng = random.Random(3)
+    words = random_names(rng, 120)
+    for a in words:
+        for b in rng.sample(words, 20):
+            exact = full_levenshtein(a, b)
+            assert levenshtein(a, b) == exact
+            for bound in range(5):
+                assert levenshtein(a, b, bound) == min(exact, bound + 1), (a, b, bound)
+
+
+def linear_nearest(names: List[str], query: str, limit: int) -> Dict[int, List[FuzzyMatch]]:
+    """nearest() for max_distance 1..3, by scoring every name with the full table."""
+    scored = sorted((full_levenshtein(query, name), name) for name in set(names) if name != query)
+    results = {}
+    for max_distance in (1, 2, 3):
+        cap = min(max_distance, max(1, len(query) // 4))
+        matches = [FuzzyMatch(name, distance) for distance, name in scored if distance <= cap]
+        results[max_distance] = matches[:limit]
+    return results
+
+
+def test_nearest_matches_a_linear_scan():
+    rng = random.Random(11)
+    names = random_names(rng, 400, alphabet="abcde", shortest=1)
+    index = UsernameIndex(names)
+    for query in random_names(rng, 60, alphabet="abcde", shortest=1) + rng.sample(names, 20):
+        for max_distance, expected in linear_nearest(names, query, 5).items():
+            assert index.nearest(query, max_distance=max_distance) == expected, (
+                query,
+                max_distance,
+            )
+
+
+def test_single_character_query_scans_by_length():
+    # No candidate shares a trigram with "a", so only the by-length scan finds them.
+    index = UsernameIndex(["b", "ab", "ba", "bb", "abc", "a"])
+    assert index.nearest("a", limit=10) == [
+        FuzzyMatch("ab", 1),
+        FuzzyMatch("b", 1),
+        FuzzyMatch("ba", 1),
+    ]
+    assert index.nearest("A", include_exact=True)[0] == FuzzyMatch("a", 0)
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("alicx", [FuzzyMatch("alice", 1)]),  # len 5: capped at 1 edit
+        ("alexandxx", [FuzzyMatch("alexander", 2)]),  # len 9: 2 edits allowed
+        ("bo", [FuzzyMatch("bob", 1)]),  # short names still get 1 edit
+    ],
+)
+def test_distance_is_capped_at_a_quarter_of_the_query(query, expected):
+    index = UsernameIndex(["alice", "alicxyz", "alexander", "bob", "al"])
+    assert index.nearest(query, max_distance=2) == expected
+    # Two edits from "alice", which a five-letter query does not allow.
+    assert index.nearest("alixx", max_distance=2) == []
+
+
+def test_nearest_is_case_insensitive_and_returns_display_names():
+    index = UsernameIndex([" TraderJoe ", "traderjoe", "TraderJim"])
+    assert len(index) == 2
+    assert "TRADERJOE" in index
+    assert index.nearest("traderjoo") == [FuzzyMatch("TraderJoe", 1), FuzzyMatch("TraderJim", 2)]
+    assert index.nearest("TraderJoe", limit=1) == [FuzzyMatch("TraderJim", 2)]
+    assert index.nearest("TraderJoe", include_exact=True)[0] == FuzzyMatch("TraderJoe", 0)
+    assert index.nearest("", limit=5) == []
+    assert index.nearest("traderjoo", limit=0) == []
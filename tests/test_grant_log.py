@@ -0,0 +1,200 @@
+import asyncio
+import logging
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from app.io import ApiError
+from app.locks import MasterDataLock
+from app.storage import GrantHistoryEntry, GrantIntent, GrantLog, JsonMasterStore, apply_grant
+from app.sync import _recover_grants
+
+from conftest import SCRIPT_ID, T0, make_record
+
+# alice holds access until E0; the crashed run stacked 30 days on top of it.
+E0 = T0 + timedelta(days=30)
+E1 = E0 + timedelta(days=30)
+
+
+class FakeTradingView:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.grants: List[Dict[str, Any]] = []
+
+    async def grant_access(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self.grants.append(payload)
+        if self.fail:
+            raise ApiError("TradingView unavailable", status_code=503)
+        return {"status": "ok"}
+
+
+def seed_store(directory: Path) -> JsonMasterStore:
+    store = JsonMasterStore(directory)
+    master = store.load(SCRIPT_ID)
+    master.record_user("alice", make_record("alice", E0, "t1"))
+    master.register_processed("t1")
+    store.save(master)
+    return store
+
+
+def stack_intent(grant_log: GrantLog) -> GrantIntent:
+    """The intent the sync loop writes before stacking transaction t2 onto alice."""
+    history = [
+        GrantHistoryEntry(
+            transaction_id="t2", action="stack_existing", expires_at=E1, processed_at=T0
+        )
+    ]
+    return GrantIntent(
+        id=grant_log.new_intent_id(),
+        script_id=SCRIPT_ID,
+        username="alice",
+        transaction_ids=["t2"],
+        payload={"username": "alice", "expiry": E1.isoformat()},
+        record=make_record("alice", E1, "t2", history=history),
+    )
+
+
+def write_intent(grant_log: GrantLog, intent: GrantIntent) -> None:
+    asyncio.run(grant_log.intent(intent))
+
+
+def crash(grant_log: GrantLog) -> GrantLog:
+    """Drop the handle without a checkpoint and reopen the log as a new process would."""
+    grant_log.close()
+    return GrantLog(grant_log.path, fsync=False)
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> JsonMasterStore:
+    return seed_store(tmp_path / "masterData")
+
+
+@pytest.fixture
+def grant_log(tmp_path: Path) -> GrantLog:
+    grant_log = GrantLog(tmp_path / "masterData" / "grants.wal.jsonl", fsync=False)
+    yield grant_log
+    grant_log.close()
+
+
+def test_intent_without_done_is_returned_unconfirmed(store, grant_log):
+    intent = stack_intent(grant_log)
+    write_intent(grant_log, intent)
+
+    master = store.load(SCRIPT_ID)
+    recovered, unconfirmed = crash(grant_log).replay({SCRIPT_ID: master})
+
+    assert recovered == 0
+    assert [item.id for item in unconfirmed] == [intent.id]
+    assert master.users["alice"].expiry == E0
+    assert not master.is_processed("t2")
+
+
+def test_recovery_resends_unconfirmed_grant_once(settings, store, grant_log):
+    intent = stack_intent(grant_log)
+    write_intent(grant_log, intent)
+    grant_log = crash(grant_log)
+
+    masters = {SCRIPT_ID: store.load(SCRIPT_ID)}
+    tv_client = FakeTradingView()
+    summary: Dict[str, Any] = {}
+    keep = asyncio.run(_recover_grants(settings, tv_client, grant_log, masters, summary))
+
+    assert not keep
+    assert tv_client.grants == [intent.payload]
+    assert summary["grants_resent"] == 1
+    alice = masters[SCRIPT_ID].users["alice"]
+    assert alice.expiry == E1
+    assert [entry.transaction_id for entry in alice.history] == ["t1", "t2"]
+
+    # The resend logged "done": a second crash before saving replays, never resends.
+    recovered, unconfirmed = crash(grant_log).replay({SCRIPT_ID: store.load(SCRIPT_ID)})
+    assert (recovered, unconfirmed) == (1, [])
+
+
+def test_failed_resend_goes_to_retry_queue(settings, store, grant_log):
+    intent = stack_intent(grant_log)
+    write_intent(grant_log, intent)
+
+    masters = {SCRIPT_ID: store.load(SCRIPT_ID)}
+    summary: Dict[str, Any] = {}
+    asyncio.run(
+        _recover_grants(settings, FakeTradingView(fail=True), crash(grant_log), masters, summary)
+    )
+
+    master = masters[SCRIPT_ID]
+    assert summary["grants_requeued"] == 1
+    assert [entry.transaction_ids for entry in master.retry_queue] == [["t2"]]
+    assert master.is_processed("t2")
+    assert master.users["alice"].expiry == E0
+
+
+def test_done_before_save_is_applied_once(store, grant_log):
+    intent = stack_intent(grant_log)
+    write_intent(grant_log, intent)
+    grant_log.done(intent.id)
+    # The sync loop applied the grant in memory, then crashed before save_master.
+    apply_grant(store.load(SCRIPT_ID), intent, T0)
+
+    grant_log = crash(grant_log)
+    master = store.load(SCRIPT_ID)
+    assert grant_log.replay({SCRIPT_ID: master}) == (1, [])
+    alice = master.users["alice"]
+    assert alice.expiry == E1
+    assert [entry.transaction_id for entry in alice.history] == ["t1", "t2"]
+
+    # Replaying the same master again, or after it was saved, must not stack again.
+    assert grant_log.replay({SCRIPT_ID: master}) == (0, [])
+    store.save(master)
+    reloaded = store.load(SCRIPT_ID)
+    assert crash(grant_log).replay({SCRIPT_ID: reloaded}) == (0, [])
+    assert reloaded.users["alice"].expiry == E1
+    assert len(reloaded.users["alice"].history) == 2
+
+
+def test_torn_final_line_is_skipped(store, grant_log, caplog):
+    intent = stack_intent(grant_log)
+    write_intent(grant_log, intent)
+    grant_log.done(intent.id)
+    grant_log.close()
+    with grant_log.path.open("a", encoding="utf-8") as handle:
+        handle.write('{"op":"intent","id":"torn","script_id":"SCR')
+
+    master = store.load(SCRIPT_ID)
+    with caplog.at_level(logging.WARNING, logger="app.storage"):
+        assert crash(grant_log).replay({SCRIPT_ID: master}) == (1, [])
+    assert master.users["alice"].expiry == E1
+    assert any(record.getMessage() == "grant_log.corrupt_line" for record in caplog.records)
+
+
+def test_checkpoint_truncates_and_log_stays_appendable(store, grant_log):
+    first = stack_intent(grant_log)
+    write_intent(grant_log, first)
+    grant_log.done(first.id)
+
+    grant_log.checkpoint()
+    assert grant_log.path.stat().st_size == 0
+    assert grant_log.replay({SCRIPT_ID: store.load(SCRIPT_ID)}) == (0, [])
+
+    second = stack_intent(grant_log)
+    write_intent(grant_log, second)
+    assert grant_log.path.read_text(encoding="utf-8").startswith('{"op":"intent"')
+    _, unconfirmed = crash(grant_log).replay({SCRIPT_ID: store.load(SCRIPT_ID)})
+    assert [item.id for item in unconfirmed] == [second.id]
+
+
+def test_shared_log_requires_masterdata_lock(tmp_path, store):
+    lock_path = tmp_path / "masterData" / "masterdata.lock"
+    grant_log = GrantLog(tmp_path / "masterData" / "grants.wal.jsonl", False, lock_path)
+    masters = {SCRIPT_ID: store.load(SCRIPT_ID)}
+    with pytest.raises(RuntimeError):
+        grant_log.replay(masters)
+
+    async def checkpoint_locked() -> None:
+        async with MasterDataLock(lock_path):
+            grant_log.replay(masters)
+            grant_log.checkpoint()
+
+    asyncio.run(checkpoint_locked())
+    grant_log.close()
@@ -0,0 +1,78 @@
+import logging
+from pathlib import Path
+
+from app.config import DedupeConfig
+from app.storage import JsonMasterStore
+
+from conftest import SCRIPT_ID, dump, mutate, seed
+
+
+def test_saves_append_deltas_that_replay_on_load(tmp_path: Path):
+    store = JsonMasterStore(tmp_path)
+    master = store.load(SCRIPT_ID)
+    seed(master)
+    store.save(master)
+    snapshot = (tmp_path / f"{SCRIPT_ID}.json").read_text(encoding="utf-8")
+
+    master = store.load(SCRIPT_ID)
+    mutate(master)
+    store.save(master)
+
+    journal = tmp_path / f"{SCRIPT_ID}.journal.jsonl"
+    assert len(journal.read_text(encoding="utf-8").splitlines()) == 1
+    assert (tmp_path / f"{SCRIPT_ID}.json").read_text(encoding="utf-8") == snapshot
+    assert dump(store.load(SCRIPT_ID)) == dump(master)
+
+def test_clean_master_is_not_journaled(tmp_path: Path):
+    store = JsonMasterStore(tmp_path)
+    master = store.load(SCRIPT_ID)
+    seed(master)
+    store.save(master)
+    store.save(store.load(SCRIPT_ID))
+    assert not (tmp_path / f"{SCRIPT_ID}.journal.jsonl").exists()
+
+def test_torn_final_line_keeps_earlier_deltas(tmp_path: Path, caplog):
+    store = JsonMasterStore(tmp_path)
+    master = store.load(SCRIPT_ID)
+    seed(master)
+    store.save(master)
+    master = store.load(SCRIPT_ID)
+    mutate(master)
+    store.save(master)
+    with (tmp_path / f"{SCRIPT_ID}.journal.jsonl").open("a", encoding="utf-8") as handle:
+        handle.write('{"users":{"user2":{"wp_user_id"')
+
+    with caplog.at_level(logging.WARNING, logger="app.storage"):
+        reloaded = store.load(SCRIPT_ID)
+    assert dump(reloaded) == dump(master)
+    assert any(
+        record.getMessage() == "masterdata.journal_corrupt_line" for record in caplog.records
+    )
+
+def test_evictions_replay_in_order(tmp_path: Path):
+    store = JsonMasterStore(tmp_path)
+    master = store.load(SCRIPT_ID)
+    master.configure_dedupe(DedupeConfig(max_entries=3))
+    seed(master)
+    store.save(master)
+
+    master = store.load(SCRIPT_ID)
+    master.configure_dedupe(DedupeConfig(max_entries=3))
+    master.register_processed("t3")
+    master.register_processed("t4")
+    store.save(master)
+
+    assert list(store.load(SCRIPT_ID).processed_transactions) == ["t2", "t3", "t4"]
+
+def test_compaction_folds_journal_into_snapshot(tmp_path: Path):
+    store = JsonMasterStore(tmp_path, compact_after=2)
+    master = store.load(SCRIPT_ID)
+    seed(master)
+    store.save(master)
+    for txn_id in ("t20", "t21"):
+        master = store.load(SCRIPT_ID)
+        master.register_processed(txn_id)
+        store.save(master)
+
+    assert not (tmp_path / f"{SCRIPT_ID}.journal.jsonl").exists()
+    assert dump(store.load(SCRIPT_ID)) == dump(master)
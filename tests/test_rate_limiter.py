@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+from app.config import RateLimitConfig
+from app.io import AdaptiveRateLimiter, _retry_after_seconds
+
+
+def make_limiter(**overrides) -> AdaptiveRateLimiter:
+    return AdaptiveRateLimiter(RateLimitConfig(**{"requests_per_second": 10, "burst": 10, **overrides}))
+
+
+def acquire_all(limiter: AdaptiveRateLimiter, count: int) -> None:
+    async def run() -> None:
+        await asyncio.gather(*(limiter.acquire() for _ in range(count)))
+
+    asyncio.run(run())
+
+
+def test_throttle_halves_rate_once_per_pause_window(clock):
+    limiter = make_limiter()
+    limiter.on_throttle(2)
+    limiter.on_throttle(2)
+    assert limiter.rate == 5
+    assert limiter.throttled == 2
+
+    clock.advance(2)
+    limiter.on_throttle(2)
+    assert limiter.rate == 2.5
+
+
+def test_throttle_never_drops_below_min_rate(clock):
+    limiter = make_limiter(min_requests_per_second=1)
+    for _ in range(10):
+        limiter.on_throttle(0)
+        clock.advance(1)
+    assert limiter.rate == 1
+
+
+def test_throttle_pauses_acquire_for_retry_after(clock):
+    limiter = make_limiter()
+    limiter.on_throttle(3)
+    acquire_all(limiter, 1)
+    assert clock.sleeps == [3]
+
+
+@pytest.mark.parametrize("retry_after, pause", [(None, 5), (10_000, 300)])
+def test_throttle_pause_defaults_and_is_capped(clock, retry_after, pause):
+    limiter = make_limiter()
+    limiter.on_throttle(retry_after)
+    acquire_all(limiter, 1)
+    assert clock.sleeps == [pause]
+
+
+def test_success_recovers_rate_up_to_the_ceiling(clock):
+    limiter = make_limiter(increase_per_success=1)
+    limiter.on_throttle(0)
+    assert limiter.rate == 5
+    for _ in range(3):
+        limiter.on_success()
+    assert limiter.rate == 8
+    for _ in range(5):
+        limiter.on_success()
+    assert limiter.rate == 10
+
+
+def test_acquire_spaces_requests_once_burst_is_spent(clock):
+    limiter = make_limiter(requests_per_second=2, burst=1)
+    acquire_all(limiter, 3)
+    assert clock.sleeps == [0.5, 0.5]
+
+
+def test_stats_track_queue_depth(clock):
+    limiter = make_limiter(requests_per_second=1, burst=1)
+    # All three callers queue behind the pause.
+    limiter.on_throttle(1)
+    acquire_all(limiter, 3)
+    assert limiter.stats() == {
+        "rate": 0.5,
+        "queue_depth": 0,
+        "peak_queue_depth": 3,
+        "throttled": 1,
+    }
+    limiter.reset_peak()
+    assert limiter.stats()["peak_queue_depth"] == 0
+
+
+@pytest.mark.parametrize(
+    "value, expected", [("7", 7.0), (" 1.5 ", 1.5), ("-3", 0.0), ("soon", None), (None, None)]
+)
+def test_retry_after_seconds(value, expected):
+    headers = {"Retry-After": value} if value is not None else {}
+    assert _retry_after_seconds(httpx.Response(429, headers=headers)) == expected
+
+
+def test_retry_after_http_date():
+    retry_at = datetime.now(tz=timezone.utc) + timedelta(seconds=30)
+    response = httpx.Response(429, headers={"Retry-After": format_datetime(retry_at, usegmt=True)})
+    assert 28 <= _retry_after_seconds(response) <= 30
+
+    past = format_datetime(retry_at - timedelta(hours=1), usegmt=True)
+    assert _retry_after_seconds(httpx.Response(429, headers={"Retry-After": past})) == 0
@@ -0,0 +1,176 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from app.config import RetryConfig, Settings
+from app.io import ApiError, CircuitOpenError
+from app.retry import covers_transactions, drain_retry_queue, rederive_record, retry_delay
+from app.storage import GrantHistoryEntry, MasterData, RetryEntry, load_master, save_master
+
+from conftest import SCRIPT_ID, T0, make_record
+
+# alice held access until E0 when her 30-day extension (t2) failed to send.
+E0 = T0 + timedelta(days=30)
+NOW = datetime.now(tz=timezone.utc) + timedelta(days=1)
+
+
+class FakeTradingView:
+    def __init__(self, error: Optional[Exception] = None):
+        self.error = error
+        self.grants: List[Dict[str, Any]] = []
+
+    async def grant_access(self, payload: Dict[str, Any], retries: Optional[int] = None) -> Dict:
+        self.grants.append(payload)
+        if self.error is not None:
+            raise self.error
+        return {"status": "ok"}
+
+
+def failed_extension(attempts: int = 0, access_from: Optional[datetime] = E0) -> RetryEntry:
+    expiry = E0 + timedelta(days=30)
+    history = [
+        GrantHistoryEntry(
+            transaction_id="t2", action="stack_existing", expires_at=expiry, processed_at=T0
+        )
+    ]
+    return RetryEntry(
+        transaction_id="t2",
+        payload={"username": "alice", "expiry": expiry.date().isoformat()},
+        error_message="HTTP 503",
+        attempts=attempts,
+        next_attempt_at=T0,
+        transaction_ids=["t2"],
+        record=make_record("alice", expiry, "t2", history=history, action="stack_existing"),
+        access_from=access_from,
+    )
+
+
+def seed_master(settings: Settings, entry: RetryEntry, expiry: datetime = E0) -> None:
+    master = MasterData(script_id=SCRIPT_ID)
+    master.record_user("alice", make_record("alice", expiry, "t1"))
+    master.register_processed("t1")
+    master.record_retry(entry)
+    save_master(settings, master)
+
+
+def drain(settings: Settings, tv_client: FakeTradingView) -> Dict:
+    return asyncio.run(drain_retry_queue(settings, tv_client=tv_client, now=NOW))
+
+
+def test_retry_delay_doubles_up_to_the_cap():
+    config = RetryConfig(base_delay_seconds=60, max_delay_seconds=600)
+    assert [retry_delay(config, n).total_seconds() for n in range(5)] == [60, 120, 240, 480, 600]
+    assert retry_delay(config, 1000) == timedelta(seconds=600)
+
+
+def test_failed_retry_is_rescheduled_with_backoff(settings):
+    seed_master(settings, failed_extension())
+    summary = drain(settings, FakeTradingView(ApiError("HTTP 503", status_code=503)))
+
+    assert summary["rescheduled"] == 1
+    (entry,) = load_master(settings, SCRIPT_ID).retry_queue
+    assert entry.attempts == 1
+    assert entry.next_attempt_at == NOW + retry_delay(settings.retry, 1)
+
+
+def test_open_circuit_leaves_attempts_unchanged(settings):
+    seed_master(settings, failed_extension(attempts=2))
+    summary = drain(settings, FakeTradingView(CircuitOpenError("tradingview.grant circuit is open")))
+
+    assert summary["deferred_circuit_open"] == 1
+    assert summary["attempted"] == 0
+    (entry,) = load_master(settings, SCRIPT_ID).retry_queue
+    assert entry.attempts == 2
+    assert entry.next_attempt_at == T0
+
+
+def test_exhausted_retry_moves_to_manual_review(settings):
+    settings.retry.max_attempts = 3
+    seed_master(settings, failed_extension(attempts=2))
+    summary = drain(settings, FakeTradingView(ApiError("HTTP 503", status_code=503)))
+
+    assert summary["exhausted"] == 1
+    master = load_master(settings, SCRIPT_ID)
+    assert master.retry_queue == []
+    assert [(e.transaction_id, e.reason) for e in master.manual_review] == [
+        ("t2", "retry_exhausted")
+    ]
+    assert master.is_processed("t2")
+
+
+def test_entry_already_covered_by_a_later_sync_is_dropped(settings):
+    entry = failed_extension()
+    seed_master(settings, entry)
+    master = load_master(settings, SCRIPT_ID)
+    master.record_user("alice", entry.record)
+    save_master(settings, master)
+
+    tv_client = FakeTradingView()
+    summary = drain(settings, tv_client)
+
+    assert summary["superseded"] == 1
+    assert tv_client.grants == []
+    master = load_master(settings, SCRIPT_ID)
+    assert master.retry_queue == []
+    assert master.is_processed("t2")
+
+
+def test_covers_transactions_checks_history_and_last_transaction():
+    record = make_record("alice", E0, "t1")
+    assert covers_transactions(record, ["t1"])
+    assert not covers_transactions(record, ["t1", "t2"])
+
+
+def test_success_stacks_on_expiry_that_moved_since_the_failure(settings):
+    # Another grant extended alice by 10 days after t2 failed.
+    moved = E0 + timedelta(days=10)
+    seed_master(settings, failed_extension(), expiry=moved)
+    tv_client = FakeTradingView()
+    summary = drain(settings, tv_client)
+
+    expected = moved + timedelta(days=30)
+    assert summary["rederived"] == 1
+    assert summary["succeeded"] == 1
+    assert tv_client.grants == [{"username": "alice", "expiry": expected.date().isoformat()}]
+    alice = load_master(settings, SCRIPT_ID).users["alice"]
+    assert alice.expiry == expected
+    assert [(h.transaction_id, h.expires_at) for h in alice.history] == [
+        ("t1", moved),
+        ("t2", expected),
+    ]
+
+
+def test_rederive_keeps_access_from_when_expiry_lapsed_before_it():
+    entry = failed_extension()
+    lapsed = make_record("alice", E0 - timedelta(days=5), "t1")
+    assert rederive_record(entry, lapsed) is entry.record
+
+
+def test_rederive_keeps_the_newer_last_transaction():
+    entry = failed_extension()
+    newer = make_record("alice", E0 + timedelta(days=90), "t9")
+    record = rederive_record(entry, newer)
+    assert record.last_transaction_id == "t9"
+    assert record.expiry == E0 + timedelta(days=120)
+
+
+@pytest.mark.parametrize("existing_days, expected", [(10, True), (40, False)])
+def test_rederive_without_access_from_only_extends(existing_days, expected):
+    entry = failed_extension(access_from=None)
+    existing = make_record("alice", E0 + timedelta(days=existing_days), "t1")
+    assert (rederive_record(entry, existing) is entry.record) is expected
+
+
+def test_stale_entry_without_access_from_goes_to_manual_review(settings):
+    seed_master(settings, failed_extension(access_from=None), expiry=E0 + timedelta(days=40))
+    tv_client = FakeTradingView()
+    summary = drain(settings, tv_client)
+
+    assert summary["manual_review"] == 1
+    assert tv_client.grants == []
+    master = load_master(settings, SCRIPT_ID)
+    assert [(e.transaction_id, e.reason) for e in master.manual_review] == [
+        ("t2", "retry_stale_expiry")
+    ]
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pytest
+
+from app.sqlite_store import SqliteMasterStore
+from app.storage import MasterData
+
+from conftest import SCRIPT_ID, T0, dump, make_record, mutate, seed
+
+
+@pytest.fixture
+def sqlite_store(tmp_path: Path):
+    store = SqliteMasterStore(tmp_path / "masterdata.sqlite3")
+    yield store
+    store.close()
+
+def test_round_trip_after_incremental_save(sqlite_store):
+    master = sqlite_store.load(SCRIPT_ID)
+    seed(master)
+    sqlite_store.save(master)
+
+    master = sqlite_store.load(SCRIPT_ID)
+    mutate(master)
+    sqlite_store.save(master)
+
+    assert dump(sqlite_store.load(SCRIPT_ID)) == dump(master)
+
+def test_save_writes_only_changed_rows(sqlite_store):
+    master = sqlite_store.load(SCRIPT_ID)
+    seed(master, users=50)
+    sqlite_store.save(master)
+
+    master = sqlite_store.load(SCRIPT_ID)
+    mutate(master)
+    before = sqlite_store._conn.total_changes
+    sqlite_store.save(master)
+    # master row, user0 upsert + history append, user1 and its history deleted,
+    # one processed ID, one retry row, one manual-review row.
+    assert sqlite_store._conn.total_changes - before == 8
+
+    before = sqlite_store._conn.total_changes
+    sqlite_store.save(master)
+    assert sqlite_store._conn.total_changes == before
+
+def test_rewritten_history_replaces_stored_rows(sqlite_store):
+    master = sqlite_store.load(SCRIPT_ID)
+    seed(master)
+    sqlite_store.save(master)
+
+    master = sqlite_store.load(SCRIPT_ID)
+    record = master.users["user0"]
+    master.record_user("user0", record.model_copy(update={"history": []}))
+    sqlite_store.save(master)
+
+    assert sqlite_store.load(SCRIPT_ID).users["user0"].history == []
+
+def test_master_not_loaded_from_store_replaces_rows(sqlite_store):
+    master = sqlite_store.load(SCRIPT_ID)
+    seed(master)
+    sqlite_store.save(master)
+
+    fresh = MasterData(script_id=SCRIPT_ID)
+    fresh.record_user("other", make_record("other", T0, "t99"))
+    sqlite_store.save(fresh)
+
+    assert dump(sqlite_store.load(SCRIPT_ID)) == dump(fresh)
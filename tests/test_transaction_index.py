@@ -0,0 +1,177 @@
+import json
+import os
+import random
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pytest
+
+from app.transaction_index import (
+    MATCHED_VIA_LOGIN,
+    MATCHED_VIA_USERNAME,
+    TransactionIndex,
+)
+
+
+def txn(
+    transaction_id: str,
+    username: str = "alice",
+    expires_at: Optional[str] = None,
+    email: str = "",
+    user_login: str = "",
+    user_id: str = "",
+) -> Dict:
+    return {
+        "transaction_id": transaction_id,
+        "user_meta": {"tradingview_username": username},
+        "user_login": user_login,
+        "user_id": user_id,
+        "user_email": email,
+        "expires_at": expires_at,
+    }
+
+
+def winner(*transactions: Dict) -> str:
+    return TransactionIndex.build(transactions).get("alice").transaction_id
+
+
+def old_winners(transactions: List[Dict]) -> Dict[str, str]:
+    """The tradingview_username half of compare_access.load_wordpress_transactions."""
+    lookup: Dict[str, Dict] = {}
+    for row in transactions:
+        email = (row.get("user_email") or "").strip()
+        expires_at = (row.get("expires_at") or "").strip()
+        expiry = datetime.strptime(expires_at, "%Y-%m-%d").date() if expires_at else None
+        key = row["user_meta"]["tradingview_username"].strip().lower()
+        data = {"id": row["transaction_id"], "email": email, "expiry": expiry}
+        existing = lookup.get(key)
+        if not existing:
+            lookup[key] = data
+        elif expiry and existing["expiry"]:
+            if expiry > existing["expiry"]:
+                lookup[key] = data
+        elif expiry and not existing["expiry"]:
+            lookup[key] = data
+        elif not existing["email"] and email:
+            lookup[key] = data
+    return {key: data["id"] for key, data in lookup.items()}
+
+
+def test_later_expiry_wins():
+    assert winner(txn("t1", expires_at="2026-01-01"), txn("t2", expires_at="2026-02-01")) == "t2"
+    assert winner(txn("t1", expires_at="2026-02-01"), txn("t2", expires_at="2026-01-01")) == "t1"
+
+
+def test_dated_beats_undated():
+    assert winner(txn("t1", email="a@x"), txn("t2", expires_at="2026-01-01")) == "t2"
+    assert winner(txn("t1", expires_at="2026-01-01"), txn("t2")) == "t1"
+
+
+def test_email_breaks_the_tie_when_dates_do_not_help():
+    assert winner(txn("t1"), txn("t2", email="a@x")) == "t2"
+    # As before, an email outranks an expiry the current winner has no email for.
+    assert winner(txn("t1", expires_at="2026-01-01"), txn("t2", email="a@x")) == "t2"
+
+
+def test_first_wins_a_tie():
+    assert winner(txn("t1", expires_at="2026-01-01"), txn("t2", expires_at="2026-01-01")) == "t1"
+    assert winner(txn("t1", email="a@x"), txn("t2", email="b@x")) == "t1"
+    assert winner(txn("t1"), txn("t2")) == "t1"
+
+
+def test_winners_match_the_old_reduction():
+    rng = random.Random(7)
+    transactions = [
+        txn(
+            f"t{n}",
+            username=rng.choice(["alice", "Alice", "bob", "carol"]),
+            expires_at=rng.choice([None, "", "2026-01-01", "2026-01-15", "2026-02-01"]),
+            email=rng.choice(["", "", "x@example.com"]),
+        )
+        for n in range(400)
+    ]
+    index = TransactionIndex.build(transactions)
+    assert {key: index.get(key).transaction_id for key in old_winners(transactions)} == (
+        old_winners(transactions)
+    )
+
+
+def test_match_tries_the_username_before_the_login():
+    index = TransactionIndex.build(
+        [
+            txn("t1", username="bob", expires_at="2026-01-01"),
+            txn("t2", username="robert", user_login="Bob", expires_at="2026-06-01"),
+        ]
+    )
+    found, via = index.match("BOB")
+    assert (found.transaction_id, via) == ("t1", MATCHED_VIA_USERNAME)
+    found, via = index.match("robert")
+    assert (found.transaction_id, via) == ("t2", MATCHED_VIA_USERNAME)
+    assert index.by_login("bob").transaction_id == "t2"
+
+    only_login = TransactionIndex.build([txn("t3", username="", user_login="carol_wp")])
+    found, via = only_login.match("Carol_WP")
+    assert (found.transaction_id, via) == ("t3", MATCHED_VIA_LOGIN)
+    assert only_login.match("nobody") is None
+
+
+@pytest.fixture
+def export(tmp_path: Path) -> Path:
+    path = tmp_path / "transactions.json"
+    path.write_text(
+        json.dumps(
+            [
+                txn("t1", expires_at="2026-01-01", email="a@x", user_login="al", user_id="7"),
+                txn("t2", expires_at="2026-03-01", user_login="al", user_id="7"),
+                txn("t3", username="bob", expires_at="2026-02-01"),
+                txn("t4", username="", user_login="carol_wp"),
+            ]
+        ),
+        encoding="utf-8",
+    )
+    return path
+
+
+def test_snapshot_round_trip(tmp_path, export):
+    index, from_snapshot = TransactionIndex.load_or_build(export)
+    assert not from_snapshot
+    loaded = TransactionIndex.load(export.with_name("transactions.json.idx"))
+
+    assert loaded.transactions_seen == index.transactions_seen == 4
+    assert len(loaded) == len(index) == 2
+    for username in ("alice", "bob"):
+        assert loaded.get(username) == index.get(username)
+    assert loaded.by_login("AL") == index.by_login("al")
+    assert loaded.by_login("carol_wp").transaction_id == "t4"
+    assert loaded.by_user_id("7").transaction_id == "t2"
+    assert sorted(loaded.usernames()) == sorted(index.usernames())
+    # Only entries some key still points at are written.
+    assert len(loaded._entries) == 3
+
+
+def test_snapshot_is_reused_until_the_export_changes(export):
+    assert TransactionIndex.load_or_build(export)[1] is False
+    assert TransactionIndex.load_or_build(export)[1] is True
+
+    stat = export.stat()
+    os.utime(export, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert TransactionIndex.load_or_build(export)[1] is False
+    assert TransactionIndex.load_or_build(export)[1] is True
+
+    rows = json.loads(export.read_text(encoding="utf-8"))
+    rows.append(txn("t5", expires_at="2027-01-01"))
+    export.write_text(json.dumps(rows), encoding="utf-8")
+    os.utime(export, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    index, from_snapshot = TransactionIndex.load_or_build(export)
+    assert not from_snapshot
+    assert index.get("alice").transaction_id == "t5"
+
+
+def test_unreadable_snapshot_is_rebuilt(export):
+    snapshot = export.with_name("transactions.json.idx")
+    snapshot.write_bytes(b"WPTXIDX\x01garbage")
+    index, from_snapshot = TransactionIndex.load_or_build(export)
+    assert not from_snapshot
+    assert index.get("bob").transaction_id == "t3"
+    assert TransactionIndex.load_or_build(export)[1] is True
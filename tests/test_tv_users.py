@@ -0,0 +1,137 @@
+import csv
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from app.tv_users import TvUser, _fast_split, _records, iter_tv_users
+
+USERPIC = '"data:image/svg+xml;utf8,<svg xmlns=""http://www.w3.org/2000/svg""><path d=""M0,0 L1,1""/></svg>"'
+
+
+def reference(path: Path) -> List[TvUser]:
+    """What csv.DictReader makes of the file, in iter_tv_users' output shape."""
+    with path.open(encoding="utf-8-sig", newline="") as handle:
+        return [
+            TvUser._make((row.get(name) or "").strip() for name in TvUser._fields)
+            for row in csv.DictReader(handle)
+            if (row.get("username") or "").strip()
+        ]
+
+
+def write(tmp_path: Path, text: str, bom: bool = False) -> Path:
+    path = tmp_path / "tv_users.csv"
+    path.write_bytes((b"\xef\xbb\xbf" if bom else b"") + text.encode("utf-8"))
+    return path
+
+
+@pytest.fixture(params=[False, True], ids=["buffered", "mmap"])
+def use_mmap(request) -> bool:
+    return request.param
+
+
+def check(path: Path, use_mmap: bool) -> List[TvUser]:
+    users = list(iter_tv_users(path, use_mmap=use_mmap))
+    assert users == reference(path)
+    return users
+
+
+def test_reordered_header_projects_by_name(tmp_path, use_mmap):
+    path = write(
+        tmp_path,
+        "userpic,expiration,username,id,created\r\n"
+        f"{USERPIC},2026-02-01, Alice ,1,2025-01-01\r\n"
+        f"{USERPIC},,,2,2025-01-02\r\n"
+        f"{USERPIC},2026-03-01,bob,3,2025-01-03\r\n",
+    )
+    assert check(path, use_mmap) == [
+        TvUser("1", "Alice", "2025-01-01", "2026-02-01"),
+        TvUser("3", "bob", "2025-01-03", "2026-03-01"),
+    ]
+
+
+def test_quoted_comma_outside_userpic_falls_back_to_csv(tmp_path, use_mmap):
+    path = write(
+        tmp_path,
+        "id,username,userpic,created,expiration\n"
+        f'1,alice,{USERPIC},"Jan 1, 2025",2026-02-01\n'
+        f'2,"bob, jr",{USERPIC},2025-01-02,"Feb 1, 2026"\n',
+    )
+    assert [user.created for user in check(path, use_mmap)] == ["Jan 1, 2025", "2025-01-02"]
+
+
+def test_extra_column_is_not_folded_into_userpic(tmp_path, use_mmap):
+    path = write(
+        tmp_path,
+        "id,username,userpic,created,expiration\n"
+        f"1,alice,{USERPIC},2025-01-01,2026-02-01,extra\n",
+    )
+    assert check(path, use_mmap) == [TvUser("1", "alice", "2025-01-01", "2026-02-01")]
+
+
+def test_embedded_newlines_stay_in_one_record(tmp_path, use_mmap):
+    path = write(
+        tmp_path,
+        "id,username,userpic,created,expiration\n"
+        '1,alice,"data:image/svg+xml;utf8,<svg>\n<path d=""M0,0""/>\r\n</svg>",2025-01-01,2026-02-01\n'
+        '2,bob,,"2025-01-02\nnoon",2026-03-01\n',
+    )
+    users = check(path, use_mmap)
+    assert [user.username for user in users] == ["alice", "bob"]
+    assert users[1].created == "2025-01-02\nnoon"
+
+
+def test_bom_is_stripped_from_the_header(tmp_path, use_mmap):
+    path = write(tmp_path, "id,username,created,expiration\n1,alice,2025-01-01,2026-02-01\n", bom=True)
+    assert check(path, use_mmap) == [TvUser("1", "alice", "2025-01-01", "2026-02-01")]
+
+
+def test_missing_userpic_and_columns(tmp_path, use_mmap):
+    path = write(
+        tmp_path,
+        "username,id\n"
+        "alice,1\n"
+        '"bob, jr",2\n',
+    )
+    assert check(path, use_mmap) == [TvUser("1", "alice", "", ""), TvUser("2", "bob, jr", "", "")]
+
+
+def test_missing_username_column_yields_nothing(tmp_path, use_mmap):
+    path = write(tmp_path, "id,created\n1,2025-01-01\n")
+    assert list(iter_tv_users(path, use_mmap=use_mmap)) == []
+
+
+def test_empty_file_yields_nothing(tmp_path, use_mmap):
+    path = write(tmp_path, "")
+    assert list(iter_tv_users(path, use_mmap=use_mmap)) == []
+
+
+def test_fast_split_cuts_around_the_userpic_column():
+    record = f"1,alice,{USERPIC},2025-01-01,2026-02-01".encode()
+    fields = _fast_split(record, width=5, skipped=2, after=2)
+    assert fields[:2] == [b"1", b"alice"]
+    assert fields[2] == USERPIC.encode()
+    assert fields[3:] == [b"2025-01-01", b"2026-02-01"]
+
+
+@pytest.mark.parametrize(
+    "record",
+    [
+        f'1,"alice",{USERPIC},2025-01-01,2026-02-01',
+        f"1,alice,{USERPIC},2025-01-01",
+        f"1,alice,{USERPIC},2025-01-01,2026-02-01,extra",
+        '1,alice,"a"b",2025-01-01,2026-02-01',
+    ],
+)
+def test_fast_split_defers_to_csv_for_other_shapes(record):
+    assert _fast_split(record.encode(), width=5, skipped=2, after=2) is None
+
+
+def test_fast_split_without_userpic_needs_csv_for_quotes():
+    assert _fast_split(b"1,alice", width=2, skipped=None, after=0) == [b"1", b"alice"]
+    assert _fast_split(b'1,"alice"', width=2, skipped=None, after=0) is None
+
+
+def test_records_rejoin_quoted_newlines():
+    lines = iter([b'1,"a\n', b'b",2\r\n', b"3,c\n", b'4,"torn\n'])
+    assert list(_records(lines)) == [b'1,"a\nb",2', b"3,c", b'4,"torn']
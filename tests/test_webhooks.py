@@ -0,0 +1,184 @@
+import hashlib
+import hmac
+import json
+from typing import Any, Dict, List, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.config import Settings
+from app.webhooks import transactions_from_payload, verify_signature
+
+SECRET = "s3cret"
+BODY = b'{"event": "transaction-completed"}'
+DIGEST = hmac.new(SECRET.encode(), BODY, hashlib.sha256).hexdigest()
+
+
+@pytest.mark.parametrize(
+    "signature, valid",
+    [
+        (DIGEST, True),
+        (DIGEST.upper(), True),
+        (f"sha256={DIGEST}", True),
+        (f" SHA256={DIGEST} ", True),
+        (DIGEST[:-1] + ("0" if DIGEST[-1] != "0" else "1"), False),
+        (DIGEST[:-2], False),
+        (None, False),
+        ("", False),
+        ("é" * 64, False),
+        (f"sha256={DIGEST[:-1]}☃", False),
+    ],
+)
+def test_verify_signature(signature, valid):
+    assert verify_signature(SECRET, BODY, signature) is valid
+
+
+def test_signature_of_another_body_is_rejected():
+    assert not verify_signature(SECRET, BODY + b" ", DIGEST)
+
+
+MEMBERPRESS_EVENT = {
+    "event": "transaction-completed",
+    "type": "transaction",
+    "data": {
+        "id": 4021,
+        "membership": {"id": "101", "title": "Indicator"},
+        "created_at": "2026-01-01 10:00:00",
+        "expires_at": "2026-01-31 10:00:00",
+        "status": "complete",
+        "amount": "49.00",
+        "gateway": "0",
+        "member": {
+            "id": 77,
+            "email": "alice@example.com",
+            "username": "alice_wp",
+            "display_name": "Alice",
+            "first_name": "Alice",
+            "profile": {"mepr_tradingview_username": "AliceTV"},
+        },
+    },
+}
+
+
+def test_memberpress_event_maps_to_an_export_row():
+    assert transactions_from_payload(MEMBERPRESS_EVENT) == [
+        {
+            "transaction_id": "4021",
+            "product_id": "101",
+            "created_at": "2026-01-01 10:00:00",
+            "expires_at": "2026-01-31 10:00:00",
+            "status": "complete",
+            "amount": "49.00",
+            "user_id": "77",
+            "user_email": "alice@example.com",
+            "user_login": "alice_wp",
+            "display_name": "Alice",
+            "user_meta": {
+                "mepr_tradingview_username": "AliceTV",
+                "tradingview_username": "AliceTV",
+                "first_name": "Alice",
+            },
+        }
+    ]
+
+
+def test_event_data_already_in_export_shape_is_passed_through():
+    row = {"transaction_id": "4021", "product_id": "101"}
+    assert transactions_from_payload({"event": "transaction-completed", "data": row}) == [row]
+    assert transactions_from_payload(row) == [row]
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"event": "member-signup-completed", "data": {"id": 1}},
+        {"event": "subscription-created", "type": "subscription", "data": {"id": 1}},
+        {"event": "transaction-completed", "data": "4021"},
+        "transaction",
+        None,
+    ],
+)
+def test_non_transaction_bodies_yield_nothing(payload):
+    assert transactions_from_payload(payload) == []
+
+
+def test_list_body_keeps_only_rows():
+    rows = [{"transaction_id": "1"}, "junk", None, {"transaction_id": "2"}]
+    assert transactions_from_payload(rows) == [{"transaction_id": "1"}, {"transaction_id": "2"}]
+
+
+class FakeQueue:
+    depth = 0
+
+    def __init__(self) -> None:
+        self.rows: List[Dict[str, Any]] = []
+
+    def submit(self, rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+        self.rows.extend(rows)
+        return len(rows), 0
+
+
+@pytest.fixture
+def queue(monkeypatch: pytest.MonkeyPatch) -> FakeQueue:
+    queue = FakeQueue()
+    monkeypatch.setattr(main, "get_webhook_queue", lambda settings: queue)
+    return queue
+
+
+@pytest.fixture
+def client(settings: Settings):
+    settings.webhook.enabled = True
+    settings.webhook.secret = SECRET
+    main.app.dependency_overrides[main._settings] = lambda: settings
+    # Not entered as a context manager: the lifespan would start the mail outbox.
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+
+
+def post(client: TestClient, body: bytes, signature: Any = None):
+    signature = DIGEST if signature is None else signature
+    headers = {"X-Webhook-Signature": signature} if signature else {}
+    return client.post("/webhooks/transaction", content=body, headers=headers)
+
+
+def signed(body: bytes) -> str:
+    return hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+def test_signed_transaction_is_queued(client, queue):
+    body = json.dumps(MEMBERPRESS_EVENT).encode()
+    response = post(client, body, signed(body))
+    assert response.status_code == 202
+    assert response.json() == {"accepted": 1, "dropped": 0, "queue_depth": 0}
+    assert [row["transaction_id"] for row in queue.rows] == ["4021"]
+
+
+def test_signed_non_transaction_event_is_ignored(client, queue):
+    body = b'{"event": "member-signup-completed", "data": {"id": 1}}'
+    response = post(client, body, signed(body))
+    assert response.status_code == 202
+    assert response.json() == {"accepted": 0, "ignored": True}
+    assert queue.rows == []
+
+
+def test_disabled_webhook_is_not_found(client, settings, queue):
+    settings.webhook.enabled = False
+    assert post(client, BODY).status_code == 404
+
+
+def test_missing_secret_closes_the_endpoint(client, settings, queue):
+    settings.webhook.secret = None
+    assert post(client, BODY).status_code == 503
+    assert queue.rows == []
+
+
+@pytest.mark.parametrize("signature", ["", "0" * 64, "é".encode("latin-1") * 64])
+def test_bad_signature_is_unauthorized(client, queue, signature):
+    assert post(client, BODY, signature).status_code == 401
+    assert queue.rows == []
+
+
+def test_signed_body_that_is_not_json_is_rejected(client, queue):
+    body = b"transaction_id=4021"
+    assert post(client, body, signed(body)).status_code == 400
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+from typing import Any, List
+
+import httpx
+import pytest
+
+from app import io
+from app.config import Settings
+from app.io import JsonArrayParser, WordPressClient
+
+
+def feed_in_chunks(body: bytes, size: int) -> List[Any]:
+    parser = JsonArrayParser()
+    items: List[Any] = []
+    for start in range(0, len(body), size):
+        items.extend(parser.feed(body[start:start + size]))
+    return items + parser.close()
+
+
+def test_top_level_array_items_arrive_before_close():
+    parser = JsonArrayParser()
+    assert parser.feed(b'[{"id": "1"}, {"id": "2"}, {"id"') == [{"id": "1"}, {"id": "2"}]
+    assert parser.feed(b': "3"}]') == [{"id": "3"}]
+    assert parser.close() == []
+
+
+def test_multibyte_utf8_split_across_chunks():
+    body = json.dumps([{"name": "Zoë 東京 🚀"}, {"name": "ü"}], ensure_ascii=False).encode()
+    expected = [{"name": "Zoë 東京 🚀"}, {"name": "ü"}]
+    for size in (1, 2, 3):
+        assert feed_in_chunks(body, size) == expected
+
+
+def test_number_cut_at_chunk_boundary_waits_for_the_rest():
+    parser = JsonArrayParser()
+    assert parser.feed(b'{"total": 1') == []
+    assert parser.feed(b'2, "data": [{"amount": -0.') == []
+    assert parser.feed(b'125e1}], "pages": 3') == [{"amount": -1.25}]
+    assert parser.feed(b"0}") == []
+    assert parser.close() == []
+
+
+def test_envelope_metadata_before_and_after_data_is_skipped():
+    body = json.dumps(
+        {
+            "total": 2,
+            "meta": {"data": [{"not": "a transaction"}], "next": None},
+            "data": [{"id": "1"}, {"id": "2"}],
+            "page": 1,
+            "links": ["a", {"b": [1, 2]}],
+        }
+    ).encode()
+    for size in (1, 5, len(body)):
+        assert feed_in_chunks(body, size) == [{"id": "1"}, {"id": "2"}]
+
+
+def test_envelope_items_stream_before_the_body_ends():
+    parser = JsonArrayParser()
+    assert parser.feed(b'{"page": 1, "data": [{"id": "1"},') == [{"id": "1"}]
+
+
+def test_non_object_items_are_skipped(caplog):
+    with caplog.at_level(logging.WARNING, logger="app.io"):
+        items = feed_in_chunks(b'[1, {"id": "1"}, "x", null, [2], {"id": "2"}]', 3)
+    assert items == [{"id": "1"}, {"id": "2"}]
+    skipped = [r for r in caplog.records if r.getMessage() == "wordpress.unexpected_item"]
+    assert len(skipped) == 4
+
+
+def test_data_that_is_not_a_list_yields_nothing(caplog):
+    with caplog.at_level(logging.WARNING, logger="app.io"):
+        assert feed_in_chunks(b'{"data": {"id": "1"}, "total": 1}', 4) == []
+    assert any(r.getMessage() == "wordpress.unexpected_response" for r in caplog.records)
+
+
+@pytest.mark.parametrize(
+    "body", [b'[{"id": "1"}, {"id"', b'{"data": [{"id": "1"}]', b"[", b'{"data"']
+)
+def test_truncated_body_raises_on_close(body):
+    parser = JsonArrayParser()
+    parser.feed(body)
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_other_bodies_are_buffered_and_parsed_on_close(caplog):
+    parser = JsonArrayParser()
+    with caplog.at_level(logging.WARNING, logger="app.io"):
+        assert parser.feed(b'"no') == []
+        assert parser.feed(b' transactions"') == []
+        assert parser.close() == []
+    messages = [r.getMessage() for r in caplog.records]
+    assert "wordpress.response_buffered" in messages
+    assert "wordpress.unexpected_response" in messages
+
+
+def test_buffered_body_that_is_not_json_raises():
+    parser = JsonArrayParser()
+    parser.feed(b"<html>oops</html>")
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+@pytest.fixture
+def paged_settings(settings: Settings) -> Settings:
+    settings.wordpress.page_param = "page"
+    settings.wordpress.transactions_limit = 2
+    return settings
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers():
+    io._CIRCUIT_BREAKERS.clear()
+    yield
+    io._CIRCUIT_BREAKERS.clear()
+
+
+def collect(client: WordPressClient) -> List[Any]:
+    async def run() -> List[Any]:
+        try:
+            return [item async for item in client.iter_transactions()]
+        finally:
+            await client.aclose()
+
+    return asyncio.run(run())
+
+
+def test_iter_transactions_pages_until_a_short_page(paged_settings):
+    pages = {
+        1: [{"id": "1"}, {"id": "2"}],
+        2: {"total": 5, "data": [{"id": "3"}, {"id": "4"}]},
+        3: [{"id": "5"}],
+    }
+    requested: List[httpx.QueryParams] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.params)
+        return httpx.Response(200, json=pages[int(request.url.params["page"])])
+
+    client = WordPressClient(paged_settings)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    assert [item["id"] for item in collect(client)] == ["1", "2", "3", "4", "5"]
+    assert [params["page"] for params in requested] == ["1", "2", "3"]
+    assert all(params["limit"] == "2" for params in requested)
+
+
+def test_iter_transactions_stops_on_an_empty_page(paged_settings):
+    pages = {1: [{"id": "1"}, {"id": "2"}], 2: []}
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.params["page"])
+        return httpx.Response(200, json=pages[int(request.url.params["page"])])
+
+    client = WordPressClient(paged_settings)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    assert len(collect(client)) == 2
+    assert calls == ["1", "2"]
+
+
+def test_iter_transactions_without_page_param_fetches_once(settings):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url)
+        return httpx.Response(200, json=[{"id": "1"}, {"id": "2"}])
+
+    client = WordPressClient(settings)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    assert len(collect(client)) == 2
+    assert len(calls) == 1